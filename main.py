@@ -1,227 +1,463 @@
 import sys
 import time
-from datetime import datetime, timezone
-import importlib # Needed to dynamically import data sources
+import argparse
+import threading
+from datetime import date, datetime, timedelta, timezone
+import os
+import importlib # Needed to dynamically import data sources and posting adapters
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator
 # import random # Temporarily commented out for testing
 
 # Import base modules
-from src.config_loader import load_config, get_secret
+from src.config_loader import load_config, get_secret, AppConfig, SourceConfig, ConfigError
+from src.activity import Activity, activity_key
+from src.clients import ClientPool, SessionRejectedError
+from src.data_sources import SourceError
+from src.data_sources.garmin_fit import DEFAULT_FIT_CACHE_DIR, DEFAULT_MAX_HR
+from src.profiling import profiler, stage
+from src.ratelimit import RateLimiter
 # Import the specific functions needed
-from src.llm.generator import generate_posts, generate_follow_up_comment
-from src.posting import twitter_poster # Only twitter for now
-
-def run_update():
-    """Main coordinating function for the update process."""
-    
-    # # --- Randomized Start Delay (Temporarily Disabled for Testing) ---
-    # sleep_minutes = random.randint(0, 240) # Random delay between 0 and 240 minutes (4 hours)
-    # if sleep_minutes > 0:
-    #   print(f"Sleeping for {sleep_minutes} minutes to randomize start time...")
-    #   time.sleep(sleep_minutes * 60)
-    #   print("Waking up and starting the process...")
-    # else:
-    #   print("Starting process immediately (no random delay).")
-    # # ------------------------------------------------------------------
-
-    print(f"=== Starting githubX Run at {datetime.now(timezone.utc).isoformat()} ===")
-
-    # 1. Load Configuration
-    config = load_config()
-    # ---- DEBUG: Print config['llm'] immediately after loading ----
-    # print(f"[DEBUG] config.get('llm') right after load_config: {config.get('llm')}") # No longer needed
-    # ----------------------------------------------------------
-    if not config:
-        print("Exiting due to configuration loading failure.", file=sys.stderr)
+from src.llm.generator import generate_posts, generate_follow_up_comment, compact_activities, DEFAULT_MAX_ACTIVITIES_IN_PROMPT
+from src.posting.base import PostingTarget
+from src.storage.outbox import Outbox, DEFAULT_OUTBOX_PATH, draft_key, source_run_key
+from src.storage.engagement import EngagementStore, DEFAULT_ENGAGEMENT_PATH, DEFAULT_MAX_AGE_DAYS, collect_metrics, prompt_id, rank_drafts
+
+SOURCE_MODULE_MAP = {
+    "github": "src.data_sources.github_source",
+    "garmin": "src.data_sources.garmin_source",
+    # Add other sources here, e.g., "strava": "src.data_sources.strava_source"
+}
+
+TARGET_MODULE_MAP = {
+    "twitter": "src.posting.twitter_poster",
+    "mastodon": "src.posting.mastodon_poster",
+    "bluesky": "src.posting.bluesky_poster",
+}
+
+def _with_relogin(open_source: Callable[[], Iterator[Activity]], clients: ClientPool | None, service: str, *credentials: str,
+                  raise_errors: bool = False) -> Iterator[Activity]:
+    """
+    Yields from open_source(). If the service rejects the pooled client (SessionRejectedError, raised
+    before anything was yielded), drops it from the pool and retries once with a fresh login.
+    A second rejection is printed, or raised as SourceError with `raise_errors`.
+    """
+    for attempt in range(2):
+        try:
+            yield from open_source()
+            return
+        except SessionRejectedError as e:
+            if clients is None or attempt:
+                print(f"Error: {e}", file=sys.stderr)
+                if raise_errors:
+                    raise SourceError(str(e)) from e
+                return
+            print(f"[Client Pool] {e}. Logging in again and retrying once.")
+            clients.invalidate(service, *credentials)
+
+def iter_source_activities(
+    source_key: str,
+    source_conf: SourceConfig,
+    clients: ClientPool | None = None,
+    include_chart_data: bool = False,
+    day: date | None = None,
+    limiter: RateLimiter | None = None,
+    raise_errors: bool = False,
+) -> Iterator[Activity]:
+    """
+    Imports the source module, resolves its credentials and yields from its iter_activity as pages/days arrive.
+    `day` fetches that UTC day only (backfill) instead of the last 24 hours. `limiter` is passed to the
+    source, which takes one token per API request. Prints errors and stops early on failure, or raises
+    SourceError with `raise_errors` (a missing module or secret included).
+    """
+    module_name = SOURCE_MODULE_MAP.get(source_key)
+    if not module_name:
+        print(f"Warning: No module mapping found for enabled source key '{source_key}'. Skipping.", file=sys.stderr)
+        if raise_errors:
+            raise SourceError(f"No module mapping for source '{source_key}'")
         return
 
+    try:
+        source_module = importlib.import_module(module_name)
+    except ModuleNotFoundError:
+        print(f"Error: Could not import module '{module_name}' for source '{source_key}'. Make sure it exists. Skipping.", file=sys.stderr)
+        if raise_errors:
+            raise SourceError(f"Could not import module '{module_name}'")
+        return
+    except Exception as e:
+         print(f"Error importing module '{module_name}': {e}. Skipping source '{source_key}'.", file=sys.stderr)
+         if raise_errors:
+             raise SourceError(f"Error importing module '{module_name}': {e}") from e
+         return
+
+    # Get credentials based on config
+    username_env_var = source_conf.username_env_var
+    password_env_var = source_conf.password_env_var # For sources needing password
+    pat_env_var = source_conf.pat_env_var # For sources needing PAT
+
+    username = get_secret(username_env_var) if username_env_var else None
+    password = get_secret(password_env_var) if password_env_var else None
+    pat = get_secret(pat_env_var) if pat_env_var else None
+
+    activity_format = source_conf.activity_format # Validated against the source's fields at load time
+
+    # Pass necessary credentials (adapt based on source needs)
+    try:
+        if source_key == 'github':
+            if username and pat: # GitHub needs username and PAT
+                window = {}
+                if day:
+                    window_start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+                    window = {"since": window_start, "until": window_start + timedelta(days=1)}
+                yield from _with_relogin(
+                    lambda: source_module.iter_activity(
+                        username, pat, activity_format,
+                        client=clients.github(pat) if clients else None,
+                        limiter=limiter,
+                        raise_errors=raise_errors,
+                        **window
+                    ),
+                    clients, "github", pat, raise_errors=raise_errors,
+                )
+            else:
+                 print(f"Skipping {source_key} source due to missing username or PAT secret.", file=sys.stderr)
+                 if raise_errors:
+                     raise SourceError(f"Missing username or PAT secret for source '{source_key}'")
+        elif source_key == 'garmin':
+            if username and password: # Garmin needs username and password
+                 # ---- NEW: Pass daily_summary_format to get_activity ----
+                 daily_format = source_conf.daily_summary_format
+                 fit_conf = source_conf.raw.get('fit') or {}
+                 yield from _with_relogin(
+                     lambda: source_module.iter_activity(
+                         username,
+                         password,
+                         activity_format,
+                         daily_summary_format=daily_format,
+                         include_chart_data=include_chart_data,
+                         client=clients.garmin(username, password) if clients else None,
+                         fit_cache_dir=fit_conf.get('cache_dir', DEFAULT_FIT_CACHE_DIR) if fit_conf.get('enabled') else None,
+                         fit_max_hr=float(fit_conf.get('max_hr', DEFAULT_MAX_HR)),
+                         limiter=limiter,
+                         raise_errors=raise_errors,
+                         **({"day": day, "window_days": 0} if day else {})
+                     ),
+                     clients, "garmin", username, password, raise_errors=raise_errors,
+                 )
+                 # ----------------------------------------------------------
+            else:
+                 print(f"Skipping {source_key} source due to missing username or password secret.", file=sys.stderr)
+                 if raise_errors:
+                     raise SourceError(f"Missing username or password secret for source '{source_key}'")
+        # Add conditions for other sources here...
+        else:
+             print(f"Warning: Don't know how to call iter_activity for source '{source_key}'. Skipping.", file=sys.stderr)
+             if raise_errors:
+                 raise SourceError(f"Don't know how to call iter_activity for source '{source_key}'")
+    except SourceError:
+        raise
+    except Exception as e:
+         print(f"Error calling iter_activity for {source_key}: {e}", file=sys.stderr)
+         # Continue to next source if one fails
+         if raise_errors:
+             raise SourceError(f"Error calling iter_activity for {source_key}: {e}") from e
+
+def fetch_source_activities(
+    source_key: str,
+    source_conf: SourceConfig,
+    clients: ClientPool | None = None,
+    include_chart_data: bool = False,
+    day: date | None = None,
+    limiter: RateLimiter | None = None,
+) -> list[Activity]:
+    """
+    Same as iter_source_activities, collected into a list (used by backfill). Raises SourceError if the
+    source failed, even after some activities arrived, so a failed day is never taken for an empty one.
+    """
+    return list(iter_source_activities(source_key, source_conf, clients, include_chart_data=include_chart_data, day=day,
+                                       limiter=limiter, raise_errors=True))
+
+def select_prompt(config: AppConfig, source_key: str, first_activity: Activity) -> tuple[str, str | None]:
+    """Returns (prompt_key, specific prompt template or None) for a source's activities."""
+    # --- Determine the correct prompt key based on activity source ---
+    prompt_key_to_use = source_key # Default to the main source key ('github', 'garmin')
+    if first_activity.get('source') == 'garmin_daily':
+        prompt_key_to_use = 'garmin_daily' # Use the specific key for daily summary
+    # ------------------------------------------------------------------
+    return prompt_key_to_use, config.llm.get('source_prompts', {}).get(prompt_key_to_use)
+
+def generate_drafts(
+    config: AppConfig,
+    outbox: Outbox,
+    run_date: str,
+    clients: ClientPool | None = None,
+    only_sources: list[str] | None = None,
+    limiter: RateLimiter | None = None,
+) -> int:
+    """
+    Fetches every enabled source (or just `only_sources`) and writes the generated posts to the outbox.
+    With a ClientPool, sources reuse its logged-in clients instead of logging in per call; with a
+    RateLimiter, every source API request and LLM call takes a token from it (shared by batch accounts).
+    Returns the number of new drafts.
+    """
     # --- Get LLM config ONCE ---
-    llm_config = config.get('llm', {})
-    # print(f"[DEBUG] llm_config obtained once: {llm_config}") # Debug this once - No longer needed
+    llm_config = config.llm
     # -------------------------
 
-    persona = config.get('persona', 'A developer sharing their journey.')
+    persona = config.persona
     gemini_api_key = get_secret("GEMINI_API_KEY") # Assume fixed env var name for LLM key
 
     if not gemini_api_key:
-        print(f"Exiting because Gemini API Key (GEMINI_API_KEY) was not found.", file=sys.stderr)
-        return
+        print(f"Skipping generation because Gemini API Key (GEMINI_API_KEY) was not found.", file=sys.stderr)
+        return 0
 
-    # ---- Data structure to hold generated content and its context ----
-    # List of {"source": str, "tweet_text": str, "first_activity": dict | None}
-    generated_content_list = []
-    # -------------------------------------------------------------------
-
-    enabled_sources_config = config.get('data_sources', {})
-    # --- Use llm_config obtained earlier --- 
-    source_prompts = llm_config.get('source_prompts', {})
-    # ---------------------------------------
-    source_module_map = {
-        "github": "src.data_sources.github_source",
-        "garmin": "src.data_sources.garmin_source",
-        # Add other sources here, e.g., "strava": "src.data_sources.strava_source"
-    }
+    # --- Optional chart images per prompt key (e.g. garmin -> hr_pace) ---
+    media_config = config.section('media')
+    media_enabled = media_config.get('enabled', False)
+    chart_kinds = media_config.get('charts', {}) if media_enabled else {}
+    if chart_kinds:
+        from src.media import charts # Imported lazily: matplotlib is optional and slow to import
+    render_cache_dir = media_config.get('render_cache_dir', 'data/render_cache')
+    # ----------------------------------------------------------------------
+    max_activities = int(llm_config.get('max_activities_in_prompt', DEFAULT_MAX_ACTIVITIES_IN_PROMPT))
+
+    new_drafts = 0
 
     # 2. Fetch Data and Generate Posts per Source
     print("\n--- Processing Data Sources ---")
-    for source_key, source_conf in enabled_sources_config.items():
-        if source_conf.get('enabled'):
+    for source_key, source_conf in config.sources.items():
+        if source_conf.enabled and (only_sources is None or source_key in only_sources):
             print(f"\nProcessing source: {source_key}...")
-            module_name = source_module_map.get(source_key)
-            if not module_name:
-                print(f"Warning: No module mapping found for enabled source key '{source_key}'. Skipping.", file=sys.stderr)
+            # --- Resume / polling: only activities not drafted yet this run day get new drafts ---
+            run_key = source_run_key(run_date, source_key)
+            drafted_ids = outbox.drafted_activity_ids(run_key)
+            if drafted_ids is None:
+                print(f"Drafts for {source_key} on {run_date} already in the outbox. Skipping fetch and generation.")
                 continue
-
-            try:
-                source_module = importlib.import_module(module_name)
-            except ModuleNotFoundError:
-                print(f"Error: Could not import module '{module_name}' for source '{source_key}'. Make sure it exists. Skipping.", file=sys.stderr)
-                continue
-            except Exception as e:
-                 print(f"Error importing module '{module_name}': {e}. Skipping source '{source_key}'.", file=sys.stderr)
-                 continue
-
-            # Get credentials based on config
-            username_env_var = source_conf.get('username_env_var')
-            password_env_var = source_conf.get('password_env_var') # For sources needing password
-            pat_env_var = source_conf.get('pat_env_var') # For sources needing PAT
-
-            username = get_secret(username_env_var) if username_env_var else None
-            password = get_secret(password_env_var) if password_env_var else None
-            pat = get_secret(pat_env_var) if pat_env_var else None
-
-            activity_format = source_conf.get('activity_format', '- {summary}') # Default format
-
-            # Call the source's get_activity function
-            # Pass necessary credentials (adapt based on source needs)
-            source_activities = []
+            new_activity_ids: list[str] = []
+            seen_drafted = 0
+
+            def undrafted(activities: Iterator[Activity]) -> Iterator[Activity]:
+                nonlocal seen_drafted
+                for activity in activities:
+                    key = activity_key(activity)
+                    if key in drafted_ids:
+                        seen_drafted += 1
+                        continue
+                    new_activity_ids.append(key)
+                    yield activity
+            # ----------------------------------------------------------------------------------------
+            # Stream the source's activities, keeping at most max_activities of them in memory
             first_activity_for_source = None # Store the first activity for follow-up context
-            try:
-                if source_key == 'github':
-                    if username and pat: # GitHub needs username and PAT
-                        source_activities = source_module.get_activity(username, pat, activity_format)
-                    else:
-                         print(f"Skipping {source_key} source due to missing username or PAT secret.", file=sys.stderr)
-                elif source_key == 'garmin':
-                    if username and password: # Garmin needs username and password
-                         # ---- NEW: Pass daily_summary_format to get_activity ----
-                         daily_format = source_conf.get('daily_summary_format')
-                         source_activities = source_module.get_activity(
-                             username,
-                             password,
-                             activity_format,
-                             daily_summary_format=daily_format
-                         )
-                         # ----------------------------------------------------------
-                    else:
-                         print(f"Skipping {source_key} source due to missing username or password secret.", file=sys.stderr)
-                # Add conditions for other sources here...
-                else:
-                     print(f"Warning: Don't know how to call get_activity for source '{source_key}'. Skipping.", file=sys.stderr)
-            except Exception as e:
-                 print(f"Error calling get_activity for {source_key}: {e}", file=sys.stderr)
-                 # Continue to next source if one fails
+            with stage(f"fetch:{source_key}"):
+                source_activities, total_activities = compact_activities(
+                    undrafted(iter_source_activities(source_key, source_conf, clients, include_chart_data=media_enabled, limiter=limiter)),
+                    max_activities,
+                )
 
             if source_activities:
-                print(f"Found {len(source_activities)} activities from {source_key}.")
+                print(f"Found {total_activities} activities from {source_key}" +
+                      (f" (prompt lists the newest {len(source_activities)})." if total_activities > len(source_activities) else "."))
                 first_activity_for_source = source_activities[0] # Get the first activity for context
 
-                # --- Determine the correct prompt key based on activity source ---
-                prompt_key_to_use = source_key # Default to the main source key ('github', 'garmin')
-                if first_activity_for_source.get('source') == 'garmin_daily':
-                    prompt_key_to_use = 'garmin_daily' # Use the specific key for daily summary
-                # ------------------------------------------------------------------
-                
-                # --- Use the determined prompt key to get the template ---
-                specific_prompt = source_prompts.get(prompt_key_to_use)
-                # -------------------------------------------------------
+                # --- Determine the correct prompt key (and its template) based on activity source ---
+                prompt_key_to_use, specific_prompt = select_prompt(config, source_key, first_activity_for_source)
+                # ------------------------------------------------------------------------------------
                 if not specific_prompt:
                     print(f"Warning: No specific prompt found for source key '{prompt_key_to_use}' in config. Using default.", file=sys.stderr)
                     # Fallback to default handled inside generate_posts
 
                 # Generate posts for this source's activities
                 print(f"Generating content for {source_key} activities...")
+                if limiter:
+                    limiter.acquire()
                 # Assume generate_posts returns a LIST of tweet strings
-                generated_posts_texts = generate_posts(
-                    source_activities,
-                    llm_config, # Pass the whole llm_config
-                    persona,
-                    gemini_api_key,
-                    specific_prompt_template=specific_prompt # Pass the specific prompt
-                )
+                with stage(f"generate:{source_key}"):
+                    generated_posts_texts = generate_posts(
+                        source_activities,
+                        llm_config, # Pass the whole llm_config
+                        persona,
+                        gemini_api_key,
+                        specific_prompt_template=specific_prompt, # Pass the specific prompt
+                        omitted_count=total_activities - len(source_activities),
+                    )
 
                 if generated_posts_texts:
                     print(f"Generated {len(generated_posts_texts)} post text(s) for {source_key}.")
-                    # --- Store generated text with context ---
-                    for text in generated_posts_texts:
-                        generated_content_list.append({
-                            "source": prompt_key_to_use, # Use the specific source (e.g., garmin_daily)
-                            "tweet_text": text,
-                            "first_activity": first_activity_for_source # Associate with the first activity
-                        })
-                    # ----------------------------------------
+                    # --- Render the chart once per source; it's attached to the source's first post ---
+                    media_paths = []
+                    chart_kind = chart_kinds.get(prompt_key_to_use)
+                    if chart_kind:
+                        with stage(f"render:{prompt_key_to_use}"):
+                            chart_path = charts.render_for_activities(chart_kind, source_activities, render_cache_dir)
+                        if chart_path:
+                            media_paths.append(chart_path)
+                    # ------------------------------------------------------------------------------------
+                    # --- Store generated text with context in the outbox ---
+                    first_index = outbox.source_run_drafts(run_key) # After the drafts of earlier polls today
+                    for index, text in enumerate(generated_posts_texts, start=first_index):
+                        if outbox.add_draft(
+                            draft_key(run_date, prompt_key_to_use, index),
+                            run_date,
+                            prompt_key_to_use, # Use the specific source (e.g., garmin_daily)
+                            text,
+                            first_activity_for_source, # Associate with the first activity
+                            media_paths=media_paths if index == first_index else None,
+                            prompt_id=prompt_id(specific_prompt or llm_config.get('default_prompt_template')),
+                        ):
+                            new_drafts += 1
+                    outbox.mark_source_generated(run_key, len(generated_posts_texts), new_activity_ids)
+                    # --------------------------------------------------------
                 else:
                     print(f"LLM did not generate posts for {source_key}.")
+            elif seen_drafted:
+                print(f"No new activities from {source_key} since its last drafts ({seen_drafted} already drafted).")
             else:
                  print(f"No activities found for {source_key}.")
 
+    return new_drafts
+
+def build_posting_targets(config: AppConfig) -> dict[str, PostingTarget]:
+    """Adapters for every enabled posting target that has its credentials/settings. Never raises."""
+    targets = {}
+    for target_key, target_conf in config.targets.items():
+        if not target_conf.enabled:
+            print(f"{target_key} posting target not enabled.")
+            continue
+        module_name = TARGET_MODULE_MAP.get(target_key)
+        if not module_name:
+            print(f"Warning: No adapter module found for posting target '{target_key}'. Skipping.", file=sys.stderr)
+            continue
+        try:
+            target = importlib.import_module(module_name).build_target(target_conf)
+        except Exception as e:
+            print(f"Error setting up posting target '{target_key}': {e}. Skipping.", file=sys.stderr)
+            continue
+        if not target.is_configured():
+            print(f"Skipping {target_key} posting due to missing credentials or settings.", file=sys.stderr)
+            continue
+        targets[target_key] = target
+    return targets
+
+def open_engagement_store(config: AppConfig) -> EngagementStore | None:
+    """The engagement store if `engagement.enabled`, else None."""
+    conf = config.section('engagement')
+    if not conf.get('enabled'):
+        return None
+    return EngagementStore(conf.get('store_path', DEFAULT_ENGAGEMENT_PATH))
+
+def collect_engagement(config: AppConfig, engagement: EngagementStore) -> int:
+    """Refreshes public metrics of recent posts (batched lookups per target). Returns the number of posts updated."""
+    max_age_days = float(config.section('engagement').get('max_age_days', DEFAULT_MAX_AGE_DAYS))
+    with stage("collect_engagement"):
+        return collect_metrics(engagement, build_posting_targets(config), max_age_days)
+
+def publish_to_target(target: PostingTarget, outbox: Outbox, content_item: dict, follow_up_delay: float,
+                      engagement: EngagementStore | None = None) -> list[str]:
+    """Publishes (or resumes) one outbox entry's thread on one target. Returns all IDs posted there so far."""
+    key = content_item['key']
+    thread_parts = Outbox.thread_parts(content_item, target.enable_follow_up, target.split)
+    already_posted = Outbox.posted_ids(content_item, target.key)
+
+    def record_link(index: int, post_id: str):
+        outbox.record_link(key, target.key, index, post_id)
+        if engagement and index == 0: # Engagement is tracked on the primary post
+            engagement.record_post(target.key, post_id, key, (content_item.get('first_activity') or {}).get('source') or content_item['source'],
+                                   prompt_key=content_item['source'], prompt_id=content_item.get('prompt_id'))
+
+    with stage(f"post:{target.key}:{key}"): # On this target's worker thread, so the profile covers the upload and posting
+        media_ids = None
+        if already_posted:
+            print(f"[{target.name}] Resuming thread for {key} after {already_posted[-1]} ({len(thread_parts) - len(already_posted)} part(s) left)...")
+        else:
+            # --- Upload chart images (only for the first link, which carries them) ---
+            media_paths = [path for path in content_item.get('media_paths', []) if os.path.exists(path)]
+            if media_paths:
+                print(f"[{target.name}] Uploading {len(media_paths)} chart image(s) for {key}...")
+                media_ids = target.upload_media(media_paths)
+            # -------------------------------------------------------------------------
+            print(f"[{target.name}] Posting thread ({len(thread_parts)} part(s)) for {key}...")
+
+        target.post_thread(
+            thread_parts,
+            already_posted,
+            delay_between=follow_up_delay,
+            media_ids=media_ids,
+            on_posted=record_link,
+            thread_key=key,
+        )
+    return Outbox.posted_ids(outbox.get(key), target.key)
+
+def publish_drafts(config: AppConfig, outbox: Outbox, run_date: str | list[str], stop_event: threading.Event | None = None,
+                   engagement: EngagementStore | None = None) -> int:
+    """
+    Publishes the outbox drafts of a run day (or of several, e.g. today and the days before it) to every
+    enabled posting target, resuming any thread that was interrupted. Each draft goes out to all targets concurrently (one worker per target, each with
+    its own rate limit), so adding a network does not add to the run's wall time.
+    If `stop_event` is set while waiting between posts, stops early (the outbox keeps the rest pending).
+    Drafts already posted on some target are resumed first and count against max_posts_per_run (applied per
+    run day). With an
+    engagement store, the remaining slots go to the drafts whose prompt/source got the most engagement
+    so far, and published posts are recorded in it.
+    Returns the number of primary posts sent by this call (a draft counts once, however many targets).
+    """
+    llm_config = config.llm
+    persona = config.persona
 
     # 3. Post Generated Content (with Follow-up Logic)
     print("\n--- Posting Content ---")
-    if not generated_content_list:
-        print("No posts were generated from any source. Nothing to post.")
+    run_dates = [run_date] if isinstance(run_date, str) else list(run_date)
+    drafts = [entry for day in run_dates for entry in outbox.entries(day)]
+    if not drafts:
+        print(f"No drafts in the outbox for {', '.join(run_dates)}. Nothing to post.")
+        return 0
+
+    targets = build_posting_targets(config)
+    max_posts = config.max_posts_per_run
+    sleep_time = config.sleep_between_posts # Get the sleep time
+    enable_follow_up = any(target.enable_follow_up for target in targets.values())
+    follow_up_delay = 10 # seconds between the original post and its follow-up reply
+
+    # --- Corrected access to follow_up_prompts (nested inside source_prompts) --- 
+    follow_up_prompts = llm_config.get('source_prompts', {}).get('follow_up_prompts', {})
+    # --------------------------------------------------------------------------
+
+    if engagement:
+        drafts = rank_drafts(drafts, engagement.aggregates())
+    # Per run day, drafts already (partly) posted are always finished and count against max_posts; the rest fill the remaining slots
+    content_to_send = []
+    for day in run_dates:
+        day_drafts = [entry for entry in drafts if entry['run_date'] == day]
+        started = [entry for entry in day_drafts if Outbox.is_started(entry)]
+        content_to_send += started + [entry for entry in day_drafts if not Outbox.is_started(entry)][:max(0, max_posts - len(started))]
+    pending = [entry for entry in content_to_send if any(not Outbox.is_done(entry, key, target.enable_follow_up, target.split) for key, target in targets.items())]
+    print(f"Attempting to send {len(content_to_send)} primary posts (out of {len(drafts)} drafted) to {', '.join(targets) or 'no targets'}; {len(pending)} still pending.")
+    sent_before = {entry['key'] for entry in content_to_send if any(Outbox.posted_ids(entry, target_key) for target_key in targets)}
+    posts_sent = set(sent_before)
+
+    if not targets:
+        print("No posting target is enabled and configured.", file=sys.stderr)
+    elif not pending:
+        print("All selected drafts were already published.")
     else:
-        posting_config = config.get('posting', {})
-        twitter_config = posting_config.get('targets', {}).get('twitter', {})
-        max_posts = posting_config.get('max_posts_per_run', 1)
-        sleep_time = posting_config.get('sleep_between_posts', 90) # Get the sleep time
-        enable_follow_up = twitter_config.get('enable_follow_up', False)
-        
-        # --- Corrected access to follow_up_prompts (nested inside source_prompts) --- 
-        follow_up_prompts = llm_config.get('source_prompts', {}).get('follow_up_prompts', {})
-        # --------------------------------------------------------------------------
-        
-        # ---- DEBUG: Check the correctly loaded follow-up prompts ----
-        # print(f"[DEBUG] Follow-up prompts dictionary: {follow_up_prompts}") # No longer needed
-        # -----------------------------------------------
-
-        content_to_send = generated_content_list[:max_posts]
-        print(f"Attempting to send {len(content_to_send)} primary posts (out of {len(generated_content_list)} generated).")
-        posts_sent_count = 0
-
-        if twitter_config.get('enabled'):
-            print(f"Posting to Twitter...")
-            tw_api_key = get_secret(twitter_config.get('api_key_env_var'))
-            tw_api_secret = get_secret(twitter_config.get('api_secret_env_var'))
-            tw_access_token = get_secret(twitter_config.get('access_token_env_var'))
-            tw_access_secret = get_secret(twitter_config.get('access_token_secret_env_var'))
-
-            if all([tw_api_key, tw_api_secret, tw_access_token, tw_access_secret]):
-                for i, content_item in enumerate(content_to_send):
-                    print(f"\nProcessing post {i+1}/{len(content_to_send)}...")
-                    original_tweet_text = content_item["tweet_text"]
-                    source_key = content_item["source"]
-                    first_activity = content_item["first_activity"]
-
-                    # --- Post Original Tweet ---
-                    print(f"Posting original tweet for {source_key}...")
-                    original_tweet_id = twitter_poster.post_tweet(
-                        original_tweet_text,
-                        tw_api_key, tw_api_secret, tw_access_token, tw_access_secret
-                    )
-
-                    if original_tweet_id:
-                        posts_sent_count += 1
-                        print(f"Original tweet for {source_key} posted successfully (ID: {original_tweet_id}).")
-
-                        # --- Attempt Follow-up Comment ---
-                        if enable_follow_up and first_activity:
-                            # ---- Select follow-up prompt based on the *actual* source_key ('github', 'garmin', or 'garmin_daily') ----
-                            print(f"[DEBUG] Attempting follow-up for source_key: '{source_key}'")
-                            follow_up_prompt = follow_up_prompts.get(source_key)
-                            print(f"[DEBUG] Result of follow_up_prompts.get('{source_key}'): {follow_up_prompt is not None}")
-                            # ------------------------------------------------------------------------------------------------
-                            if follow_up_prompt:
-                                print(f"Generating follow-up comment for {source_key} tweet...")
+        gemini_api_key = get_secret("GEMINI_API_KEY") if enable_follow_up else None
+        with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="post") as pool:
+            for i, content_item in enumerate(pending):
+                print(f"\nProcessing post {i+1}/{len(pending)} ({content_item['key']})...")
+                original_tweet_text = content_item["tweet_text"]
+                source_key = content_item["source"]
+                first_activity = content_item["first_activity"]
+
+                # --- Generate Follow-up Comment once; it is stored so a resumed run reuses it ---
+                if content_item.get('follow_up') is None:
+                    comment_text = None
+                    if enable_follow_up and first_activity:
+                        # ---- Select follow-up prompt based on the *actual* source_key ('github', 'garmin', or 'garmin_daily') ----
+                        follow_up_prompt = follow_up_prompts.get(source_key)
+                        # ------------------------------------------------------------------------------------------------
+                        if follow_up_prompt and gemini_api_key:
+                            print(f"Generating follow-up comment for {source_key} post...")
+                            with stage(f"generate_follow_up:{content_item['key']}"):
                                 comment_text = generate_follow_up_comment(
                                     original_tweet_text=original_tweet_text,
                                     activity=first_activity,
@@ -230,51 +466,185 @@ def run_update():
                                     gemini_api_key=gemini_api_key,
                                     specific_follow_up_prompt=follow_up_prompt
                                 )
-                                if comment_text:
-                                    print(f"Generated follow-up: {comment_text[:100]}...")
-                                    # --- Restore delay before posting reply ---
-                                    follow_up_delay = 10 # seconds
-                                    print(f"Waiting {follow_up_delay}s before posting follow-up...")
-                                    time.sleep(follow_up_delay)
-                                    # ------------------------------------------
-
-                                    print(f"Posting follow-up comment for {source_key} tweet {original_tweet_id}...")
-                                    reply_tweet_id = twitter_poster.post_tweet(
-                                        comment_text,
-                                        tw_api_key, tw_api_secret, tw_access_token, tw_access_secret,
-                                        in_reply_to_tweet_id=original_tweet_id # Pass original ID
-                                    )
-                                    if not reply_tweet_id:
-                                        print(f"Warning: Failed to post follow-up comment for tweet {original_tweet_id}.", file=sys.stderr)
-                                else:
-                                    print(f"LLM did not generate a follow-up comment for {source_key}.")
+                            if comment_text:
+                                print(f"Generated follow-up: {comment_text[:100]}...")
                             else:
-                                print(f"No follow-up prompt found for source '{source_key}'. Skipping follow-up.")
+                                print(f"LLM did not generate a follow-up comment for {source_key}.")
                         else:
-                             print(f"Follow-up comments disabled or no activity data for {source_key}. Skipping.")
-                        # ------------------------------
-
+                            print(f"No follow-up prompt (or Gemini key) for source '{source_key}'. Skipping follow-up.")
                     else:
-                        print(f"Failed to post original tweet {i+1} for {source_key}. Continuing...")
-
-                    # --- Restore sleep between PRIMARY posts --- 
-                    # Check if more primary posts are needed AND if it's not the very last one in the loop
-                    if posts_sent_count < len(content_to_send) and i < len(content_to_send) - 1: 
-                       print(f"Sleeping for {sleep_time} seconds before next primary post...")
+                         print(f"Follow-up comments disabled or no activity data for {source_key}. Skipping.")
+                    outbox.set_follow_up(content_item['key'], comment_text)
+                    content_item = outbox.get(content_item['key'])
+                # ------------------------------
+
+                # --- Fan the thread out to every target that still needs it, concurrently ---
+                futures = {
+                    pool.submit(publish_to_target, target, outbox, content_item, follow_up_delay, engagement): target_key
+                    for target_key, target in targets.items()
+                    if not Outbox.is_done(content_item, target_key, target.enable_follow_up, target.split)
+                }
+                posted_now = False
+                for future in as_completed(futures):
+                    target_key = futures[future]
+                    try:
+                        all_ids = future.result()
+                    except Exception as e:
+                        print(f"Error posting {content_item['key']} to {target_key}: {e}", file=sys.stderr)
+                        continue
+                    expected = len(Outbox.thread_parts(content_item, targets[target_key].enable_follow_up, targets[target_key].split))
+                    if all_ids:
+                        posted_now = True
+                        posts_sent.add(content_item['key'])
+                        print(f"Original post for {source_key} is on {target_key} (ID: {all_ids[0]}).")
+                        if len(all_ids) < expected:
+                            print(f"Warning: Thread on {target_key} stopped after {len(all_ids)}/{expected} part(s) (last ID: {all_ids[-1]}); the next run resumes it.", file=sys.stderr)
+                    else:
+                        print(f"Failed to post {content_item['key']} to {target_key}. Continuing...")
+                # ------------------------------------------------------------------------------
+
+                # --- Restore sleep between PRIMARY posts --- 
+                # Only sleep if something went out and another pending post follows
+                if posted_now and i < len(pending) - 1: 
+                   print(f"Sleeping for {sleep_time} seconds before next primary post...")
+                   if stop_event:
+                       if stop_event.wait(sleep_time):
+                           print("Stop requested. Leaving remaining drafts pending in the outbox.")
+                           break
+                   else:
                        time.sleep(sleep_time)
-                    # ---------------------------------------------
-                    
-            else:
-                print("Skipping Twitter posting due to missing API credentials.", file=sys.stderr)
-        else:
-             print("Twitter posting target not enabled.")
+                # ---------------------------------------------
+
+    print(f"\n--- Summary ---")
+    print(f"Total drafts for {', '.join(run_dates)}: {len(drafts)}.")
+    print(f"Attempted to send: {len(content_to_send)} primary posts.")
+    print(f"Successfully posted: {len(posts_sent)} primary posts.") # Only count primary posts
+    return len(posts_sent) - len(sent_before)
+
+def run_config(
+    config: AppConfig,
+    mode: str = "run",
+    run_date: str | None = None,
+    clients: ClientPool | None = None,
+    limiter: RateLimiter | None = None,
+) -> dict:
+    """
+    One generate and/or publish pass for one config (one account in batch mode).
+    Returns {"drafts", "posts", "generate_s", "publish_s"}; the timings are 0 for a skipped stage.
+    """
+    # --- Durable outbox shared by both stages ---
+    outbox = Outbox(config.section('storage').get('outbox_path', DEFAULT_OUTBOX_PATH))
+    run_date = run_date or datetime.now(timezone.utc).date().isoformat()
+    # ---------------------------------------------
+    result = {"drafts": 0, "posts": 0, "generate_s": 0.0, "publish_s": 0.0}
+
+    if mode in ("run", "generate"):
+        started = time.perf_counter()
+        result["drafts"] = generate_drafts(config, outbox, run_date, clients=clients, limiter=limiter)
+        result["generate_s"] = time.perf_counter() - started
+        print(f"\n{result['drafts']} new draft(s) written to {outbox.path}.")
+    if mode in ("run", "publish"):
+        started = time.perf_counter()
+        engagement = open_engagement_store(config)
+        try:
+            if engagement:
+                collect_engagement(config, engagement) # Fresh metrics for this run's draft selection
+            result["posts"] = publish_drafts(config, outbox, run_date, engagement=engagement)
+        finally:
+            if engagement:
+                engagement.close()
+        result["publish_s"] = time.perf_counter() - started
+    return result
+
+def run_update(mode: str = "run", run_date: str | None = None):
+    """Main coordinating function for the update process ('generate', 'publish' or both with 'run')."""
+    
+    # # --- Randomized Start Delay (Temporarily Disabled for Testing) ---
+    # sleep_minutes = random.randint(0, 240) # Random delay between 0 and 240 minutes (4 hours)
+    # if sleep_minutes > 0:
+    #   print(f"Sleeping for {sleep_minutes} minutes to randomize start time...")
+    #   time.sleep(sleep_minutes * 60)
+    #   print("Waking up and starting the process...")
+    # else:
+    #   print("Starting process immediately (no random delay).")
+    # # ------------------------------------------------------------------
 
-        print(f"\n--- Summary ---")
-        print(f"Total posts generated across all sources: {len(generated_content_list)}.")
-        print(f"Attempted to send: {len(content_to_send)} primary posts.")
-        print(f"Successfully posted: {posts_sent_count} primary posts.") # Only count primary posts
+    print(f"=== Starting githubX Run ({mode}) at {datetime.now(timezone.utc).isoformat()} ===")
+
+    # 1. Load Configuration
+    with stage("config_load"):
+        config = load_config()
+    if not config:
+        print("Exiting due to configuration loading failure.", file=sys.stderr)
+        return
+
+    run_config(config, mode, run_date)
 
     print(f"=== Run Finished at {datetime.now(timezone.utc).isoformat()} ===")
 
+def main():
+    parser = argparse.ArgumentParser(description="Fetch daily activity, generate posts with an LLM and publish them.")
+    parser.add_argument(
+        "mode", nargs="?", default="run", choices=["run", "generate", "publish", "serve", "backfill", "batch"],
+        help="'generate' writes drafts to the outbox, 'publish' posts pending drafts, 'run' (default) does both once (for cron), "
+             "'serve' runs as a long-lived process with an internal scheduler, 'backfill' writes drafts for past days (--from/--to) for review, "
+             "'batch' does a 'run' for every account profile in --accounts in one process."
+    )
+    parser.add_argument("--date", dest="run_date", help="Run day (YYYY-MM-DD, UTC) whose drafts to generate/publish. Defaults to today.")
+    parser.add_argument(
+        "--profile", nargs="?", const="", default=None, metavar="DIR",
+        help="Profile each stage (config load, source fetch, generation, post) with cProfile + tracemalloc and write "
+             ".pstats / allocation summaries to DIR (default: artifacts/profile/<timestamp>)."
+    )
+    parser.add_argument("--from", dest="from_date", type=date.fromisoformat, help="backfill: first day (YYYY-MM-DD, UTC).")
+    parser.add_argument("--to", dest="to_date", type=date.fromisoformat, help="backfill: last day, inclusive (default: yesterday).")
+    parser.add_argument("--workers", type=int, help="backfill: worker threads (default: backfill.workers in config); "
+                                                    "batch: accounts run at once (default: batch.max_concurrent_accounts).")
+    parser.add_argument("--out", dest="output_dir", help="backfill: output directory for drafts (default: backfill.output_dir in config).")
+    parser.add_argument("--accounts", help="batch: account profiles file (default: batch.accounts_path in config, else accounts.yaml).")
+    parser.add_argument("--report", dest="report_path", help="batch: also write the per-account summary as JSON to this path.")
+    args = parser.parse_args()
+    if args.profile is not None:
+        profiler.enable(args.profile or None)
+    if args.mode == "backfill":
+        if not args.from_date:
+            parser.error("backfill requires --from YYYY-MM-DD")
+        from src.backfill import run_backfill
+        with stage("config_load"):
+            config = load_config()
+        run_backfill(
+            config,
+            args.from_date,
+            args.to_date or datetime.now(timezone.utc).date() - timedelta(days=1),
+            fetch_source_activities,
+            select_prompt,
+            workers=args.workers,
+            output_dir=args.output_dir,
+        )
+    elif args.mode == "batch":
+        from src.batch import run_batch, load_accounts, DEFAULT_ACCOUNTS_PATH
+        with stage("config_load"):
+            config = load_config()
+        try:
+            profiles = load_accounts(config, args.accounts or config.section('batch').get('accounts_path', DEFAULT_ACCOUNTS_PATH))
+        except ConfigError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        run_date = args.run_date or datetime.now(timezone.utc).date().isoformat()
+        results = run_batch(
+            config,
+            profiles,
+            lambda account_config, **shared: run_config(account_config, "run", run_date, **shared),
+            max_concurrent=args.workers,
+            report_path=args.report_path,
+        )
+        if any(result["status"] != "ok" for result in results):
+            sys.exit(1)
+    elif args.mode == "serve":
+        from src.daemon import serve
+        serve(generate_drafts, publish_drafts, collect_engagement)
+    else:
+        run_update(args.mode, args.run_date)
+
 if __name__ == "__main__":
-    run_update()
\ No newline at end of file
+    main()
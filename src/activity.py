@@ -0,0 +1,248 @@
+"""
+Compact, typed activity records shared by all data sources and the generator.
+
+Every record is a slotted dataclass that is also a read-only Mapping, so prompt templates
+(`format(**record)`) and existing `activity.get('summary')` / `activity['details']` call sites
+keep working. Garmin daily context is interned: all activities of a day share one object.
+"""
+
+import os
+import zlib
+import marshal
+import weakref
+import functools
+from array import array
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
+
+NA = "N/A"
+
+@functools.cache
+def _field_names(cls) -> tuple[str, ...]:
+    return tuple(f.name for f in fields(cls))
+
+@functools.cache
+def _field_set(cls) -> frozenset[str]:
+    return frozenset(_field_names(cls))
+
+class RecordMapping(Mapping):
+    """Read-only Mapping view over a slotted dataclass's fields."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in _field_set(type(self)):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(_field_names(type(self)))
+
+    def __len__(self):
+        return len(_field_names(type(self)))
+
+    def __contains__(self, key):
+        return key in _field_set(type(self))
+
+    def to_dict(self) -> dict:
+        """Plain (recursive) dict copy, e.g. for JSON."""
+        return {key: value.to_dict() if isinstance(value, RecordMapping) else value for key, value in zip(_field_names(type(self)), self._values())}
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in _field_names(type(self)))
+
+@dataclass(slots=True, frozen=True, weakref_slot=True)
+class DailyContext(RecordMapping):
+    """Garmin daily stats + sleep of one day. Build with DailyContext.intern() so equal days share one object."""
+    daily_steps: object = NA
+    stress_qualifier: object = NA
+    avg_stress_level: object = NA
+    resting_hr: object = NA
+    body_battery_charged: object = NA
+    body_battery_drained: object = NA
+    sleep_duration_hr: object = NA
+    sleep_duration_formatted: object = NA
+    deep_sleep_percent: object = NA
+    rem_sleep_percent: object = NA
+    light_sleep_percent: object = NA
+    awake_duration_formatted: object = NA
+    sleep_score: object = NA
+
+    @classmethod
+    def intern(cls, **values) -> "DailyContext":
+        """Returns the canonical instance for these values (unknown keys are ignored)."""
+        context = cls(**{k: v for k, v in values.items() if k in _field_set(cls)})
+        key = context._values()
+        try:
+            existing = _daily_context_pool.get(key)
+        except TypeError: # unhashable value from the API; just don't share it
+            return context
+        if existing is not None:
+            return existing
+        _daily_context_pool[key] = context
+        return context
+
+# Canonical DailyContext per value tuple; entries vanish once no activity references them
+_daily_context_pool: "weakref.WeakValueDictionary[tuple, DailyContext]" = weakref.WeakValueDictionary()
+
+@dataclass(slots=True, frozen=True)
+class CommitDetails(RecordMapping):
+    repo_name: str
+    repo_full_name: str
+    message: str
+    sha: str
+
+@dataclass(slots=True, frozen=True)
+class GarminActivityDetails(RecordMapping):
+    activity_id: object
+    distance_km: float
+    duration_seconds: float | None
+    duration_formatted: str
+    average_hr: float | None
+    max_hr: float | None
+    calories: float | None
+    daily_context: DailyContext
+    samples: Mapping | None = None # {"elapsed_s", "hr", "speed_mps"} as array('d'), for charts
+    weekly: Mapping | None = None # {"days", "steps", "sleep_hours"}, for charts
+    fit_metrics: Mapping | None = None # Metrics from the FIT file (see GARMIN_FIT_FIELDS), when enabled
+
+@dataclass(slots=True, frozen=True)
+class DailySummaryDetails(RecordMapping):
+    daily_context: DailyContext
+    weekly: Mapping | None = None
+
+@dataclass(slots=True, frozen=True)
+class Activity(RecordMapping):
+    """One normalized activity: {source, timestamp, type, summary, details, url}."""
+    source: str
+    timestamp: datetime | None
+    type: str
+    summary: str
+    details: RecordMapping | None = None
+    url: str | None = None
+
+def activity_key(activity: Mapping) -> str:
+    """Stable identity of an activity across fetches (tells activities that arrived since the last generation)."""
+    timestamp = activity.get('timestamp')
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    return f"{activity.get('source')}|{activity.get('url') or ''}|{timestamp or ''}"
+
+def activity_ref(activity: Mapping) -> dict:
+    """
+    Small JSON-safe reference to an activity, as stored with an outbox draft: what the follow-up
+    prompt and engagement stats read (source, summary, url) plus its identity. No samples/weekly arrays.
+    """
+    timestamp = activity.get('timestamp')
+    details = activity.get('details') or {}
+    ref = {
+        "source": activity.get('source'),
+        "type": activity.get('type'),
+        "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        "summary": activity.get('summary'),
+        "url": activity.get('url'),
+        "key": activity_key(activity),
+    }
+    for id_field in ('activity_id', 'sha'):
+        if details.get(id_field) is not None:
+            ref[id_field] = details[id_field]
+    return ref
+
+# --- Compact binary store ---
+# Layout: MAGIC + zlib(marshal((contexts, records))). Daily contexts are written once and referenced
+# by index; details are (kind, values) tuples. marshal is fast and compact but only meant for our own
+# local files (never load untrusted data), and its format may change between Python versions, which
+# is why the Python version is part of the header.
+MAGIC = b"GXA1"
+_DETAILS_KINDS = {CommitDetails: 1, GarminActivityDetails: 2, DailySummaryDetails: 3}
+_DETAILS_CLASSES = {kind: cls for cls, kind in _DETAILS_KINDS.items()}
+
+def _plain(value):
+    """Converts mapping/array values to marshal-able builtins."""
+    if isinstance(value, array):
+        return ("a", value.typecode, value.tobytes())
+    if isinstance(value, Mapping):
+        return ("m", tuple((k, _plain(v)) for k, v in value.items()))
+    return value
+
+def _unplain(value):
+    if isinstance(value, tuple) and value and value[0] == "a":
+        restored = array(value[1])
+        restored.frombytes(value[2])
+        return restored
+    if isinstance(value, tuple) and value and value[0] == "m":
+        return {k: _unplain(v) for k, v in value[1]}
+    return value
+
+def dumps_activities(activities: list[Activity]) -> bytes:
+    contexts: list[tuple] = []
+    context_index: dict[int, int] = {} # id(DailyContext) -> index
+    records = []
+    for activity in activities:
+        details = activity.details
+        encoded_details = None
+        if details is not None:
+            kind = _DETAILS_KINDS[type(details)]
+            values = []
+            for name, value in zip(_field_names(type(details)), details._values()):
+                if name == "daily_context":
+                    if id(value) not in context_index:
+                        context_index[id(value)] = len(contexts)
+                        contexts.append(value._values())
+                    value = context_index[id(value)]
+                values.append(_plain(value))
+            encoded_details = (kind, tuple(values))
+        timestamp = activity.timestamp.timestamp() if activity.timestamp else None
+        records.append((activity.source, timestamp, activity.type, activity.summary, encoded_details, activity.url))
+    header = MAGIC + bytes([marshal.version])
+    return header + zlib.compress(marshal.dumps((tuple(contexts), tuple(records))), 6)
+
+def loads_activities(data: bytes) -> list[Activity]:
+    if data[:4] != MAGIC:
+        raise ValueError("Not an activity store (bad magic).")
+    if data[4] != marshal.version:
+        raise ValueError(f"Activity store was written with marshal version {data[4]}, this Python uses {marshal.version}.")
+    contexts, records = marshal.loads(zlib.decompress(data[5:]))
+    context_objects = [DailyContext.intern(**dict(zip(_field_names(DailyContext), values))) for values in contexts]
+    activities = []
+    for source, timestamp, activity_type, summary, encoded_details, url in records:
+        details = None
+        if encoded_details is not None:
+            kind, values = encoded_details
+            cls = _DETAILS_CLASSES[kind]
+            kwargs = {}
+            for name, value in zip(_field_names(cls), values):
+                kwargs[name] = context_objects[value] if name == "daily_context" else _unplain(value)
+            details = cls(**kwargs)
+        activities.append(Activity(
+            source=source,
+            timestamp=datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp is not None else None,
+            type=activity_type,
+            summary=summary,
+            details=details,
+            url=url,
+        ))
+    return activities
+
+def dump_activities(activities: list[Activity], path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(dumps_activities(activities))
+    os.replace(tmp_path, path)
+
+def load_activities(path: str) -> list[Activity]:
+    with open(path, 'rb') as f:
+        return loads_activities(f.read())
+
+def json_default(value):
+    """`default=` hook for json.dumps so records, datetimes and sample arrays serialize."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, RecordMapping):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, array):
+        return value.tolist()
+    return str(value)
@@ -0,0 +1,136 @@
+"""Backfill mode: generate drafts for past days, fanning (day, source) tasks out over a thread pool under one global rate budget."""
+
+import os
+import sys
+import json
+import time
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+from .activity import Activity, dump_activities, json_default
+from .config_loader import AppConfig, get_secret
+from .clients import ClientPool
+from .data_sources import SourceError
+from .ratelimit import RateLimiter
+from .llm.generator import generate_posts
+
+DEFAULT_BACKFILL_DIR = 'data/backfill'
+DEFAULT_WORKERS = 4
+DEFAULT_RATE_LIMIT_PER_MINUTE = 30 # Shared by every source API request and LLM call across all workers
+
+def _write_json(path: str, payload: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2, default=json_default)
+    os.replace(tmp_path, path)
+
+def _backfill_one(
+    config: AppConfig,
+    day: date,
+    source_key: str,
+    output_dir: str,
+    fetch: Callable[..., list[Activity]],
+    select_prompt: Callable[[AppConfig, str, Activity], tuple[str, str | None]],
+    clients: ClientPool,
+    limiter: RateLimiter,
+    gemini_api_key: str,
+) -> tuple[str, int]:
+    """
+    Fetches and generates one (day, source). Returns (status, number of drafts). `fetch` raises SourceError
+    when the source failed; only a fetch that succeeded with no activities is recorded as an empty day.
+    """
+    out_path = os.path.join(output_dir, day.isoformat(), f"{source_key}.json")
+    if os.path.exists(out_path):
+        return "skipped", 0 # Already done in an earlier (possibly interrupted) backfill
+
+    try:
+        activities = fetch(source_key, config.sources[source_key], clients, day=day, limiter=limiter)
+    except SourceError as e:
+        print(f"[Backfill] {day} {source_key}: fetch failed: {e}", file=sys.stderr)
+        return "failed", 0 # Not written, so the next backfill retries this day
+
+    if not activities:
+        _write_json(out_path, {"day": day.isoformat(), "source": source_key, "prompt_key": None, "posts": [], "activities": []})
+        return "empty", 0
+
+    prompt_key, prompt = select_prompt(config, source_key, activities[0])
+    limiter.acquire()
+    posts = generate_posts(activities, config.llm, config.persona, gemini_api_key, specific_prompt_template=prompt)
+    if not posts:
+        return "failed", 0 # Not written, so the next backfill retries this day
+
+    # Full records (incl. chart samples) in the compact binary store; written before the JSON,
+    # whose existence is what marks the task as done
+    dump_activities(activities, os.path.join(output_dir, day.isoformat(), f"{source_key}.activities.gxa"))
+    _write_json(out_path, {
+        "day": day.isoformat(),
+        "source": source_key,
+        "prompt_key": prompt_key,
+        "posts": posts,
+        "activities": [
+            {"timestamp": a.get('timestamp'), "type": a.get('type'), "summary": a.get('summary'), "url": a.get('url')}
+            for a in activities
+        ],
+    })
+    return "drafted", len(posts)
+
+def run_backfill(
+    config: AppConfig,
+    start: date,
+    end: date,
+    fetch: Callable[..., list[Activity]],
+    select_prompt: Callable[[AppConfig, str, Activity], tuple[str, str | None]],
+    workers: int | None = None,
+    output_dir: str | None = None,
+    clients: ClientPool | None = None,
+    limiter: RateLimiter | None = None,
+) -> dict[str, int]:
+    """
+    Generates drafts for every day in [start, end] and every enabled source, writing
+    `<output_dir>/<day>/<source>.json` for review (plus the full activity records as
+    `<source>.activities.gxa`, see src/activity.py). Days already written are skipped, so an
+    interrupted backfill can simply be re-run. Returns counts per task status.
+    """
+    backfill_conf = config.section('backfill')
+    workers = workers or int(backfill_conf.get('workers', DEFAULT_WORKERS))
+    output_dir = output_dir or backfill_conf.get('output_dir', DEFAULT_BACKFILL_DIR)
+    clients = clients or ClientPool()
+    limiter = limiter or RateLimiter(float(backfill_conf.get('rate_limit_per_minute', DEFAULT_RATE_LIMIT_PER_MINUTE)), per=60.0)
+
+    gemini_api_key = get_secret("GEMINI_API_KEY")
+    if not gemini_api_key:
+        print("[Backfill] Exiting because Gemini API Key (GEMINI_API_KEY) was not found.", file=sys.stderr)
+        return {}
+    if end < start:
+        print(f"[Backfill] Error: --to ({end}) is before --from ({start}).", file=sys.stderr)
+        return {}
+
+    sources = [key for key, source in config.sources.items() if source.enabled]
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    tasks = [(day, source_key) for day in days for source_key in sources]
+    print(f"[Backfill] {len(days)} day(s) x {len(sources)} source(s) = {len(tasks)} task(s) on {workers} worker(s), "
+          f"budget {limiter.rate:g} calls/{limiter.per:g}s. Writing to {output_dir}/")
+
+    counts = {"drafted": 0, "empty": 0, "skipped": 0, "failed": 0, "drafts": 0}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+        futures = {
+            pool.submit(_backfill_one, config, day, source_key, output_dir, fetch, select_prompt, clients, limiter, gemini_api_key): (day, source_key)
+            for day, source_key in tasks
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            day, source_key = futures[future]
+            try:
+                status, drafts = future.result()
+            except Exception as e:
+                print(f"[Backfill] {day} {source_key}: error: {e}", file=sys.stderr)
+                status, drafts = "failed", 0
+            counts[status] += 1
+            counts["drafts"] += drafts
+            print(f"[Backfill] [{done}/{len(tasks)}] {day} {source_key}: {status}" + (f" ({drafts} draft(s))" if drafts else ""))
+
+    clients.close()
+    print(f"[Backfill] Finished in {time.perf_counter() - started:.1f}s: {counts}")
+    return counts
@@ -0,0 +1,161 @@
+"""
+Batch mode: runs several account profiles (persona, sources, targets, credentials) in one process,
+sharing the client pool, caches and one global rate budget, with a bounded number of accounts at a
+time. Each profile is merged over config.yaml, so it only states what differs for that account.
+"""
+
+import os
+import sys
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable
+
+import yaml
+
+from .config_loader import AppConfig, ConfigError, compile_config
+from .clients import ClientPool
+from .ratelimit import RateLimiter
+
+DEFAULT_ACCOUNTS_PATH = 'accounts.yaml'
+DEFAULT_ACCOUNTS_DIR = 'data/accounts' # Per-account outbox / engagement store unless a profile sets its own
+DEFAULT_MAX_CONCURRENT_ACCOUNTS = 4
+DEFAULT_RATE_LIMIT_PER_MINUTE = 30 # Shared by every source API request and LLM call across all accounts
+
+@dataclass(frozen=True)
+class AccountProfile:
+    """One account of the batch; `config` is None (and `error` set) when its profile does not validate."""
+    name: str
+    config: AppConfig | None
+    error: str | None = None
+
+def merge_config(base: dict, override: dict) -> dict:
+    """Recursive merge: dicts are merged key by key, any other value in `override` replaces the base one."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def load_accounts(base: AppConfig, path: str = DEFAULT_ACCOUNTS_PATH) -> list[AccountProfile]:
+    """
+    Reads the accounts file: an optional `defaults` section plus a list of `accounts`, each with a
+    unique `name` and any config.yaml sections to override. Each profile is merged over config.yaml
+    (then `defaults`) and validated on its own, so one bad profile does not stop the others.
+    Raises ConfigError if the file itself is missing or malformed.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = yaml.safe_load(f)
+    except FileNotFoundError:
+        raise ConfigError(f"Accounts file not found at {path}")
+    except yaml.YAMLError as e:
+        raise ConfigError(f"Error parsing accounts file {path}: {e}")
+    if not isinstance(raw, dict) or not isinstance(raw.get('accounts'), list) or not raw['accounts']:
+        raise ConfigError(f"Accounts file {path} must have a non-empty 'accounts' list.")
+
+    defaults = raw.get('defaults') or {}
+    profiles = []
+    seen = set()
+    for index, account in enumerate(raw['accounts']):
+        name = str((account or {}).get('name') or f"account-{index + 1}")
+        if name in seen:
+            raise ConfigError(f"Accounts file {path}: duplicate account name '{name}'.")
+        seen.add(name)
+        overrides = {key: value for key, value in (account or {}).items() if key != 'name'}
+        # Accounts never share an outbox or engagement store, or they would publish each other's drafts
+        account_dir = os.path.join(DEFAULT_ACCOUNTS_DIR, name)
+        per_account = {
+            "storage": {"outbox_path": os.path.join(account_dir, "outbox.jsonl")},
+            "engagement": {"store_path": os.path.join(account_dir, "engagement.sqlite3")},
+        }
+        merged = merge_config(merge_config(merge_config(base.raw, per_account), defaults), overrides)
+        try:
+            config = compile_config(merged, path=f"{path}#{name}", sha256=base.sha256)
+        except ConfigError as e:
+            profiles.append(AccountProfile(name, None, str(e)))
+            continue
+        profiles.append(AccountProfile(name, config))
+    return profiles
+
+def _run_one(profile: AccountProfile, run_account: Callable[..., dict], clients: ClientPool, limiter: RateLimiter) -> dict:
+    """Runs one account, turning any exception into a failed result so the other accounts carry on."""
+    started = time.perf_counter()
+    result = {"account": profile.name, "status": "ok", "drafts": 0, "posts": 0, "generate_s": 0.0, "publish_s": 0.0, "error": None}
+    if profile.config is None:
+        result.update(status="invalid", error=profile.error)
+        return result
+    print(f"[Batch] {profile.name}: starting.")
+    try:
+        result.update(run_account(profile.config, clients=clients, limiter=limiter))
+    except Exception as e:
+        print(f"[Batch] {profile.name}: error: {e}", file=sys.stderr)
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["total_s"] = time.perf_counter() - started
+    return result
+
+def format_report(results: list[dict], wall_s: float) -> str:
+    """Per-account table (status, drafts, posts, stage timings) plus wall time vs. the sum of account times."""
+    header = f"{'account':<20} {'status':<8} {'drafts':>6} {'posts':>5} {'generate':>9} {'publish':>8} {'total':>8}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(f"{r['account'][:20]:<20} {r['status']:<8} {r['drafts']:>6} {r['posts']:>5} "
+                     f"{r['generate_s']:>8.1f}s {r['publish_s']:>7.1f}s {r.get('total_s', 0.0):>7.1f}s")
+    for r in results:
+        if r['error']:
+            lines.append(f"  {r['account']}: {r['error']}")
+    busy_s = sum(r.get('total_s', 0.0) for r in results)
+    failed = sum(r['status'] != "ok" for r in results)
+    lines.append(f"{len(results)} account(s), {failed} failed; wall {wall_s:.1f}s for {busy_s:.1f}s of account time.")
+    return "\n".join(lines)
+
+def run_batch(
+    base: AppConfig,
+    profiles: list[AccountProfile],
+    run_account: Callable[..., dict],
+    max_concurrent: int | None = None,
+    report_path: str | None = None,
+    clients: ClientPool | None = None,
+    limiter: RateLimiter | None = None,
+) -> list[dict]:
+    """
+    Runs `run_account(config, clients=, limiter=)` (main.run_config) for every profile, at most
+    `max_concurrent` accounts at a time, all sharing one ClientPool and one RateLimiter. Prints the
+    summary report (also written as JSON to `report_path`) and returns one result per account, in
+    profile order.
+    """
+    batch_conf = base.section('batch')
+    max_concurrent = max_concurrent or int(batch_conf.get('max_concurrent_accounts', DEFAULT_MAX_CONCURRENT_ACCOUNTS))
+    report_path = report_path or batch_conf.get('report_path')
+    clients = clients or ClientPool()
+    limiter = limiter or RateLimiter(float(batch_conf.get('rate_limit_per_minute', DEFAULT_RATE_LIMIT_PER_MINUTE)), per=60.0)
+
+    print(f"[Batch] {len(profiles)} account(s), at most {max_concurrent} at a time, "
+          f"budget {limiter.rate:g} API/LLM calls/{limiter.per:g}s.")
+    started = time.perf_counter()
+    results: dict[str, dict] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="account") as pool:
+            futures = {pool.submit(_run_one, profile, run_account, clients, limiter): profile.name for profile in profiles}
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                results[futures[future]] = result
+                print(f"[Batch] [{done}/{len(profiles)}] {result['account']}: {result['status']}")
+    finally:
+        clients.close()
+    wall_s = time.perf_counter() - started
+
+    ordered = [results[profile.name] for profile in profiles]
+    print("\n=== Batch Summary ===")
+    print(format_report(ordered, wall_s))
+    if report_path:
+        directory = os.path.dirname(report_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({"wall_s": wall_s, "accounts": ordered}, f, ensure_ascii=False, indent=2)
+        print(f"[Batch] Report written to {report_path}")
+    return ordered
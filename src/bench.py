@@ -0,0 +1,300 @@
+"""
+Microbenchmarks for the pure-Python per-item hot paths: activity summary formatting (GitHub, Garmin),
+format_duration, and X's weighted length / splitting LLM output into threads; plus FIT record decoding.
+
+    python -m src.bench                      # run, compare with the stored baselines, exit 1 on regression
+    python -m src.bench --update-baseline    # run and store the results as the new baselines
+    python -m src.bench --sizes 10,1000 --filter garmin
+
+Inputs are synthetic and seeded, so runs are comparable. Every timing sample follows a sample of a fixed
+calibration loop, and results are compared in units of that loop (the median over several rounds), so a
+slower machine or a busy moment moves both alike. Baselines recorded on another machine are only held to
+CROSS_MACHINE_TOLERANCE; CI times the base commit in the same job instead (.github/workflows/benchmarks.yml).
+"""
+
+import io
+import sys
+import json
+import random
+import struct
+import platform
+import statistics
+import timeit
+import argparse
+import contextlib
+from datetime import date, datetime, timedelta, timezone
+
+from .activity import DailyContext
+from .data_sources import github_source, garmin_source, garmin_fit
+from .llm.generator import split_into_tweets
+from .posting.twitter_text import weighted_length, split_thread
+
+DEFAULT_BASELINE_PATH = 'benchmarks/baselines.json'
+DEFAULT_SIZES = (10, 1_000, 100_000)
+DEFAULT_TOLERANCE = 0.5 # Fail when more than 50% slower than a baseline recorded on this machine
+CROSS_MACHINE_TOLERANCE = 1.0 # Other CPUs / Python builds do not scale every hot path like the calibration loop
+SAMPLE_TIME = 0.05 # Seconds per timing sample (at least one call)
+ROUNDS = 7 # Interleaved calibration/benchmark samples per benchmark; the median is kept
+
+# Templates as used in config.yaml
+GITHUB_FORMAT = "- Commit to {repo}: {message}"
+GARMIN_FORMAT = ("- {activity_type}: {distance:.2f} km in {duration_formatted} (avg HR {avg_hr}, max HR {max_hr}, "
+                 "{calories} kcal). Steps today: {daily_steps}, sleep {sleep_duration_formatted} (score {sleep_score}).")
+
+_WORDS = ("refactor", "parser", "fix", "cache", "config", "deploy", "thread", "outbox", "chart", "garmin", "commit",
+          "latency", "pipeline", "retry", "rate", "limit", "daily", "summary", "sleep", "steps", "run", "ride",
+          "chạy bộ", "hôm nay", "nhịp tim", "giấc ngủ", "sửa lỗi")
+_EXTRAS = ("💪", "🏃‍♂️🔥", "https://github.com/votanlenhan/githubX", "🇻🇳 ✨", "日本語")
+
+# --- Synthetic inputs ---
+def synthetic_commits(count: int, seed: int = 1) -> list[tuple]:
+    """Arguments for github_source._build_commit_activity."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        (GITHUB_FORMAT, start + timedelta(minutes=i), f"repo{i % 37}", f"user/repo{i % 37}",
+         " ".join(rng.choices(_WORDS, k=rng.randint(3, 12))), f"{rng.getrandbits(160):040x}")
+        for i in range(count)
+    ]
+
+def synthetic_garmin_activities(count: int, seed: int = 2) -> list[dict]:
+    """Raw activities shaped like garminconnect's get_activities_by_date() items."""
+    rng = random.Random(seed)
+    kinds = ("running", "cycling", "walking", "lap_swimming", "strength_training")
+    return [
+        {
+            "activityId": 10_000_000 + i,
+            "activityType": {"typeKey": rng.choice(kinds)},
+            "startTimeGMT": f"2026-03-{1 + i % 28:02d} {rng.randint(5, 20):02d}:{rng.randint(0, 59):02d}:00",
+            "distance": rng.uniform(500, 60_000),
+            "duration": rng.uniform(600, 14_400),
+            "averageHR": rng.choice((None, rng.randint(90, 170))),
+            "maxHR": rng.randint(120, 195),
+            "calories": rng.uniform(50, 2_000),
+        }
+        for i in range(count)
+    ]
+
+def synthetic_daily_context(seed: int = 3) -> DailyContext:
+    rng = random.Random(seed)
+    return DailyContext.intern(daily_steps=rng.randint(2_000, 25_000), sleep_duration_formatted="7h 12m", sleep_score=rng.randint(40, 95),
+                               resting_hr=rng.randint(45, 70), stress_qualifier="Balanced")
+
+def synthetic_llm_output(tweet_count: int, seed: int = 4) -> str:
+    """
+    An LLM reply of `tweet_count` paragraphs mixing English, Vietnamese, emoji and links; about a
+    third exceed 280 (weighted) and need splitting.
+    """
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(tweet_count):
+        words = rng.randint(10, 40) if rng.random() < 0.66 else rng.randint(50, 90)
+        sentences = []
+        while words > 0:
+            count = min(words, rng.randint(5, 14))
+            sentences.append(" ".join(rng.choices(_WORDS, k=count)).capitalize() + rng.choice(".!?"))
+            words -= count
+        paragraphs.append(" ".join(sentences) + f" {rng.choice(_EXTRAS)} #buildinpublic")
+    return "\n\n".join(paragraphs)
+
+def synthetic_fit_file(records: int, seed: int = 6) -> bytes:
+    """
+    A FIT file of `records` one-second `record` messages (timestamp, HR, distance, speed, cadence,
+    altitude), with a few invalid HR samples, shaped like a watch's activity file. The CRCs are left
+    zero: the decoder does not check them.
+    """
+    rng = random.Random(seed)
+    fields = ((253, 4, 0x86), (3, 1, 0x02), (5, 4, 0x86), (6, 2, 0x84), (4, 1, 0x02), (2, 2, 0x84))
+    body = bytearray(struct.pack('<BBBHB', 0x40, 0, 0, garmin_fit.RECORD_MESG_NUM, len(fields)))
+    for field in fields:
+        body += bytes(field)
+    record = struct.Struct('<BIBIHBH')
+    timestamp, distance = 1_100_000_000, 0
+    for _ in range(records):
+        timestamp += 1
+        speed = rng.randint(2_500, 4_000) # mm/s
+        distance += speed // 10 # cm
+        heart_rate = 0xFF if rng.random() < 0.01 else rng.randint(110, 180)
+        body += record.pack(0x00, timestamp, heart_rate, distance, speed, rng.randint(80, 92), 3_000)
+    header = struct.pack('<BBHI4sH', 14, 0x20, 2134, len(body), b'.FIT', 0)
+    return header + bytes(body) + b'\x00\x00'
+
+class _FakeGarminClient:
+    """Serves synthetic activities to garmin_source.iter_activity (one day window)."""
+    def __init__(self, activities: list[dict]):
+        self._activities = activities
+    def get_stats(self, day):
+        return {"totalSteps": 12_345, "stressQualifier": "BALANCED", "restingHeartRate": 52}
+    def get_sleep_data(self, day):
+        return {"dailySleepDTO": {"sleepTimeSeconds": 26_000, "deepSleepSeconds": 5_000}}
+    def get_activities_by_date(self, start, end):
+        return self._activities
+
+# --- Benchmarks: name -> setup(size) returning (callable, items processed per call) ---
+def _bench_github_summary(size):
+    commits = synthetic_commits(size)
+    build = github_source._build_commit_activity
+    return (lambda: [build(*args) for args in commits]), size
+
+def _bench_garmin_summary(size):
+    activities = synthetic_garmin_activities(size)
+    context = synthetic_daily_context()
+    fmt = garmin_source.format_activity_summary
+    rows = [(a["activityType"]["typeKey"], a["distance"] / 1000.0, a["duration"], a["averageHR"], a["maxHR"], a["calories"]) for a in activities]
+    return (lambda: [fmt(GARMIN_FORMAT, context, *row) for row in rows]), size
+
+def _bench_garmin_iter_activity(size):
+    client = _FakeGarminClient(synthetic_garmin_activities(size))
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()): # The source logs every activity
+            return sum(1 for _ in garmin_source.iter_activity("u", "p", GARMIN_FORMAT, client=client, day=date(2026, 3, 1), window_days=0))
+    return run, size
+
+def _bench_decode_fit_records(size):
+    data = synthetic_fit_file(size)
+    return (lambda: garmin_fit.decode_fit_records(data)), size
+
+def _bench_format_duration(size):
+    rng = random.Random(5)
+    seconds = [rng.uniform(0, 20_000) for _ in range(size)]
+    format_duration = garmin_source.format_duration
+    return (lambda: [format_duration(s) for s in seconds]), size
+
+def _bench_weighted_length(size):
+    posts = split_into_tweets(synthetic_llm_output(size))
+    return (lambda: [weighted_length(post) for post in posts]), size
+
+def _bench_split_thread(size):
+    posts = split_into_tweets(synthetic_llm_output(size))
+    return (lambda: [split_thread(post) for post in posts]), size
+
+BENCHMARKS = {
+    "github_summary": _bench_github_summary,
+    "garmin_summary": _bench_garmin_summary,
+    "garmin_iter_activity": _bench_garmin_iter_activity,
+    "decode_fit_records": _bench_decode_fit_records,
+    "format_duration": _bench_format_duration,
+    "weighted_length": _bench_weighted_length,
+    "split_thread": _bench_split_thread,
+}
+
+def _calibration_work():
+    """A fixed mix of string formatting and dict work, as a machine speed reference."""
+    d = {}
+    for i in range(2_000):
+        d[f"k{i}"] = "{0}-{1:.2f}".format(i, i / 7)
+    return len(d)
+
+def _sampler(fn):
+    """A callable timing one sample of `fn` (about SAMPLE_TIME seconds of calls); returns seconds per call."""
+    timer = timeit.Timer(fn)
+    once = timer.timeit(1)
+    number = max(1, int(SAMPLE_TIME / max(once, 1e-9)))
+    return lambda: timer.timeit(number) / number
+
+def _measure(fn, calibration) -> tuple[float, float]:
+    """
+    (seconds per call, seconds per call / calibration seconds), each the median of ROUNDS samples. Every
+    sample of `fn` directly follows a calibration sample, so a slower (or busier) machine moves both alike.
+    """
+    sample = _sampler(fn)
+    seconds, relative = [], []
+    for _ in range(ROUNDS):
+        reference = calibration()
+        elapsed = sample()
+        seconds.append(elapsed)
+        relative.append(elapsed / reference)
+    return statistics.median(seconds), statistics.median(relative)
+
+def run_benchmarks(sizes=DEFAULT_SIZES, name_filter: str | None = None) -> dict:
+    """
+    Returns {"calibration_s": float, "results": {"<bench>[<size>]": {"seconds": s, "ns_per_item": ns, "relative": r}}},
+    where `relative` is the time in units of the calibration loop, which is what compare() checks.
+    """
+    calibration = _sampler(_calibration_work)
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if name_filter and name_filter not in name:
+            continue
+        for size in sizes:
+            fn, items = setup(size)
+            seconds, relative = _measure(fn, calibration)
+            key = f"{name}[{size}]"
+            results[key] = {"seconds": seconds, "ns_per_item": seconds / items * 1e9, "relative": relative}
+            print(f"{key:<32} {seconds * 1e3:10.3f} ms   {seconds / items * 1e9:10.1f} ns/item")
+    calibration_s = statistics.median(calibration() for _ in range(ROUNDS))
+    return {"calibration_s": calibration_s, "python": sys.version.split()[0], "machine": machine_id(), "results": results}
+
+def machine_id() -> str:
+    """Host, CPU architecture and Python version; baselines from elsewhere get CROSS_MACHINE_TOLERANCE."""
+    return f"{platform.node()}/{platform.machine()}/{platform.python_implementation()} {sys.version.split()[0]}"
+
+def compare(current: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """Returns one message per benchmark slower than its baseline (in calibration-loop units) by more than `tolerance`."""
+    scale = current["calibration_s"] / baseline["calibration_s"] if baseline.get("calibration_s") else 1.0
+    regressions = []
+    for key, result in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            continue
+        if base.get("relative") and result.get("relative"):
+            ratio = result["relative"] / base["relative"]
+        else: # Baseline from before per-sample calibration
+            ratio = result["seconds"] / (base["seconds"] * scale)
+        marker = "REGRESSION" if ratio > 1 + tolerance else "ok"
+        print(f"{key:<32} {ratio:6.2f}x baseline   {marker}")
+        if ratio > 1 + tolerance:
+            regressions.append(f"{key}: {ratio:.2f}x the baseline (allowed {1 + tolerance:.2f}x)")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the per-item formatting/splitting hot paths.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated input sizes (activities / tweets / FIT records).")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this string.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help=f"Baseline file (default: {DEFAULT_BASELINE_PATH}).")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the baseline instead of comparing.")
+    parser.add_argument("--tolerance", type=float, help=f"Allowed slowdown before failing (0.5 = 50%%; default {DEFAULT_TOLERANCE} "
+                        f"for a baseline from this machine, else {CROSS_MACHINE_TOLERANCE}).")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    current = run_benchmarks(sizes, args.filter)
+
+    if args.update_baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            stored = {}
+        if stored.get("machine") == current["machine"]: # Keep the entries of benchmarks not re-run this time
+            factor = stored["calibration_s"] / current["calibration_s"]
+            current["results"] = {**{k: {**v, "seconds": v["seconds"] / factor, "ns_per_item": v["ns_per_item"] / factor}
+                                     for k, v in stored.get("results", {}).items()}, **current["results"]}
+        elif stored.get("results"):
+            print(f"Replacing the baseline from {stored.get('machine', 'an unknown machine')} with this machine's results.")
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}.")
+        return 0
+
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.", file=sys.stderr)
+        return 0
+
+    tolerance = args.tolerance
+    if tolerance is None:
+        tolerance = DEFAULT_TOLERANCE if baseline.get("machine") == current["machine"] else CROSS_MACHINE_TOLERANCE
+    print(f"\n--- Compared with {args.baseline} from {baseline.get('machine', 'an unknown machine')} "
+          f"(calibration {current['calibration_s'] / baseline['calibration_s']:.2f}x, tolerance {tolerance:.0%}) ---")
+    regressions = compare(current, baseline, tolerance)
+    if regressions:
+        print("\nPerformance regressions:\n  - " + "\n  - ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Pool of authenticated API clients kept warm across runs of a long-lived process."""
+
+import sys
+import time
+import threading
+
+class SessionRejectedError(Exception):
+    """
+    Raised by a source when the service rejects a client handed in from a ClientPool (expired or
+    revoked session). The caller drops that client with ClientPool.invalidate() and retries once.
+    """
+
+class ClientPool:
+    """
+    Caches one logged-in client per (service, credentials). Clients older than `max_age`
+    seconds are re-created, and invalidate() drops one after an auth error so the next
+    call logs in again. Thread-safe; close() logs out whatever needs it.
+    Concurrent workers that miss the cache for the same key wait for one login instead of each
+    logging in (Garmin throttles and may lock an account on parallel logins).
+    """
+
+    def __init__(self, max_age: float = 12 * 3600):
+        self.max_age = max_age
+        self._clients: dict[tuple, tuple[float, object]] = {}
+        self._lock = threading.Lock()
+        self._login_locks: dict[tuple, threading.Lock] = {} # one per key: serializes that key's logins only
+
+    def _cached(self, key: tuple):
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry and time.monotonic() - entry[0] < self.max_age:
+                return entry[1]
+            return None
+
+    def _get(self, key: tuple, factory):
+        client = self._cached(key)
+        if client is not None:
+            return client
+        with self._lock:
+            login_lock = self._login_locks.setdefault(key, threading.Lock())
+        with login_lock: # Other keys/services are not blocked while this one logs in
+            client = self._cached(key) # Logged in by another worker while we waited
+            if client is None:
+                client = factory()
+                with self._lock:
+                    self._clients[key] = (time.monotonic(), client)
+        return client
+
+    def github(self, token: str):
+        import github
+        return self._get(("github", token), lambda: github.Github(token))
+
+    def garmin(self, username: str, password: str):
+        from garminconnect import Garmin
+
+        def login():
+            client = Garmin(username, password)
+            client.login()
+            print(f"[Client Pool] Garmin login successful for {username}.")
+            return client
+        return self._get(("garmin", username, password), login)
+
+    def invalidate(self, service: str, *credentials: str):
+        with self._lock:
+            self._clients.pop((service, *credentials), None)
+
+    def close(self):
+        with self._lock:
+            entries = list(self._clients.items())
+            self._clients.clear()
+        for key, (_, client) in entries:
+            if key[0] == "garmin":
+                try:
+                    client.logout()
+                except Exception as e:
+                    print(f"[Client Pool] Error during Garmin logout: {e}", file=sys.stderr)
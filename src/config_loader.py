@@ -1,29 +1,346 @@
 import yaml
 import os
 import sys
+import string
+import pickle
+import hashlib
+from dataclasses import dataclass, field, fields
 
 DEFAULT_CONFIG_PATH = 'config.yaml'
+# Compiled configs are pickled here, keyed by config path; reused while the file's mtime/size/hash match
+DEFAULT_CONFIG_CACHE_DIR = 'data/cache'
+# Bump when the compiled structure changes so stale caches are ignored (changes to the template
+# field tables and config dataclasses are caught anyway, see _schema_fingerprint)
+CONFIG_SCHEMA_VERSION = 2
 
-def load_config(config_path: str = DEFAULT_CONFIG_PATH) -> dict:
-    """Tải cấu hình từ file YAML."""
-    print(f"Loading configuration from: {config_path}")
-    if not os.path.exists(config_path):
-        print(f"Error: Configuration file not found at {config_path}", file=sys.stderr)
-        sys.exit(1)
+class ConfigError(ValueError):
+    """Raised when config.yaml is missing, unparsable or fails validation."""
+
+# --- Placeholders each template can use, with a representative sample value of the real type ---
+# The sample values let validation also catch bad format specs (e.g. '{repo:.1f}').
+GITHUB_FORMAT_FIELDS = {
+    "repo": "octocat/hello-world",
+    "message": "Fix typo in README",
+}
+GARMIN_DAILY_FIELDS = {
+    "daily_steps": 8500,
+    "stress_qualifier": "Balanced",
+    "avg_stress_level": 30,
+    "resting_hr": 55,
+    "body_battery_charged": 60,
+    "body_battery_drained": 45,
+    "sleep_duration_hr": 7.2,
+    "sleep_duration_formatted": "7h 12m",
+    "deep_sleep_percent": 20,
+    "rem_sleep_percent": 22,
+    "light_sleep_percent": 55,
+    "awake_duration_formatted": "0h 10m",
+    "sleep_score": 80,
+}
+# Metrics derived from the activity's FIT file (data_sources.garmin.fit); "N/A" when it is disabled/unavailable
+GARMIN_FIT_FIELDS = {
+    "hr_zones": "Z1 2m · Z2 14m · Z3 10m · Z4 4m · Z5 0m",
+    "z1_min": 2,
+    "z2_min": 14,
+    "z3_min": 10,
+    "z4_min": 4,
+    "z5_min": 0,
+    "splits": "5:48, 5:41, 5:39, 5:30, 5:22",
+    "first_half_pace": "5:44",
+    "second_half_pace": "5:31",
+    "negative_split": "yes",
+    "best_1km": "5:12",
+    "best_5km": "27:40",
+    "decoupling_percent": 3.1,
+    "avg_cadence": 168,
+}
+GARMIN_ACTIVITY_FIELDS = {
+    "activity_type": "Running",
+    "distance": 5.2,
+    "duration": 1800.0,
+    "duration_formatted": "0h 30m",
+    "avg_hr": 150,
+    "max_hr": 172,
+    "calories": 400,
+    **GARMIN_FIT_FIELDS,
+    **GARMIN_DAILY_FIELDS,
+}
+PROMPT_FIELDS = {
+    "persona": "A developer sharing their journey.",
+    "activity_summary": "- Worked on repo octocat/hello-world: Fix typo in README",
+}
+FOLLOW_UP_PROMPT_FIELDS = {
+    "original_tweet_text": "Shipped a small fix today.",
+    "activity_summary": "- Worked on repo octocat/hello-world: Fix typo in README",
+    "activity_url": "https://github.com/octocat/hello-world/commit/abc123",
+    "persona": "A developer sharing their journey.",
+}
+# Template fields of each data source: config key -> available fields
+SOURCE_TEMPLATE_FIELDS = {
+    "github": {"activity_format": GITHUB_FORMAT_FIELDS},
+    "garmin": {"activity_format": GARMIN_ACTIVITY_FIELDS, "daily_summary_format": GARMIN_DAILY_FIELDS},
+}
+# activity_format used when a source does not set one; validated like a configured one
+DEFAULT_ACTIVITY_FORMATS = {
+    "github": "- Worked on repo {repo}: {message}",
+    "garmin": "- Completed a {distance:.1f} km {activity_type} ({duration_formatted}).",
+}
+DEFAULT_ACTIVITY_FORMAT = "- {summary}" # Sources without a field table
+# -------------------------------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class SourceConfig:
+    key: str
+    enabled: bool
+    activity_format: str
+    daily_summary_format: str | None = None
+    username_env_var: str | None = None
+    password_env_var: str | None = None
+    pat_env_var: str | None = None
+    raw: dict = field(default_factory=dict)
+
+@dataclass(frozen=True)
+class TargetConfig:
+    key: str
+    enabled: bool
+    enable_follow_up: bool = False
+    raw: dict = field(default_factory=dict)
+
+@dataclass(frozen=True)
+class AppConfig:
+    """Validated, typed view of config.yaml. `raw` keeps the parsed YAML for sections without a typed field."""
+    persona: str
+    llm: dict
+    sources: dict[str, SourceConfig]
+    targets: dict[str, TargetConfig]
+    max_posts_per_run: int
+    sleep_between_posts: float
+    raw: dict
+    path: str = DEFAULT_CONFIG_PATH
+    sha256: str = ""
+
+    def get(self, key: str, default=None):
+        """dict-style access to top-level sections, for code that still works with the raw config."""
+        return self.raw.get(key, default)
+
+    def section(self, *keys: str) -> dict:
+        """Nested raw section, e.g. config.section('storage') or config.section('posting', 'targets')."""
+        node = self.raw
+        for key in keys:
+            node = (node or {}).get(key) or {}
+        return node
+
+def _check_template(where: str, template, fields: dict, errors: list[str]):
+    """Checks one template's placeholders against the fields available to it, then test-renders it."""
+    if template is None:
+        return
+    if not isinstance(template, str):
+        errors.append(f"{where}: expected a string template, got {type(template).__name__}.")
+        return
+    try:
+        parsed = list(string.Formatter().parse(template))
+    except ValueError as e:
+        errors.append(f"{where}: malformed template ({e}). Use '{{{{' / '}}}}' for literal braces.")
+        return
+    unknown = []
+    for _, field_name, _, _ in parsed:
+        if field_name is None:
+            continue
+        root = field_name.split('.', 1)[0].split('[', 1)[0]
+        if root == "" or root.isdigit():
+            errors.append(f"{where}: positional placeholder '{{{field_name}}}' is not supported; use a named field.")
+        elif root not in fields:
+            unknown.append(root)
+    if unknown:
+        errors.append(f"{where}: unknown placeholder(s) {', '.join(sorted(set(unknown)))}. Available: {', '.join(sorted(fields))}.")
+        return
+    try:
+        template.format(**fields)
+    except (ValueError, TypeError, KeyError, AttributeError, IndexError) as e:
+        errors.append(f"{where}: template does not render with sample values ({type(e).__name__}: {e}).")
+
+def compile_config(raw: dict, path: str = DEFAULT_CONFIG_PATH, sha256: str = "") -> AppConfig:
+    """Validates a parsed config dict and builds the typed AppConfig. Raises ConfigError listing every problem."""
+    if not isinstance(raw, dict) or not raw:
+        raise ConfigError(f"Configuration file {path} is empty or invalid.")
+    errors: list[str] = []
+    for key in ('llm', 'data_sources', 'posting'):
+        if not isinstance(raw.get(key), dict):
+            errors.append(f"missing or invalid top-level section '{key}'.")
+
+    llm = raw.get('llm') or {}
+    _check_template("llm.default_prompt_template", llm.get('default_prompt_template'), PROMPT_FIELDS, errors)
+    source_prompts = llm.get('source_prompts') or {}
+    for prompt_key, template in source_prompts.items():
+        if prompt_key == 'follow_up_prompts':
+            for follow_up_key, follow_up_template in (template or {}).items():
+                _check_template(f"llm.source_prompts.follow_up_prompts.{follow_up_key}", follow_up_template, FOLLOW_UP_PROMPT_FIELDS, errors)
+        else:
+            _check_template(f"llm.source_prompts.{prompt_key}", template, PROMPT_FIELDS, errors)
+
+    sources = {}
+    for source_key, source_conf in (raw.get('data_sources') or {}).items():
+        source_conf = source_conf or {}
+        activity_format = source_conf.get('activity_format', DEFAULT_ACTIVITY_FORMATS.get(source_key, DEFAULT_ACTIVITY_FORMAT))
+        for template_key, template_fields in SOURCE_TEMPLATE_FIELDS.get(source_key, {}).items():
+            template = activity_format if template_key == 'activity_format' else source_conf.get(template_key)
+            _check_template(f"data_sources.{source_key}.{template_key}", template, template_fields, errors)
+        sources[source_key] = SourceConfig(
+            key=source_key,
+            enabled=bool(source_conf.get('enabled')),
+            activity_format=activity_format,
+            daily_summary_format=source_conf.get('daily_summary_format'),
+            username_env_var=source_conf.get('username_env_var'),
+            password_env_var=source_conf.get('password_env_var'),
+            pat_env_var=source_conf.get('pat_env_var'),
+            raw=source_conf,
+        )
+
+    posting = raw.get('posting') or {}
+    targets = {}
+    for target_key, target_conf in (posting.get('targets') or {}).items():
+        target_conf = target_conf or {}
+        targets[target_key] = TargetConfig(
+            key=target_key,
+            enabled=bool(target_conf.get('enabled')),
+            enable_follow_up=bool(target_conf.get('enable_follow_up', False)),
+            raw=target_conf,
+        )
+
+    try:
+        max_posts = int(posting.get('max_posts_per_run', 1))
+        sleep_between = float(posting.get('sleep_between_posts', 90))
+    except (TypeError, ValueError) as e:
+        errors.append(f"posting: max_posts_per_run / sleep_between_posts must be numbers ({e}).")
+        max_posts, sleep_between = 1, 90.0
 
+    if errors:
+        raise ConfigError(f"Invalid configuration in {path}:\n  - " + "\n  - ".join(errors))
+
+    return AppConfig(
+        persona=raw.get('persona', 'A developer sharing their journey.'),
+        llm=llm,
+        sources=sources,
+        targets=targets,
+        max_posts_per_run=max_posts,
+        sleep_between_posts=sleep_between,
+        raw=raw,
+        path=path,
+        sha256=sha256,
+    )
+
+# --- Cached loading ---
+# In-process memo: abs path -> (mtime_ns, size, AppConfig)
+_memo: dict[str, tuple[int, int, AppConfig]] = {}
+
+def _schema_fingerprint() -> str:
+    """Hash of the schema version, template field tables and config dataclass fields; a cache from another schema is ignored."""
+    shape = (
+        CONFIG_SCHEMA_VERSION,
+        sorted((source, key, sorted(table)) for source, tables in SOURCE_TEMPLATE_FIELDS.items() for key, table in tables.items()),
+        sorted(PROMPT_FIELDS), sorted(FOLLOW_UP_PROMPT_FIELDS), DEFAULT_ACTIVITY_FORMATS, DEFAULT_ACTIVITY_FORMAT,
+        [[f.name for f in fields(cls)] for cls in (SourceConfig, TargetConfig, AppConfig)],
+    )
+    return hashlib.sha256(repr(shape).encode()).hexdigest()
+
+CONFIG_SCHEMA = _schema_fingerprint()
+
+def _cache_file(config_path: str, cache_dir: str) -> str:
+    name = hashlib.sha1(os.path.abspath(config_path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"config-{name}.pickle")
+
+def load_app_config(config_path: str = DEFAULT_CONFIG_PATH, cache_dir: str | None = DEFAULT_CONFIG_CACHE_DIR) -> AppConfig:
+    """
+    Returns the compiled config, skipping YAML parsing and validation when nothing changed:
+    an unchanged mtime/size hits the in-process memo or the on-disk cache directly; a changed
+    mtime with identical content (same sha256) reuses the cached result too. Raises ConfigError.
+    """
+    try:
+        stat = os.stat(config_path)
+    except FileNotFoundError:
+        raise ConfigError(f"Configuration file not found at {config_path}")
+    abs_path = os.path.abspath(config_path)
+
+    memo = _memo.get(abs_path)
+    if memo and memo[0] == stat.st_mtime_ns and memo[1] == stat.st_size:
+        return memo[2]
+
+    cache_path = _cache_file(config_path, cache_dir) if cache_dir else None
+    cached = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('schema') != CONFIG_SCHEMA:
+                cached = None
+        except Exception:
+            cached = None # A corrupt or incompatible cache just means a full load
+
+    if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+        config = cached['config']
+    else:
+        with open(config_path, 'rb') as f:
+            content = f.read()
+        sha256 = hashlib.sha256(content).hexdigest()
+        if cached and cached['sha256'] == sha256:
+            config = cached['config'] # Touched but unchanged
+        else:
+            try:
+                raw = yaml.safe_load(content.decode('utf-8'))
+            except yaml.YAMLError as e:
+                raise ConfigError(f"Error parsing configuration file {config_path}: {e}")
+            config = compile_config(raw, path=config_path, sha256=sha256)
+        if cache_path:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                tmp_path = cache_path + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump({
+                        "schema": CONFIG_SCHEMA,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "size": stat.st_size,
+                        "sha256": config.sha256,
+                        "config": config,
+                    }, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                print(f"Warning: Could not write config cache {cache_path}: {e}", file=sys.stderr)
+
+    _memo[abs_path] = (stat.st_mtime_ns, stat.st_size, config)
+    return config
+
+class ConfigReloader:
+    """Hot reload for long-running processes: check() recompiles when config.yaml changes, keeping the last good config on errors."""
+
+    def __init__(self, config_path: str = DEFAULT_CONFIG_PATH, cache_dir: str | None = DEFAULT_CONFIG_CACHE_DIR):
+        self.config_path = config_path
+        self.cache_dir = cache_dir
+        self.current = load_app_config(config_path, cache_dir)
+
+    def check(self) -> bool:
+        """Returns True if a new config was loaded."""
+        try:
+            config = load_app_config(self.config_path, self.cache_dir)
+        except ConfigError as e:
+            print(f"Warning: Config reload failed, keeping previous configuration.\n{e}", file=sys.stderr)
+            return False
+        if config is self.current:
+            return False
+        changed = config.sha256 != self.current.sha256
+        self.current = config
+        if changed:
+            print(f"Configuration reloaded from {self.config_path} (sha256 {config.sha256[:12]}).")
+        return changed
+
+def load_config(config_path: str = DEFAULT_CONFIG_PATH) -> AppConfig:
+    """Tải cấu hình từ file YAML (compiled + validated, cached). Exits the process on any config error."""
+    print(f"Loading configuration from: {config_path}")
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        if not config:
-            print(f"Error: Configuration file {config_path} is empty or invalid.", file=sys.stderr)
-            sys.exit(1)
+        config = load_app_config(config_path)
         print("Configuration loaded successfully.")
-        # Basic validation (can be expanded)
-        if 'llm' not in config or 'data_sources' not in config or 'posting' not in config:
-             print(f"Warning: Config file {config_path} seems incomplete. Missing top-level keys: llm, data_sources, or posting.", file=sys.stderr)
         return config
-    except yaml.YAMLError as e:
-        print(f"Error parsing configuration file {config_path}: {e}", file=sys.stderr)
+    except ConfigError as e:
+        print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
     except Exception as e:
         print(f"An unexpected error occurred loading configuration: {e}", file=sys.stderr)
@@ -45,9 +362,9 @@ if __name__ == '__main__':
     if cfg:
         print("Config loaded:")
         import json
-        print(json.dumps(cfg, indent=2, ensure_ascii=False))
+        print(json.dumps(cfg.raw, indent=2, ensure_ascii=False))
         print("\nTesting secret retrieval...")
-        test_secret_var = cfg.get('data_sources', {}).get('github', {}).get('pat_env_var')
+        test_secret_var = cfg.sources.get('github').pat_env_var if 'github' in cfg.sources else None
         if test_secret_var:
             secret_value = get_secret(test_secret_var)
             if secret_value:
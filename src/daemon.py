@@ -0,0 +1,294 @@
+"""Long-running 'serve' mode: internal scheduler, warm clients, hot-reloaded config and a local health/metrics endpoint."""
+
+import sys
+import json
+import time
+import heapq
+import signal
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from .config_loader import ConfigReloader, DEFAULT_CONFIG_PATH, AppConfig
+from .clients import ClientPool
+from .storage.outbox import Outbox, DEFAULT_OUTBOX_PATH
+from .storage.engagement import EngagementStore, DEFAULT_ENGAGEMENT_PATH, DEFAULT_REFRESH_INTERVAL
+
+DEFAULT_POLL_INTERVAL = 3600 # seconds, per source unless configured
+DEFAULT_PUBLISH_CHECK_INTERVAL = 300
+DEFAULT_PUBLISH_LOOKBACK_DAYS = 2 # Earlier run days whose pending drafts are still published
+DEFAULT_CONFIG_RELOAD_INTERVAL = 30
+DEFAULT_HEALTH_HOST = "127.0.0.1"
+DEFAULT_HEALTH_PORT = 8787
+
+class Scheduler:
+    """Fixed-interval jobs on a monotonic clock. Jobs run in the caller's thread from run_pending()."""
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, str]] = []
+        self._jobs: dict[str, tuple[float, Callable[[], None], int]] = {} # name -> (interval, fn, seq of its live heap entry)
+        self._seq = 0
+
+    def _push(self, name: str, due: float, interval: float, fn: Callable[[], None]):
+        self._seq += 1
+        self._jobs[name] = (interval, fn, self._seq)
+        heapq.heappush(self._heap, (due, self._seq, name))
+
+    def every(self, name: str, interval: float, fn: Callable[[], None], delay: float = 0):
+        """Registers (or replaces) a job; it first runs after `delay` seconds. A replaced job's queued run is dropped."""
+        self._push(name, time.monotonic() + delay, interval, fn)
+
+    def cancel(self, name: str):
+        self._jobs.pop(name, None) # Stale heap entries are skipped when they come due
+
+    def jobs(self) -> dict[str, float]:
+        return {name: interval for name, (interval, _, _) in self._jobs.items()}
+
+    def run_pending(self, run_job: Callable[[str, Callable[[], None]], None]):
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            due, seq, name = heapq.heappop(self._heap)
+            job = self._jobs.get(name)
+            if job is None or job[2] != seq:
+                continue # Cancelled, or replaced by every() (whose own entry is queued)
+            interval, fn, _ = job
+            run_job(name, fn)
+            if self._jobs.get(name) is job: # Not replaced/cancelled while running
+                # Keep the cadence, but never queue up missed runs after a long job
+                self._push(name, max(due + interval, time.monotonic()), interval, fn)
+
+    def seconds_until_next(self) -> float:
+        if not self._heap:
+            return DEFAULT_CONFIG_RELOAD_INTERVAL
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+class Metrics:
+    """Thread-safe counters/gauges, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._values: dict[tuple[str, tuple], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = []
+        for (name, labels), value in items:
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_str}}} {value:g}" if label_str else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+def parse_windows(windows: list[str]) -> list[tuple[int, int]]:
+    """'HH:MM-HH:MM' (UTC) strings -> (start_minute, end_minute) pairs. A window may wrap past midnight."""
+    parsed = []
+    for window in windows or []:
+        start, end = window.split('-')
+        sh, sm = (int(x) for x in start.strip().split(':'))
+        eh, em = (int(x) for x in end.strip().split(':'))
+        parsed.append((sh * 60 + sm, eh * 60 + em))
+    return parsed
+
+def publish_dates(today: str, lookback_days: int) -> list[str]:
+    """Run days to publish from, oldest first: `today` (ISO date) and the `lookback_days` before it."""
+    day = datetime.fromisoformat(today).date()
+    return [(day - timedelta(days=n)).isoformat() for n in range(max(0, lookback_days), -1, -1)]
+
+def in_posting_window(windows: list[tuple[int, int]], now: datetime) -> bool:
+    """True if `now` (UTC) falls in any window; no windows configured means always."""
+    if not windows:
+        return True
+    minute = now.hour * 60 + now.minute
+    for start, end in windows:
+        if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+            return True
+    return False
+
+def start_health_server(host: str, port: int, metrics: Metrics, health: Callable[[], dict]) -> ThreadingHTTPServer:
+    """Serves GET /healthz (JSON) and GET /metrics (Prometheus text) from a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/healthz":
+                status = health()
+                body = json.dumps(status).encode()
+                self.send_response(200 if status.get("status") == "ok" else 503)
+                self.send_header("Content-Type", "application/json")
+            elif self.path == "/metrics":
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+            else:
+                body = b"not found\n"
+                self.send_response(404)
+                self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # Keep probe traffic out of the run log
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="health-server", daemon=True).start()
+    print(f"[Daemon] Health endpoint on http://{host}:{port}/healthz, metrics on /metrics")
+    return server
+
+def serve(
+    generate: Callable[..., int],
+    publish: Callable[..., int],
+    collect: Callable[..., int] | None = None,
+    config_path: str = DEFAULT_CONFIG_PATH,
+):
+    """
+    Runs until SIGTERM/SIGINT. `generate(config, outbox, run_date, clients=, only_sources=)` is polled per source
+    at `daemon.poll_intervals.<source>`; `publish(config, outbox, run_dates, stop_event=, engagement=)` runs every
+    `daemon.publish_check_interval` seconds while inside one of `daemon.posting_windows`, for today and the
+    `daemon.publish_lookback_days` before it (drafts polled in after the last window, threads cut off at rollover). With `engagement.enabled`,
+    `collect(config, engagement_store)` refreshes post metrics every `engagement.refresh_interval` seconds.
+    """
+    reloader = ConfigReloader(config_path)
+    clients = ClientPool()
+    metrics = Metrics()
+    scheduler = Scheduler()
+    stop_event = threading.Event()
+    started_at = time.time()
+    last_runs: dict[str, dict] = {}
+    state = {"outbox": None, "engagement": None}
+
+    def handle_signal(signum, frame):
+        print(f"\n[Daemon] Received {signal.Signals(signum).name}, shutting down after the current step...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    def daemon_conf() -> dict:
+        return reloader.current.section('daemon')
+
+    def outbox() -> Outbox:
+        path = reloader.current.section('storage').get('outbox_path', DEFAULT_OUTBOX_PATH)
+        if state["outbox"] is None or state["outbox"].path != path:
+            state["outbox"] = Outbox(path)
+        return state["outbox"]
+
+    def engagement() -> EngagementStore | None:
+        conf = reloader.current.section('engagement')
+        if not conf.get('enabled'):
+            return None
+        path = conf.get('store_path', DEFAULT_ENGAGEMENT_PATH)
+        if state["engagement"] is None or state["engagement"].path != path:
+            state["engagement"] = EngagementStore(path)
+        return state["engagement"]
+
+    def today() -> str:
+        return datetime.now(timezone.utc).date().isoformat()
+
+    def run_job(name: str, fn: Callable[[], None]):
+        if stop_event.is_set():
+            return
+        started = time.perf_counter()
+        try:
+            fn()
+            last_runs[name] = {"ok": True, "at": datetime.now(timezone.utc).isoformat()}
+        except Exception as e:
+            print(f"[Daemon] Job '{name}' failed: {e}", file=sys.stderr)
+            metrics.inc("githubx_job_errors_total", job=name)
+            last_runs[name] = {"ok": False, "at": datetime.now(timezone.utc).isoformat(), "error": str(e)}
+        elapsed = time.perf_counter() - started
+        metrics.inc("githubx_job_runs_total", job=name)
+        metrics.set("githubx_job_last_duration_seconds", elapsed, job=name)
+
+    def make_poll(source_key: str):
+        def poll():
+            new_drafts = generate(reloader.current, outbox(), today(), clients=clients, only_sources=[source_key])
+            metrics.inc("githubx_drafts_generated_total", new_drafts, source=source_key)
+        return poll
+
+    def publish_job():
+        windows = parse_windows(daemon_conf().get('posting_windows', []))
+        if not in_posting_window(windows, datetime.now(timezone.utc)):
+            return
+        lookback = int(daemon_conf().get('publish_lookback_days', DEFAULT_PUBLISH_LOOKBACK_DAYS))
+        sent = publish(reloader.current, outbox(), publish_dates(today(), lookback), stop_event=stop_event, engagement=engagement())
+        metrics.inc("githubx_posts_published_total", sent)
+
+    def engagement_job():
+        store = engagement()
+        if store is None or collect is None:
+            return
+        metrics.inc("githubx_engagement_posts_refreshed_total", collect(reloader.current, store))
+        for group, values in store.aggregates().items():
+            for key, value in values.items():
+                metrics.set("githubx_engagement_score", value["score"] or 0, group=group, key=key)
+
+    def sync_jobs(config: AppConfig, initial: bool = False):
+        """(Re)registers jobs so enabled sources and intervals follow the current config."""
+        conf = config.section('daemon')
+        intervals = conf.get('poll_intervals', {})
+        wanted = {f"poll:{key}": float(intervals.get(key, DEFAULT_POLL_INTERVAL)) for key, source in config.sources.items() if source.enabled}
+        current = scheduler.jobs()
+        for name in current:
+            if name.startswith("poll:") and name not in wanted:
+                scheduler.cancel(name)
+        for name, interval in wanted.items():
+            if current.get(name) != interval:
+                scheduler.every(name, interval, make_poll(name.split(':', 1)[1]))
+        publish_interval = float(conf.get('publish_check_interval', DEFAULT_PUBLISH_CHECK_INTERVAL))
+        if current.get("publish") != publish_interval:
+            # On startup let the first polls land before checking for posts
+            scheduler.every("publish", publish_interval, publish_job, delay=5 if initial else 0)
+        engagement_conf = config.section('engagement')
+        if engagement_conf.get('enabled') and collect is not None:
+            refresh_interval = float(engagement_conf.get('refresh_interval', DEFAULT_REFRESH_INTERVAL))
+            if current.get("engagement") != refresh_interval:
+                scheduler.every("engagement", refresh_interval, engagement_job, delay=0 if initial else refresh_interval)
+        elif "engagement" in current:
+            scheduler.cancel("engagement")
+
+    def reload_job():
+        if reloader.check():
+            sync_jobs(reloader.current)
+
+    def health() -> dict:
+        return {
+            "status": "stopping" if stop_event.is_set() else "ok",
+            "uptime_seconds": round(time.time() - started_at, 1),
+            "config_sha256": reloader.current.sha256[:12],
+            "jobs": scheduler.jobs(),
+            "last_runs": last_runs,
+        }
+
+    conf = daemon_conf()
+    server = start_health_server(
+        conf.get('health_host', DEFAULT_HEALTH_HOST),
+        int(conf.get('health_port', DEFAULT_HEALTH_PORT)),
+        metrics,
+        health,
+    )
+    sync_jobs(reloader.current, initial=True)
+    scheduler.every("config_reload", float(conf.get('config_reload_interval', DEFAULT_CONFIG_RELOAD_INTERVAL)), reload_job,
+                    delay=float(conf.get('config_reload_interval', DEFAULT_CONFIG_RELOAD_INTERVAL)))
+    print(f"=== githubX daemon started at {datetime.now(timezone.utc).isoformat()} with jobs: {scheduler.jobs()} ===")
+
+    try:
+        while not stop_event.is_set():
+            scheduler.run_pending(run_job)
+            metrics.set("githubx_uptime_seconds", time.time() - started_at)
+            stop_event.wait(min(scheduler.seconds_until_next(), 5.0))
+    finally:
+        server.shutdown()
+        clients.close()
+        if state["engagement"] is not None:
+            state["engagement"].close()
+        print(f"=== githubX daemon stopped at {datetime.now(timezone.utc).isoformat()} ===")
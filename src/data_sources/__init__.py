@@ -1 +1,7 @@
-# This file makes 'data_sources' a Python sub-package 
\ No newline at end of file
+# This file makes 'data_sources' a Python sub-package 
+
+class SourceError(Exception):
+    """
+    Raised by a source's iter_activity(raise_errors=True) when fetching failed (also after some activities
+    were yielded), so a caller that must not mistake a failed fetch for a day without activity (backfill) can tell.
+    """
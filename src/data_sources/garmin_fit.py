@@ -0,0 +1,321 @@
+"""
+Original FIT files of Garmin activities: download + disk cache, a memory-mapped record decoder that
+yields NumPy arrays, and vectorized per-second metrics (HR zones, splits, best efforts, decoupling,
+cadence) exposed as `activity_format` placeholders.
+
+The decoder never builds a Python object per sample: it walks message headers, and every run of
+consecutive `record` messages sharing one definition is read as a single strided structured view
+over the mmap, so a multi-hour activity decodes in a few milliseconds.
+"""
+
+import io
+import os
+import sys
+import mmap
+import zipfile
+from array import array
+
+# numpy is optional (same as for the chart images); without it FIT metrics are "N/A"
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    print("Warning: 'numpy' is required for Garmin FIT metrics (pip install -r requirements.txt). FIT placeholders will be 'N/A'.", file=sys.stderr)
+    np = None
+
+from ..config_loader import GARMIN_FIT_FIELDS
+
+DEFAULT_FIT_CACHE_DIR = 'data/fit_cache'
+DEFAULT_MAX_HR = 190
+FIT_METRICS_NA = dict.fromkeys(GARMIN_FIT_FIELDS, "N/A")
+
+# --- FIT protocol constants ---
+FIT_EPOCH_OFFSET = 631065600 # 1989-12-31T00:00:00Z as a Unix timestamp
+RECORD_MESG_NUM = 20
+TIMESTAMP_FIELD = 253
+MAX_GAP_SECONDS = 10 # Longer gaps between samples are pauses and don't count as moving time
+
+# base type byte -> (numpy type char, invalid value)
+BASE_TYPES = {
+    0x00: ('u1', 0xFF), 0x01: ('i1', 0x7F), 0x02: ('u1', 0xFF), 0x0A: ('u1', 0x00), 0x0D: ('u1', 0xFF),
+    0x83: ('i2', 0x7FFF), 0x84: ('u2', 0xFFFF), 0x8B: ('u2', 0x0000),
+    0x85: ('i4', 0x7FFFFFFF), 0x86: ('u4', 0xFFFFFFFF), 0x8C: ('u4', 0x00000000),
+    0x88: ('f4', None), 0x89: ('f8', None),
+    0x8E: ('i8', 0x7FFFFFFFFFFFFFFF), 0x8F: ('u8', 0xFFFFFFFFFFFFFFFF), 0x90: ('u8', 0),
+}
+
+# record message fields we decode: field number -> (name, scale, offset)
+RECORD_FIELDS = {
+    TIMESTAMP_FIELD: ('timestamp', 1, 0),
+    2: ('altitude', 5, 500),
+    3: ('heart_rate', 1, 0),
+    4: ('cadence', 1, 0),
+    5: ('distance', 100, 0),
+    6: ('speed', 1000, 0),
+    7: ('power', 1, 0),
+    73: ('enhanced_speed', 1000, 0),
+    78: ('enhanced_altitude', 5, 500),
+}
+
+class _Definition:
+    __slots__ = ('global_num', 'size', 'little_endian', 'dtype', 'invalid', 'timestamp_offset')
+
+    def __init__(self, global_num: int, size: int, little_endian: bool, fields: list[tuple[int, int, int, int]]):
+        self.global_num = global_num
+        self.size = size
+        self.little_endian = little_endian
+        self.timestamp_offset = None
+        names, formats, offsets, self.invalid = [], [], [], {}
+        for field_num, offset, field_size, base_type in fields:
+            if field_num == TIMESTAMP_FIELD and field_size == 4:
+                self.timestamp_offset = offset
+            if global_num != RECORD_MESG_NUM or field_num not in RECORD_FIELDS or base_type not in BASE_TYPES:
+                continue
+            type_char, invalid = BASE_TYPES[base_type]
+            if int(type_char[1]) != field_size: # Arrays of values: not used for the fields we read
+                continue
+            names.append(RECORD_FIELDS[field_num][0])
+            formats.append(('<' if little_endian else '>') + type_char)
+            offsets.append(offset)
+            self.invalid[RECORD_FIELDS[field_num][0]] = invalid
+        self.dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': size}) if np is not None else None
+
+def _run_length(buf, start: int, stride: int, count_max: int, mask: int, value: int) -> int:
+    """Number of consecutive messages from `start` whose header byte matches (header & mask == value)."""
+    window = 64
+    checked = 0
+    while checked < count_max:
+        upto = min(count_max, checked + window)
+        headers = buf[start + checked * stride:start + upto * stride:stride]
+        mismatches = np.flatnonzero((headers & mask) != value)
+        if mismatches.size:
+            return checked + int(mismatches[0])
+        checked = upto
+        window *= 8
+    return count_max
+
+def decode_fit_records(data) -> dict:
+    """
+    Decodes every `record` message of a FIT file (bytes or an mmap) into float64 arrays keyed by
+    RECORD_FIELDS names (NaN where a sample has no / an invalid value; `timestamp` in Unix seconds).
+    Raises ValueError for data that isn't a FIT file.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if len(buf) < 12 or bytes(data[8:12]) != b'.FIT':
+        raise ValueError("Not a FIT file.")
+    header_size = int(buf[0])
+    end = min(header_size + int.from_bytes(bytes(data[4:8]), 'little'), len(buf))
+    definitions: dict[int, _Definition] = {}
+    chunks: dict[str, list] = {name: [] for name, _, _ in RECORD_FIELDS.values()}
+    last_timestamp = 0
+    pos = header_size
+
+    while pos < end:
+        header = data[pos]
+        if header & 0x40 and not header & 0x80: # Definition message
+            little_endian = data[pos + 2] == 0
+            global_num = int.from_bytes(bytes(data[pos + 3:pos + 5]), 'little' if little_endian else 'big')
+            field_count = data[pos + 5]
+            fields, offset = [], 0
+            cursor = pos + 6
+            for _ in range(field_count):
+                field_num, field_size, base_type = data[cursor], data[cursor + 1], data[cursor + 2]
+                fields.append((field_num, offset, field_size, base_type))
+                offset += field_size
+                cursor += 3
+            if header & 0x20: # Developer fields: only their sizes matter here
+                dev_count = data[cursor]
+                offset += sum(data[cursor + 2 + 3 * i] for i in range(dev_count))
+                cursor += 1 + 3 * dev_count
+            definitions[header & 0x0F] = _Definition(global_num, offset, little_endian, fields)
+            pos = cursor
+            continue
+
+        compressed = bool(header & 0x80)
+        local = (header >> 5) & 0x03 if compressed else header & 0x0F
+        definition = definitions.get(local)
+        if definition is None:
+            raise ValueError(f"Data message for undefined local type {local} at byte {pos}.")
+        stride = 1 + definition.size
+
+        if definition.global_num != RECORD_MESG_NUM:
+            if compressed:
+                offset = header & 0x1F
+                last_timestamp += (offset - (last_timestamp & 0x1F)) & 0x1F
+            elif definition.timestamp_offset is not None:
+                start = pos + 1 + definition.timestamp_offset
+                last_timestamp = int.from_bytes(bytes(data[start:start + 4]), 'little' if definition.little_endian else 'big')
+            pos += stride
+            continue
+
+        # A run of record messages with the same definition: one strided view over all of them
+        mask, value = (0xE0, header & 0xE0) if compressed else (0xFF, header)
+        count = _run_length(buf, pos, stride, (end - pos) // stride, mask, value)
+        view = np.ndarray((count,), dtype=definition.dtype, buffer=data, offset=pos + 1, strides=(stride,))
+        for name, scale, shift in RECORD_FIELDS.values():
+            if name in definition.invalid:
+                raw = view[name]
+                values = raw.astype(np.float64)
+                if definition.invalid[name] is not None:
+                    values[raw == definition.invalid[name]] = np.nan
+                if name != 'timestamp' and (scale != 1 or shift):
+                    values = values / scale - shift
+            else:
+                values = np.full(count, np.nan)
+            if name == 'timestamp' and compressed:
+                offsets = buf[pos:pos + count * stride:stride].astype(np.int64) & 0x1F
+                previous = np.concatenate(([last_timestamp & 0x1F], offsets[:-1]))
+                values = (last_timestamp + np.cumsum((offsets - previous) & 0x1F)).astype(np.float64)
+            chunks[name].append(values)
+        if chunks['timestamp'][-1].size and not np.isnan(chunks['timestamp'][-1][-1]):
+            last_timestamp = int(chunks['timestamp'][-1][-1])
+        del view
+        pos += count * stride
+
+    records = {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in chunks.items()}
+    records['timestamp'] = records['timestamp'] + FIT_EPOCH_OFFSET
+    # Newer devices only fill the enhanced (32-bit) speed/altitude fields
+    for name in ('speed', 'altitude'):
+        enhanced = records.pop('enhanced_' + name)
+        records[name] = np.where(np.isnan(enhanced), records[name], enhanced)
+    return records
+
+def read_fit_records(path: str) -> dict | None:
+    """decode_fit_records over a memory-mapped file (nothing is read into Python objects). None on failure."""
+    if np is None:
+        return None
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return decode_fit_records(mm)
+    except (OSError, ValueError, IndexError, BufferError) as e:
+        print(f"[Garmin FIT] Error decoding {path}: {e}", file=sys.stderr)
+        return None
+
+def fetch_fit_file(client, activity_id, cache_dir: str = DEFAULT_FIT_CACHE_DIR) -> str | None:
+    """Path of the activity's original FIT file, downloaded (and unzipped) into cache_dir on first use."""
+    path = os.path.join(cache_dir, f"{activity_id}.fit")
+    if os.path.exists(path):
+        return path
+    archive = client.download_activity(activity_id, dl_fmt=client.ActivityDownloadFormat.ORIGINAL)
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        members = [name for name in zf.namelist() if name.lower().endswith('.fit')]
+        if not members:
+            print(f"[Garmin FIT] No FIT file in the download for activity {activity_id}.", file=sys.stderr)
+            return None
+        content = zf.read(members[0])
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    print(f"[Garmin FIT] Cached FIT file for activity {activity_id} ({len(content) / 1024:.0f} KiB).")
+    return path
+
+# --- Derived metrics ---
+def _format_pace(seconds_per_km) -> str:
+    if seconds_per_km is None or not np.isfinite(seconds_per_km):
+        return "N/A"
+    seconds = int(round(seconds_per_km))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def _format_clock(seconds) -> str:
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+def _best_effort(distance, moving_time, meters: float):
+    """Fastest moving time over any `meters` stretch (interpolated between samples), or None if too short."""
+    starts = distance <= distance[-1] - meters
+    if not starts.any():
+        return None
+    finish_times = np.interp(distance[starts] + meters, distance, moving_time)
+    return float(np.min(finish_times - moving_time[starts]))
+
+def compute_fit_metrics(records: dict, max_hr: float = DEFAULT_MAX_HR, activity_type: str = "") -> dict:
+    """Template values (see GARMIN_FIT_FIELDS) derived from the per-second records; "N/A" where not computable."""
+    metrics = dict(FIT_METRICS_NA)
+    timestamps = records.get('timestamp')
+    if np is None or timestamps is None or timestamps.size < 2:
+        return metrics
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    step = np.diff(timestamps, prepend=timestamps[0])
+    step = np.where((step > 0) & (step <= MAX_GAP_SECONDS), step, 0.0)
+    moving_time = np.cumsum(step)
+
+    # --- HR zones (share of max HR: Z1 <60%, Z2 60-70, Z3 70-80, Z4 80-90, Z5 >=90) ---
+    heart_rate = records['heart_rate'][order]
+    has_hr = ~np.isnan(heart_rate)
+    if has_hr.any() and max_hr:
+        zones = np.digitize(heart_rate[has_hr] / float(max_hr), [0.6, 0.7, 0.8, 0.9])
+        minutes = np.bincount(zones, weights=step[has_hr], minlength=5) / 60
+        for zone in range(5):
+            metrics[f"z{zone + 1}_min"] = int(round(minutes[zone]))
+        metrics['hr_zones'] = " · ".join(f"Z{zone + 1} {int(round(minutes[zone]))}m" for zone in range(5))
+
+    # --- Distance based: splits, halves, best efforts ---
+    distance = records['distance'][order]
+    has_distance = ~np.isnan(distance)
+    if has_distance.sum() >= 2:
+        distance_valid = np.maximum.accumulate(distance[has_distance]) # Cumulative; guard against GPS hiccups
+        time_valid = moving_time[has_distance]
+        total = distance_valid[-1]
+        if total >= 1000:
+            marks = np.arange(1000.0, total + 1e-9, 1000.0)
+            split_times = np.diff(np.concatenate(([0.0], np.interp(marks, distance_valid, time_valid))))
+            metrics['splits'] = ", ".join(_format_pace(s) for s in split_times[:12]) + (" ..." if split_times.size > 12 else "")
+            half = total / 2
+            half_time = float(np.interp(half, distance_valid, time_valid))
+            first_pace = half_time / (half / 1000)
+            second_pace = (time_valid[-1] - half_time) / (half / 1000)
+            metrics['first_half_pace'] = _format_pace(first_pace)
+            metrics['second_half_pace'] = _format_pace(second_pace)
+            metrics['negative_split'] = "yes" if second_pace < first_pace else "no"
+            best_1km = _best_effort(distance_valid, time_valid, 1000)
+            if best_1km is not None:
+                metrics['best_1km'] = _format_clock(best_1km)
+            best_5km = _best_effort(distance_valid, time_valid, 5000)
+            if best_5km is not None:
+                metrics['best_5km'] = _format_clock(best_5km)
+
+    # --- Aerobic decoupling: speed/HR efficiency of the second half vs the first (moving time) ---
+    speed = records['speed'][order]
+    usable = has_hr & ~np.isnan(speed) & (speed > 0) & (heart_rate > 0)
+    if usable.sum() >= 60:
+        first_half = moving_time <= moving_time[-1] / 2
+        halves = [usable & first_half, usable & ~first_half]
+        if all(h.any() for h in halves):
+            efficiency = [speed[h].mean() / heart_rate[h].mean() for h in halves]
+            metrics['decoupling_percent'] = round(float((efficiency[0] - efficiency[1]) / efficiency[0] * 100), 1)
+
+    # --- Cadence (FIT stores strides per minute for on-foot activities; report steps per minute) ---
+    cadence = records['cadence'][order]
+    moving_cadence = cadence[~np.isnan(cadence) & (cadence > 0)]
+    if moving_cadence.size:
+        per_foot = any(word in activity_type for word in ('run', 'walk', 'hik'))
+        metrics['avg_cadence'] = int(round(float(moving_cadence.mean()) * (2 if per_foot else 1)))
+    return metrics
+
+def fit_samples(records: dict) -> dict | None:
+    """Chart samples ({"elapsed_s", "hr", "speed_mps"}) from the FIT records, instead of a separate details call."""
+    timestamps = records.get('timestamp')
+    if timestamps is None or timestamps.size < 2:
+        return None
+    samples = {}
+    for key, values in (("elapsed_s", timestamps - timestamps[0]), ("hr", records['heart_rate']), ("speed_mps", records['speed'])):
+        samples[key] = array('d')
+        samples[key].frombytes(values.astype(np.float64).tobytes())
+    return samples
+
+if __name__ == '__main__':
+    import time
+    for fit_path in sys.argv[1:]:
+        started = time.perf_counter()
+        fit_records = read_fit_records(fit_path)
+        decoded = time.perf_counter()
+        if fit_records is None:
+            continue
+        fit_metrics = compute_fit_metrics(fit_records)
+        print(f"{fit_path}: {fit_records['timestamp'].size} records, decode {(decoded - started) * 1e3:.1f} ms, "
+              f"metrics {(time.perf_counter() - decoded) * 1e3:.1f} ms")
+        for key, value in fit_metrics.items():
+            print(f"  {key}: {value}")
@@ -2,8 +2,11 @@
 
 import sys
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator
 import math # Add math for potential calculations like sleep hours
+from array import array
+from collections import ChainMap
 
 # Attempt to import garminconnect, handle if not installed
 try:
@@ -19,8 +22,12 @@ except ModuleNotFoundError:
     # Allow the placeholder function to exist so main.py doesn't crash on import
     Garmin = None # Set Garmin to None if import fails
 
-# Define the standard Activity structure
-Activity = dict[str, any]
+# Standard Activity record (slotted dataclass that also behaves like a read-only dict)
+from ..activity import Activity, DailyContext, GarminActivityDetails, DailySummaryDetails
+from ..clients import SessionRejectedError
+from ..ratelimit import RateLimiter, RateLimitedClient
+from . import garmin_fit
+from . import SourceError
 
 # Configure logging for garminconnect (optional, but helpful for debugging)
 logging.basicConfig(level=logging.INFO)
@@ -34,39 +41,119 @@ def format_duration(seconds):
     minutes = (seconds % 3600) // 60
     return f"{hours}h {minutes}m"
 
-def get_activity(
+def format_activity_summary(activity_format: str, daily_context: DailyContext, activity_type: str, distance_km: float,
+                            duration_seconds, avg_hr, max_hr, calories, fit_metrics=None) -> str:
+    """Renders activity_format for one activity; raises KeyError/ValueError for a bad template."""
+    # Per-activity fields layered over the shared daily context (no copy of the daily keys); the FIT
+    # metrics come last (disjoint keys, only looked up by templates using them; "N/A" without a FIT file)
+    activity_fields = {
+        'activity_type': activity_type.replace('_', ' ').title(),
+        'distance': distance_km,
+        'duration': duration_seconds,
+        'duration_formatted': format_duration(duration_seconds),
+        'avg_hr': avg_hr if avg_hr is not None else "N/A",
+        'max_hr': max_hr if max_hr is not None else "N/A",
+        'calories': int(calories) if calories is not None else "N/A",
+    }
+    return activity_format.format_map(ChainMap(activity_fields, daily_context, fit_metrics or garmin_fit.FIT_METRICS_NA))
+
+# --- Helpers fetching array data for chart images (only used when media is enabled) ---
+def _fetch_samples(client, activity_id) -> dict | None:
+    """Per-sample elapsed time / HR / speed arrays for one activity, from the activity details chart data."""
+    details = client.get_activity_details(activity_id)
+    descriptors = {d.get('key'): d.get('metricsIndex') for d in details.get('metricDescriptors', [])}
+    rows = [row.get('metrics', []) for row in details.get('activityDetailMetrics', [])]
+    time_idx = descriptors.get('sumDuration')
+    hr_idx = descriptors.get('directHeartRate')
+    speed_idx = descriptors.get('directSpeed')
+    if time_idx is None or not rows:
+        return None
+
+    def column(idx):
+        if idx is None:
+            return [float('nan')] * len(rows)
+        return [float(r[idx]) if idx < len(r) and r[idx] is not None else float('nan') for r in rows]
+
+    # array('d') keeps the samples as packed doubles instead of one float object per value
+    return {"elapsed_s": array('d', column(time_idx)), "hr": array('d', column(hr_idx)), "speed_mps": array('d', column(speed_idx))}
+
+def _fetch_weekly(client, end_date) -> dict:
+    """Steps and sleep hours for the 7 days ending at end_date."""
+    start = end_date - timedelta(days=6)
+    steps_by_day = {}
+    for day in client.get_daily_steps(start.isoformat(), end_date.isoformat()) or []:
+        steps_by_day[day.get('calendarDate')] = day.get('totalSteps') or 0
+    days, steps, sleep_hours = [], [], []
+    for offset in range(7):
+        day = start + timedelta(days=offset)
+        sleep_seconds = None
+        try:
+            sleep_seconds = (client.get_sleep_data(day.isoformat()) or {}).get('dailySleepDTO', {}).get('sleepTimeSeconds')
+        except Exception as e:
+            print(f"[Garmin Source] Error fetching sleep data for {day.isoformat()}: {e}", file=sys.stderr)
+        days.append(day.strftime('%a'))
+        steps.append(steps_by_day.get(day.isoformat(), 0))
+        sleep_hours.append(round(sleep_seconds / 3600, 1) if sleep_seconds else 0.0)
+    return {"days": days, "steps": steps, "sleep_hours": sleep_hours}
+
+def iter_activity(
     username: str | None, 
     password: str | None, 
     activity_format: str, 
-    daily_summary_format: str | None = None # NEW: Add format for daily summary
-    ) -> list[Activity]:
+    daily_summary_format: str | None = None, # NEW: Add format for daily summary
+    include_chart_data: bool = False, # Fetch per-sample and weekly arrays for chart images
+    client=None, # Already logged-in Garmin client (e.g. from a ClientPool); not logged out here
+    day: date | None = None, # Day whose stats/activities to fetch (default: today, UTC)
+    window_days: int = 1, # Activities from `day - window_days` to `day`; 0 = that day only (backfill)
+    fit_cache_dir: str | None = None, # Download/cache each activity's FIT file here for FIT metrics; None = off
+    fit_max_hr: float = garmin_fit.DEFAULT_MAX_HR, # For the HR zones of the FIT metrics
+    limiter: RateLimiter | None = None, # Shared budget: one token per Garmin API request (backfill / batch)
+    raise_errors: bool = False, # Raise SourceError instead of printing and ending early (backfill)
+    ) -> Iterator[Activity]:
     """
-    Fetches recent Garmin activities (last 24 hours) and related daily stats/sleep
-    using the garminconnect library.
-    If no activities are found but daily stats are available, creates a pseudo-activity
+    Yields recent Garmin activities (last 24 hours, or the window ending at `day`) and related
+    daily stats/sleep using the garminconnect library. The window's activities come from one range
+    request and are yielded newest first, each as soon as its own FIT file/samples are processed.
+    If no activities are found but daily stats are available, yields a pseudo-activity
     for the daily summary.
+    With include_chart_data, also adds details['samples'] (HR/speed arrays) per activity
+    and details['weekly'] (7-day steps/sleep) for the chart renderer.
+    With a `limiter`, every Garmin API request (login, stats, sleep, weekly, the range, FIT, samples) takes one token.
+    A pooled `client` whose session Garmin rejects raises SessionRejectedError (if nothing was yielded yet).
+    With raise_errors, a failed login, stats/sleep or activities request raises SourceError, so a day
+    whose data could not be fetched is not mistaken for a day without activity.
+    With fit_cache_dir, each activity's original FIT file is downloaded once into that directory and
+    its per-second records fill the FIT placeholders (HR zones, splits, ...) and the chart samples.
     """
-    activities: list[Activity] = []
+    count = 0
     if not Garmin: # Check if library import failed
         print("[Garmin Source] Exiting because garminconnect library is not available.", file=sys.stderr)
-        return activities
+        if raise_errors:
+            raise SourceError("garminconnect library is not available")
+        return
         
     if not username or not password:
         print("[Garmin Source] Error: Username or password not provided.", file=sys.stderr)
-        return activities
+        if raise_errors:
+            raise SourceError("Garmin username or password not provided")
+        return
 
     print(f"[Garmin Source] Attempting to fetch activity for user: {username}")
     
-    client = None # Initialize client to None
+    owns_client = client is None # Only log out clients we logged in ourselves
     try:
-        # Initialize Garmin client
-        client = Garmin(username, password)
-        client.login()
-        print("[Garmin Source] Login successful.")
+        if owns_client:
+            # Initialize Garmin client
+            client = Garmin(username, password)
+            if limiter:
+                limiter.acquire()
+            client.login()
+            print("[Garmin Source] Login successful.")
+        api = RateLimitedClient(client, limiter) if limiter else client # Requests below go through `api`
 
         # Define time range (e.g., last 24 hours)
-        end_date = datetime.now(timezone.utc).date()
-        start_date = end_date - timedelta(days=1)
+        end_date = day or datetime.now(timezone.utc).date()
+        start_date = end_date - timedelta(days=window_days)
         print(f"[Garmin Source] Fetching data for date range: {start_date} to {end_date}...")
 
         # --- NEW: Fetch Daily Stats and Sleep Data for the end_date ---
@@ -75,7 +162,7 @@ def get_activity(
         daily_context = {}
         try:
             print(f"[Garmin Source] Fetching daily stats for {end_date.isoformat()}...")
-            daily_stats = client.get_stats(end_date.isoformat())
+            daily_stats = api.get_stats(end_date.isoformat())
             if daily_stats:
                  print("[Garmin Source] Daily stats fetched successfully.")
                  daily_context['daily_steps'] = daily_stats.get('totalSteps', "N/A")
@@ -90,6 +177,8 @@ def get_activity(
 
         except Exception as e:
              print(f"[Garmin Source] Error fetching daily stats: {e}", file=sys.stderr)
+             if raise_errors:
+                 raise
              # Set defaults if fetch fails
              daily_context['daily_steps'] = "N/A"
              daily_context['stress_qualifier'] = "N/A"
@@ -101,7 +190,7 @@ def get_activity(
         try:
             print(f"[Garmin Source] Fetching sleep data for {end_date.isoformat()}...")
             # Note: Sleep data might correspond to the *night leading into* end_date
-            sleep_data = client.get_sleep_data(end_date.isoformat())
+            sleep_data = api.get_sleep_data(end_date.isoformat())
             if sleep_data and 'dailySleepDTO' in sleep_data:
                  print("[Garmin Source] Sleep data fetched successfully.")
                  sleep_dto = sleep_data['dailySleepDTO']
@@ -131,6 +220,8 @@ def get_activity(
 
         except Exception as e:
             print(f"[Garmin Source] Error fetching sleep data: {e}", file=sys.stderr)
+            if raise_errors:
+                raise
             # Set defaults if fetch fails
             daily_context['sleep_duration_hr'] = "N/A"
             daily_context['sleep_duration_formatted'] = "N/A"
@@ -140,145 +231,171 @@ def get_activity(
             daily_context['awake_duration_formatted'] = "N/A"
             daily_context['sleep_score'] = "N/A"
 
-        print(f"[Garmin Source] Daily Context prepared: {daily_context}")
+        # One shared, immutable context object per day instead of a dict copy per activity
+        daily_context = DailyContext.intern(**daily_context)
+        print(f"[Garmin Source] Daily Context prepared: {daily_context.to_dict()}")
         # ---------------------------------------------------------
 
-        # Fetch activities (adjust limit as needed)
+        weekly = None
+        if include_chart_data:
+            try:
+                weekly = _fetch_weekly(api, end_date)
+            except Exception as e:
+                print(f"[Garmin Source] Error fetching weekly steps/sleep: {e}", file=sys.stderr)
+
+        # One range request for the whole window; activities are then processed newest first
         print(f"[Garmin Source] Fetching activities from {start_date} to {end_date}...")
-        garmin_activities = client.get_activities_by_date(
+        garmin_activities = api.get_activities_by_date(
             start_date.isoformat(),
             end_date.isoformat()
             # Can add activity_type here, e.g., activitytype="running"
-        )
-
-        if not garmin_activities:
-            print("[Garmin Source] No activities found in the specified date range.")
-            # No need to return here, finally block will handle logout
-        else:
+        ) or []
+        garmin_activities = sorted(garmin_activities, key=lambda a: a.get('startTimeGMT') or '', reverse=True)
+        if garmin_activities:
             print(f"[Garmin Source] Found {len(garmin_activities)} activities. Processing...")
-            # Process fetched activities
-            for activity in garmin_activities:
-                # Extract relevant details (adjust keys based on garminconnect output)
-                activity_id = activity.get('activityId')
-                activity_type = activity.get('activityType', {}).get('typeKey', 'unknown')
-                start_time_str = activity.get('startTimeGMT')
-                distance_meters = activity.get('distance')
-                duration_seconds = activity.get('duration')
-                # --- Attempt to extract additional metrics ---
-                avg_hr = activity.get('averageHR')
-                max_hr = activity.get('maxHR')
-                calories = activity.get('calories')
-                # -------------------------------------------
+        else:
+            print(f"[Garmin Source] No activities found from {start_date} to {end_date}.")
+        for activity in garmin_activities:
+            # Extract relevant details (adjust keys based on garminconnect output)
+            activity_id = activity.get('activityId')
+            activity_type = activity.get('activityType', {}).get('typeKey', 'unknown')
+            start_time_str = activity.get('startTimeGMT')
+            distance_meters = activity.get('distance')
+            duration_seconds = activity.get('duration')
+            # --- Attempt to extract additional metrics ---
+            avg_hr = activity.get('averageHR')
+            max_hr = activity.get('maxHR')
+            calories = activity.get('calories')
+            # -------------------------------------------
+
+            try:
+                start_time = datetime.fromisoformat(start_time_str.replace(" ", "T") + "+00:00")
+            except (TypeError, ValueError):
+                start_time = datetime.now(timezone.utc)
+
+            distance_km = (distance_meters / 1000.0) if distance_meters else 0.0
 
+            fit_records = None
+            fit_metrics = None
+            if fit_cache_dir and activity_id:
                 try:
-                    start_time = datetime.fromisoformat(start_time_str.replace(" ", "T") + "+00:00")
-                except (TypeError, ValueError):
-                    start_time = datetime.now(timezone.utc)
+                    fit_path = garmin_fit.fetch_fit_file(api, activity_id, fit_cache_dir)
+                    fit_records = garmin_fit.read_fit_records(fit_path) if fit_path else None
+                    if fit_records is not None:
+                        fit_metrics = garmin_fit.compute_fit_metrics(fit_records, fit_max_hr, activity_type)
+                except Exception as e:
+                    print(f"[Garmin Source] Error processing FIT file for activity {activity_id}: {e}", file=sys.stderr)
 
-                distance_km = (distance_meters / 1000.0) if distance_meters else 0.0
+            summary = "Unknown activity"
+            try:
+                summary = format_activity_summary(activity_format, daily_context, activity_type, distance_km, duration_seconds, avg_hr, max_hr, calories, fit_metrics)
+            except KeyError as e:
+                print(f"[Garmin Source] Warning: Key '{e}' not found...", file=sys.stderr)
+            except Exception as e:
+                print(f"[Garmin Source] Warning: Error formatting summary...: {e}", file=sys.stderr)
 
-                summary = "Unknown activity"
+            samples = None
+            if include_chart_data and activity_id:
                 try:
-                    # Use a dictionary for formatting to handle missing keys gracefully
-                    format_data = {
-                        'activity_type': activity_type.replace('_', ' ').title(),
-                        'distance': distance_km,
-                        'duration': duration_seconds,
-                        'duration_formatted': format_duration(duration_seconds),
-                        'avg_hr': avg_hr if avg_hr is not None else "N/A",
-                        'max_hr': max_hr if max_hr is not None else "N/A",
-                        'calories': int(calories) if calories is not None else "N/A",
-                        # --- Add NEW daily context placeholders ---
-                        'daily_steps': daily_context.get('daily_steps', "N/A"),
-                        'sleep_duration_hr': daily_context.get('sleep_duration_hr', "N/A"),
-                        'sleep_duration_formatted': daily_context.get('sleep_duration_formatted', "N/A"),
-                        'deep_sleep_percent': daily_context.get('deep_sleep_percent', "N/A"),
-                        'rem_sleep_percent': daily_context.get('rem_sleep_percent', "N/A"),
-                        'light_sleep_percent': daily_context.get('light_sleep_percent', "N/A"),
-                        'awake_duration_formatted': daily_context.get('awake_duration_formatted', "N/A"),
-                        'sleep_score': daily_context.get('sleep_score', "N/A"),
-                        'stress_qualifier': daily_context.get('stress_qualifier', "N/A"),
-                        'avg_stress_level': daily_context.get('avg_stress_level', "N/A"),
-                        'resting_hr': daily_context.get('resting_hr', "N/A"),
-                        'body_battery_charged': daily_context.get('body_battery_charged', "N/A"),
-                        'body_battery_drained': daily_context.get('body_battery_drained', "N/A"),
-                        # ---------------------------------------
-                    }
-                    summary = activity_format.format(**format_data)
-                except KeyError as e:
-                    print(f"[Garmin Source] Warning: Key '{e}' not found...", file=sys.stderr)
+                    samples = garmin_fit.fit_samples(fit_records) if fit_records is not None else None
+                    samples = samples or _fetch_samples(api, activity_id)
                 except Exception as e:
-                    print(f"[Garmin Source] Warning: Error formatting summary...: {e}", file=sys.stderr)
-                
-                activity_entry: Activity = {
-                    "source": "garmin",
-                    "timestamp": start_time,
-                    "type": activity_type,
-                    "summary": summary,
-                    "details": {
-                        "activity_id": activity_id,
-                        "distance_km": distance_km,
-                        "duration_seconds": duration_seconds,
-                        "duration_formatted": format_duration(duration_seconds),
-                        "average_hr": avg_hr,
-                        "max_hr": max_hr,
-                        "calories": calories,
-                        # --- Add NEW raw daily context to details ---
-                        "daily_context": daily_context,
-                        # ------------------------------------------
-                    },
-                    "url": f"https://connect.garmin.com/modern/activity/{activity_id}" if activity_id else None
-                }
-                activities.append(activity_entry)
-                print(f"  [Garmin Source] Added activity: {summary}")
+                    print(f"[Garmin Source] Error fetching samples for activity {activity_id}: {e}", file=sys.stderr)
+
+            activity_entry = Activity(
+                source="garmin",
+                timestamp=start_time,
+                type=activity_type,
+                summary=summary,
+                details=GarminActivityDetails(
+                    activity_id=activity_id,
+                    distance_km=distance_km,
+                    duration_seconds=duration_seconds,
+                    duration_formatted=format_duration(duration_seconds),
+                    average_hr=avg_hr,
+                    max_hr=max_hr,
+                    calories=calories,
+                    daily_context=daily_context,
+                    samples=samples,
+                    weekly=weekly,
+                    fit_metrics=fit_metrics,
+                ),
+                url=f"https://connect.garmin.com/modern/activity/{activity_id}" if activity_id else None,
+            )
+            count += 1
+            print(f"  [Garmin Source] Added activity: {summary}")
+            yield activity_entry
 
         # --- NEW: Create daily summary pseudo-activity if no real activities found ---
-        if not activities and daily_summary_format and daily_context.get('daily_steps', 'N/A') != 'N/A':
+        if not count and daily_summary_format and daily_context.get('daily_steps', 'N/A') != 'N/A':
             print("[Garmin Source] No specific activities found, but daily data exists. Creating daily summary entry.")
             try:
                 # Format summary using daily_summary_format and daily_context
                 summary = daily_summary_format.format(**daily_context)
                 
                 # Create the pseudo-activity entry
-                daily_entry: Activity = {
-                    "source": "garmin_daily", # Special source key
-                    "timestamp": datetime.combine(end_date, datetime.min.time(), tzinfo=timezone.utc), # Timestamp for the summary day
-                    "type": "daily_summary",
-                    "summary": summary,
-                    "details": {
-                        # Include raw daily context in details
-                        "daily_context": daily_context,
-                    },
-                    "url": "https://connect.garmin.com/modern/daily-summary" # General link or None
-                }
-                activities.append(daily_entry)
+                daily_entry = Activity(
+                    source="garmin_daily", # Special source key
+                    timestamp=datetime.combine(end_date, datetime.min.time(), tzinfo=timezone.utc), # Timestamp for the summary day
+                    type="daily_summary",
+                    summary=summary,
+                    details=DailySummaryDetails(daily_context=daily_context, weekly=weekly),
+                    url="https://connect.garmin.com/modern/daily-summary" # General link or None
+                )
+                count += 1
                 print(f"  [Garmin Source] Added daily summary: {summary}")
+                yield daily_entry
             except KeyError as e:
                 print(f"[Garmin Source] Warning: Key '{e}' not found for daily_summary_format...", file=sys.stderr)
             except Exception as e:
                 print(f"[Garmin Source] Warning: Error formatting daily summary entry: {e}", file=sys.stderr)
         # --------------------------------------------------------------------------
 
-    except GarminConnectAuthenticationError:
+    except GarminConnectAuthenticationError as e:
+        if not owns_client and not count:
+            raise SessionRejectedError(f"Garmin rejected the pooled session: {e}") from e
         print(f"[Garmin Source] Error: Authentication failed for user {username}. Check credentials.", file=sys.stderr)
+        if raise_errors:
+            raise SourceError(f"Garmin: {e}") from e
     except GarminConnectConnectionError as e:
         print(f"[Garmin Source] Error: Connection error: {e}", file=sys.stderr)
-    except GarminConnectTooManyRequestsError:
+        if raise_errors:
+            raise SourceError(f"Garmin: {e}") from e
+    except GarminConnectTooManyRequestsError as e:
         print("[Garmin Source] Error: Too many requests. Garmin Connect may be rate-limiting.", file=sys.stderr)
+        if raise_errors:
+            raise SourceError(f"Garmin: {e}") from e
     except Exception as e:
         print(f"[Garmin Source] An unexpected error occurred during processing: {e}", file=sys.stderr)
+        if raise_errors:
+            raise SourceError(f"Garmin: {e}") from e
         # Consider re-raising or logging traceback for debugging
     finally:
-        # Ensure logout is called if client was initialized
-        if client:
+        # Ensure logout is called if we initialized the client
+        if owns_client and client:
              try:
                  client.logout()
                  print("[Garmin Source] Logout successful.")
              except Exception as e:
                  print(f"[Garmin Source] Error during logout: {e}", file=sys.stderr)
 
-    print(f"[Garmin Source] Finished processing. Returning {len(activities)} activities.")
-    return activities
+    print(f"[Garmin Source] Finished processing. Yielded {count} activities.")
+
+def get_activity(
+    username: str | None,
+    password: str | None,
+    activity_format: str,
+    daily_summary_format: str | None = None,
+    include_chart_data: bool = False,
+    client=None,
+    day: date | None = None,
+    window_days: int = 1,
+    fit_cache_dir: str | None = None,
+    fit_max_hr: float = garmin_fit.DEFAULT_MAX_HR,
+    ) -> list[Activity]:
+    """Same as iter_activity, collected into a list."""
+    return list(iter_activity(username, password, activity_format, daily_summary_format, include_chart_data, client, day, window_days,
+                              fit_cache_dir, fit_max_hr))
 
 if __name__ == '__main__':
     print("Testing Garmin Source module...")
@@ -1,30 +1,128 @@
 import sys
 from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator
 import github
 
-# Định nghĩa cấu trúc dữ liệu chuẩn cho một hoạt động (ví dụ)
-# Có thể dùng Pydantic hoặc class nếu muốn chặt chẽ hơn
-Activity = dict[str, any] # Ví dụ: {source, timestamp, type, summary, details, url}
+# Cấu trúc dữ liệu chuẩn cho một hoạt động: {source, timestamp, type, summary, details, url}
+from ..activity import Activity, CommitDetails
+from ..clients import SessionRejectedError
+from ..ratelimit import RateLimiter
+from . import SourceError
 
-def get_activity(username: str, token: str, activity_format: str) -> list[Activity]:
-    """Lấy hoạt động GitHub (commits) trong 24 giờ qua và chuẩn hóa kết quả."""
+# The public events feed only reaches back ~90 days (max 300 events); older windows need the commit search API
+EVENTS_HORIZON = timedelta(days=85)
+EVENTS_FEED_LIMIT = 300 # A feed that ends after this many events was cut off, not exhausted
+
+def _paced(items: Iterable, limiter: RateLimiter | None, per_page: int) -> Iterator:
+    """Iterates a PaginatedList, taking a limiter token before each page request (every `per_page` items)."""
+    iterator = iter(items)
+    index = 0
+    while True:
+        if limiter and index % per_page == 0:
+            limiter.acquire()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        index += 1
+        yield item
+
+def _build_commit_activity(activity_format: str, event_time: datetime, repo_name: str, repo_full_name: str, commit_message: str, commit_sha: str) -> Activity:
+    """Tạo bản ghi hoạt động chuẩn hóa cho một commit."""
+    # Tạo summary dựa trên format từ config
+    summary = activity_format.format(
+        repo=repo_name,
+        message=commit_message
+        # Thêm các placeholder khác nếu format cần
+    )
+    return Activity(
+        source="github",
+        timestamp=event_time, # Lưu thời gian sự kiện (hoặc commit time nếu muốn)
+        type="commit",
+        summary=summary,
+        details=CommitDetails(
+            repo_name=repo_name,
+            repo_full_name=repo_full_name,
+            message=commit_message,
+            sha=commit_sha,
+        ),
+        url=f"https://github.com/{repo_full_name}/commit/{commit_sha}",
+    )
+
+def _search_commits(g: github.Github, username: str, activity_format: str, since: datetime, until: datetime,
+                    limiter: RateLimiter | None = None) -> Iterator[Activity]:
+    """Commits authored by `username` in [since, until) via the search API (explicit windows, e.g. a backfill day)."""
+    query = f"author:{username} author-date:{since.date().isoformat()}..{(until - timedelta(seconds=1)).date().isoformat()}"
+    print(f"[GitHub Source] Searching commits: {query}")
+    for commit in _paced(g.search_commits(query, sort="author-date", order="desc"), limiter, g.per_page):
+        commit_time = commit.commit.author.date.replace(tzinfo=timezone.utc)
+        if not since <= commit_time < until:
+            continue
+        repo = commit.repository
+        commit_message = (commit.commit.message or '').split('\n')[0]
+        yield _build_commit_activity(activity_format, commit_time, repo.name, repo.full_name, commit_message, commit.sha)
+
+def iter_activity(
+    username: str,
+    token: str,
+    activity_format: str,
+    client: github.Github | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limiter: RateLimiter | None = None,
+    raise_errors: bool = False,
+) -> Iterator[Activity]:
+    """
+    Lấy hoạt động GitHub (commits) trong cửa sổ [since, until) (mặc định: 24 giờ qua) và chuẩn hóa kết quả.
+    Yields each commit (newest first) as soon as its page of events/search results arrives; later pages
+    are only requested if the caller keeps iterating.
+    Reuses `client` if given (e.g. from a ClientPool). An explicit `until` (a backfill day) or a window older than
+    the events feed uses the commit search API: the newest-first feed would be paged through from today for every
+    past day. The default window reads the feed, and searches only the part of it a busy user's feed no longer
+    reaches (it keeps only the last 300 events).
+    With a `limiter`, each API request (the user lookup, every page of events or search results) takes one token.
+    Raises SessionRejectedError if a given `client` gets 401 (the pool's session expired) before anything was yielded.
+    Other errors are printed and end the stream early, or raise SourceError with `raise_errors`.
+    """
     print(f"[GitHub Source] Fetching activity for user: {username}")
-    activities: list[Activity] = []
+    count = 0
     if not username or not token:
         print("[GitHub Source] Error: Username or token not provided.", file=sys.stderr)
-        return activities
+        if raise_errors:
+            raise SourceError("GitHub username or token not provided")
+        return
 
     try:
-        g = github.Github(token)
+        g = client or github.Github(token)
+        now = datetime.now(timezone.utc)
+        explicit_window = until is not None
+        until = until or now
+        since = since or until - timedelta(hours=24)
+        if explicit_window or since < now - EVENTS_HORIZON:
+            for activity_entry in _search_commits(g, username, activity_format, since, until, limiter):
+                count += 1
+                yield activity_entry
+            print(f"[GitHub Source] Found {count} commits between {since.isoformat()} and {until.isoformat()}.")
+            return
+
+        if limiter:
+            limiter.acquire()
         user = g.get_user(username)
-        since = datetime.now(timezone.utc) - timedelta(hours=24)
         print(f"[GitHub Source] Checking events since {since.isoformat()}...")
         events = user.get_events()
         processed_commit_shas = set()
+        events_seen = 0
+        oldest_event_time = until
+        reached_since = False
 
-        for event in events:
+        for event in _paced(events, limiter, g.per_page):
+            events_seen += 1
             event_time = event.created_at.replace(tzinfo=timezone.utc)
+            oldest_event_time = min(oldest_event_time, event_time)
+            if event_time >= until:
+                continue # Newer than the window; the feed is newest-first
             if event_time < since:
+                reached_since = True
                 break
 
             if event.type == 'PushEvent':
@@ -43,45 +141,57 @@ def get_activity(username: str, token: str, activity_format: str) -> list[Activi
                     commit_message = commit.get('message', '').split('\n')[0]
                     processed_commit_shas.add(commit_sha)
 
-                    # Tạo summary dựa trên format từ config
-                    summary = activity_format.format(
-                        repo=repo_name,
-                        message=commit_message
-                        # Thêm các placeholder khác nếu format cần
-                    )
-
                     # Tạo dictionary hoạt động chuẩn hóa
-                    activity_entry: Activity = {
-                        "source": "github",
-                        "timestamp": event_time, # Lưu thời gian sự kiện (hoặc commit time nếu muốn)
-                        "type": "commit",
-                        "summary": summary,
-                        "details": {
-                            "repo_name": repo_name,
-                            "repo_full_name": repo_full_name,
-                            "message": commit_message,
-                            "sha": commit_sha
-                        },
-                        "url": f"https://github.com/{repo_full_name}/commit/{commit_sha}"
-                    }
-                    activities.append(activity_entry)
+                    activity_entry = _build_commit_activity(activity_format, event_time, repo_name, repo_full_name, commit_message, commit_sha)
+                    count += 1
                     print(f"  [GitHub Source] Added commit from {repo_name}: {commit_message[:50]}...")
+                    yield activity_entry
 
             # --- Thêm các loại sự kiện khác ở đây nếu cần --- 
             # Ví dụ: PRs, Issues, ... với cấu trúc chuẩn hóa tương tự
 
-        if not activities:
-            print("[GitHub Source] No relevant activity found in the last 24 hours.")
+        if not reached_since and events_seen >= EVENTS_FEED_LIMIT:
+            # The capped feed ended before the window's start: the rest is only in the search API
+            print(f"[GitHub Source] Warning: Events feed ended at {oldest_event_time.isoformat()} ({events_seen} events), "
+                  f"before {since.isoformat()}. Searching commits for the rest of the window.", file=sys.stderr)
+            for activity_entry in _search_commits(g, username, activity_format, since, min(oldest_event_time, until), limiter):
+                if activity_entry.details.sha in processed_commit_shas:
+                    continue
+                processed_commit_shas.add(activity_entry.details.sha)
+                count += 1
+                yield activity_entry
+
+        if not count:
+            print(f"[GitHub Source] No relevant activity found since {since.isoformat()}.")
         else:
-            print(f"[GitHub Source] Found {len(activities)} relevant activities.")
+            print(f"[GitHub Source] Found {count} relevant activities.")
 
+    except github.BadCredentialsException as e:
+        if client is not None and not count:
+            raise SessionRejectedError(f"GitHub rejected the pooled client: {e}") from e
+        print(f"[GitHub Source] Error fetching activity: {e}", file=sys.stderr)
+        if raise_errors:
+            raise SourceError(f"GitHub: {e}") from e
     except github.GithubException as e:
         # Phân tích lỗi cụ thể hơn nếu cần (ví dụ: BadCredentials, RateLimitExceeded)
         print(f"[GitHub Source] Error fetching activity: {e}", file=sys.stderr)
+        if raise_errors:
+            raise SourceError(f"GitHub: {e}") from e
     except Exception as e:
         print(f"[GitHub Source] An unexpected error occurred: {e}", file=sys.stderr)
+        if raise_errors:
+            raise SourceError(f"GitHub: {e}") from e
 
-    return activities
+def get_activity(
+    username: str,
+    token: str,
+    activity_format: str,
+    client: github.Github | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list[Activity]:
+    """Như iter_activity, nhưng trả về toàn bộ danh sách."""
+    return list(iter_activity(username, token, activity_format, client=client, since=since, until=until))
 
 # Test function khi chạy trực tiếp (cần có file config.yaml và .env để test)
 if __name__ == '__main__':
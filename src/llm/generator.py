@@ -1,12 +1,70 @@
 import sys
+from typing import Iterable
 import google.generativeai as genai
 from ..config_loader import get_secret # Import từ cùng package cấp cao hơn
 
-# Định nghĩa lại kiểu dữ liệu chuẩn (hoặc import từ một module chung)
-Activity = dict[str, any]
+# Kiểu dữ liệu chuẩn dùng chung cho mọi nguồn
+from ..activity import Activity
+from ..posting.twitter_text import weighted_length, MAX_WEIGHTED_LENGTH
 
-def generate_posts(all_activities: list[Activity], llm_config: dict, persona: str, gemini_api_key: str, specific_prompt_template: str | None = None) -> list[str]:
-    """Tạo nội dung bài đăng mạng xã hội dựa trên danh sách các hoạt động đã chuẩn hóa."""
+# Most activities listed in one prompt (config: llm.max_activities_in_prompt)
+DEFAULT_MAX_ACTIVITIES_IN_PROMPT = 50
+# LLM rewrites of a post over the X length limit before it is left to be split into a thread (config: llm.max_shorten_attempts)
+DEFAULT_MAX_SHORTEN_ATTEMPTS = 1
+SHORTEN_PROMPT = (
+    "Rewrite this social media post so it is at most {max_length} characters (links count as 23, "
+    "emoji and characters with stacked accents as 2; it is currently about {length}). Keep the language, "
+    "tone, hashtags and links; cut details, not the main point. Reply with the post only.\n\n{text}"
+)
+
+def compact_activities(activities: Iterable[Activity], max_activities: int = DEFAULT_MAX_ACTIVITIES_IN_PROMPT) -> tuple[list[Activity], int]:
+    """
+    Consumes an activity stream (e.g. a source's iter_activity) with bounded memory: keeps the first
+    `max_activities` (sources yield newest first) and only counts the rest. Returns (kept, total).
+    """
+    kept: list[Activity] = []
+    total = 0
+    for activity in activities:
+        total += 1
+        if len(kept) < max_activities:
+            kept.append(activity)
+    return kept, total
+
+def split_into_tweets(generated_text: str) -> list[str]:
+    """
+    Tách văn bản LLM thành các bài đăng (theo đoạn trống). Không cắt bài dài: mỗi nền tảng tự tách
+    bài vượt giới hạn thành thread đánh số (PostingTarget.split).
+    """
+    return [t.strip() for t in generated_text.split('\n\n') if t.strip()]
+
+def shorten_to_fit(model, text: str, max_length: int = MAX_WEIGHTED_LENGTH, max_attempts: int = DEFAULT_MAX_SHORTEN_ATTEMPTS, log=print) -> str:
+    """
+    Asks the model to rewrite `text` while it fails the local X length check, at most max_attempts
+    times; valid text costs no call. Returns the shortest version (the caller's target splits it into
+    a thread if it is still too long).
+    """
+    length = weighted_length(text)
+    for attempt in range(max_attempts):
+        if length <= max_length:
+            break
+        log(f"[LLM Generator] Post is {length}/{max_length} (weighted); asking for a shorter version (attempt {attempt + 1}/{max_attempts})...")
+        try:
+            candidate = model.generate_content(SHORTEN_PROMPT.format(max_length=max_length, length=length, text=text)).text.strip()
+        except Exception as e:
+            log(f"[LLM Generator] Error shortening post: {e}")
+            break
+        candidate_length = weighted_length(candidate) if candidate else length
+        if candidate and candidate_length < length:
+            text, length = candidate, candidate_length
+    if length > max_length:
+        log(f"[LLM Generator] Post still {length}/{max_length} (weighted); it will be posted as a numbered thread.")
+    return text
+
+def generate_posts(all_activities: list[Activity], llm_config: dict, persona: str, gemini_api_key: str, specific_prompt_template: str | None = None, omitted_count: int = 0) -> list[str]:
+    """
+    Tạo nội dung bài đăng mạng xã hội dựa trên danh sách các hoạt động đã chuẩn hóa.
+    `omitted_count`: số hoạt động đã bị compact_activities lược bỏ (được nhắc tới trong prompt).
+    """
     if not all_activities:
         print("[LLM Generator] No activities provided to generate posts.")
         return []
@@ -28,6 +86,8 @@ def generate_posts(all_activities: list[Activity], llm_config: dict, persona: st
         model = genai.GenerativeModel(model_name)
 
         activity_summary_lines = [act.get('summary', 'Activity details unclear') for act in all_activities]
+        if omitted_count:
+            activity_summary_lines.append(f"(+{omitted_count} more similar activities not listed)")
         activity_summary_str = "\n".join(activity_summary_lines)
 
         prompt = prompt_template_to_use.format(
@@ -50,21 +110,10 @@ def generate_posts(all_activities: list[Activity], llm_config: dict, persona: st
 
         print(f"[LLM Generator] Generated text block:\n{generated_text}\n-------------------------------------")
 
-        # Tách thành nhiều tweets
-        potential_tweets = [t.strip() for t in generated_text.split('\n\n') if t.strip()]
-        
-        final_tweets = []
-        for tweet in potential_tweets:
-            if len(tweet) > 280:
-                print(f"[LLM Generator] Warning: Truncating generated tweet exceeding 280 chars: {tweet[:50]}...")
-                last_space = tweet[:277].rfind(' ')
-                if last_space != -1:
-                    final_tweets.append(tweet[:last_space] + "...")
-                else:
-                    final_tweets.append(tweet[:277] + "...")
-            else:
-                final_tweets.append(tweet)
-        
+        # Tách thành nhiều tweets; bài vượt giới hạn X được rút gọn (có giới hạn số lần gọi)
+        max_shorten_attempts = int(llm_config.get('max_shorten_attempts', DEFAULT_MAX_SHORTEN_ATTEMPTS))
+        final_tweets = [shorten_to_fit(model, tweet, max_attempts=max_shorten_attempts) for tweet in split_into_tweets(generated_text)]
+
         if not final_tweets:
             print("[LLM Generator] No valid tweets generated after splitting/validation.")
             return []
@@ -148,11 +197,12 @@ def generate_follow_up_comment(
              logger.error("[LLM Generator] Error: LLM generated empty follow-up comment.")
              return None
 
-        # Basic length check for comment (though prompts should handle it)
-        if len(generated_comment) > 280:
-             logger.warning("[LLM Generator] Truncating generated comment exceeding 280 chars.")
-             # Simple truncation, can be improved
-             generated_comment = generated_comment[:277] + "..."
+        # Weighted X length check; shortened by the model only when it fails (split into a thread otherwise)
+        generated_comment = shorten_to_fit(
+            model, generated_comment,
+            max_attempts=int(llm_config.get('max_shorten_attempts', DEFAULT_MAX_SHORTEN_ATTEMPTS)),
+            log=logger.warning,
+        )
 
         logger.info(f"[LLM Generator] Generated follow-up comment: {generated_comment[:100]}...")
         return generated_comment
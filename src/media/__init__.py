@@ -0,0 +1 @@
+# This file makes 'media' a Python sub-package
@@ -0,0 +1,161 @@
+"""Renders activity charts (PNG) from array data, cached on disk by content hash."""
+
+import sys
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+
+# Attempt to import the plotting stack, handle if not installed
+try:
+    import numpy as np
+    import matplotlib
+    matplotlib.use("Agg") # Headless backend, no display needed
+    import matplotlib.pyplot as plt
+except ModuleNotFoundError:
+    print("Warning: 'matplotlib' and 'numpy' are required for chart images (pip install -r requirements.txt). Posts will be text-only.", file=sys.stderr)
+    np = None
+    plt = None
+
+DEFAULT_RENDER_CACHE_DIR = 'data/render_cache'
+# Bump when chart styling changes so cached images are re-rendered
+RENDER_VERSION = 1
+
+CHART_KINDS = ("hr_pace", "weekly_steps_sleep", "commit_heatmap")
+
+def _content_hash(kind: str, arrays: dict, labels: dict) -> str:
+    """Hash of everything that affects the rendered pixels."""
+    digest = hashlib.sha256(f"{kind}:{RENDER_VERSION}".encode())
+    for name in sorted(arrays):
+        digest.update(name.encode())
+        digest.update(np.asarray(arrays[name], dtype=np.float64).tobytes())
+    digest.update(json.dumps(labels, sort_keys=True, ensure_ascii=False, default=str).encode())
+    return digest.hexdigest()[:32]
+
+def _render_cached(kind: str, arrays: dict, labels: dict, draw, cache_dir: str) -> str | None:
+    """Returns the cached PNG for this input, rendering it with draw(fig, arrays, labels) on a miss."""
+    if plt is None:
+        return None
+    path = os.path.join(cache_dir, f"{kind}-{_content_hash(kind, arrays, labels)}.png")
+    if os.path.exists(path):
+        print(f"[Charts] {kind}: render cache hit ({path}).")
+        return path
+
+    started = time.perf_counter()
+    os.makedirs(cache_dir, exist_ok=True)
+    fig = plt.figure(figsize=(8, 4.5), dpi=150)
+    try:
+        draw(fig, {name: np.asarray(values, dtype=np.float64) for name, values in arrays.items()}, labels)
+        fig.tight_layout()
+        tmp_path = path + ".tmp"
+        fig.savefig(tmp_path, format="png")
+        os.replace(tmp_path, path) # Never leave a half-written image under the final name
+    finally:
+        plt.close(fig)
+    print(f"[Charts] {kind}: rendered in {time.perf_counter() - started:.2f}s ({path}).")
+    return path
+
+# --- Chart drawers ---
+def _draw_hr_pace(fig, arrays, labels):
+    minutes = arrays['elapsed_s'] / 60.0
+    ax_hr = fig.add_subplot(2, 1, 1)
+    ax_hr.plot(minutes, arrays['hr'], color="tab:red", linewidth=1)
+    ax_hr.set_ylabel("HR (bpm)")
+    ax_hr.set_title(labels.get('title', 'Activity'))
+    ax_hr.grid(alpha=0.3)
+
+    ax_pace = fig.add_subplot(2, 1, 2, sharex=ax_hr)
+    speed = arrays['speed_mps']
+    # Pace in min/km; standing still has no meaningful pace
+    pace = np.where(speed > 0.5, 1000.0 / np.maximum(speed, 1e-9) / 60.0, np.nan)
+    ax_pace.plot(minutes, pace, color="tab:blue", linewidth=1)
+    ax_pace.invert_yaxis() # Faster pace on top
+    ax_pace.set_ylabel("Pace (min/km)")
+    ax_pace.set_xlabel("Elapsed (min)")
+    ax_pace.grid(alpha=0.3)
+
+def _draw_weekly_steps_sleep(fig, arrays, labels):
+    x = np.arange(len(arrays['steps']))
+    ax_steps = fig.add_subplot(1, 1, 1)
+    ax_steps.bar(x - 0.2, arrays['steps'], width=0.4, color="tab:green", label="Steps")
+    ax_steps.set_ylabel("Steps")
+    ax_sleep = ax_steps.twinx()
+    ax_sleep.bar(x + 0.2, arrays['sleep_hours'], width=0.4, color="tab:purple", label="Sleep (h)")
+    ax_sleep.set_ylabel("Sleep (h)")
+    ax_steps.set_xticks(x, labels.get('days', [str(i) for i in x]))
+    ax_steps.set_title(labels.get('title', 'Last 7 days'))
+
+def _draw_commit_heatmap(fig, arrays, labels):
+    ax = fig.add_subplot(1, 1, 1)
+    image = ax.imshow(arrays['grid'], aspect="auto", cmap="Greens", interpolation="nearest")
+    ax.set_yticks(range(7), ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
+    ax.set_xticks(range(0, 24, 3), [f"{h:02d}h" for h in range(0, 24, 3)])
+    ax.set_title(labels.get('title', 'Commits by weekday and hour (UTC)'))
+    fig.colorbar(image, ax=ax, label="Commits")
+
+# --- Public renderers ---
+def render_hr_pace(elapsed_s, hr, speed_mps, title: str = "Activity", cache_dir: str = DEFAULT_RENDER_CACHE_DIR) -> str | None:
+    """HR and pace over elapsed time for one activity."""
+    if len(elapsed_s) == 0:
+        return None
+    return _render_cached(
+        "hr_pace",
+        {"elapsed_s": elapsed_s, "hr": hr, "speed_mps": speed_mps},
+        {"title": title},
+        _draw_hr_pace,
+        cache_dir,
+    )
+
+def render_weekly_steps_sleep(days: list[str], steps, sleep_hours, title: str = "Last 7 days", cache_dir: str = DEFAULT_RENDER_CACHE_DIR) -> str | None:
+    """Daily steps and sleep hours as a grouped bar chart."""
+    if len(steps) == 0:
+        return None
+    return _render_cached(
+        "weekly_steps_sleep",
+        {"steps": steps, "sleep_hours": sleep_hours},
+        {"days": days, "title": title},
+        _draw_weekly_steps_sleep,
+        cache_dir,
+    )
+
+def render_commit_heatmap(timestamps: list[datetime], title: str = "Commits by weekday and hour (UTC)", cache_dir: str = DEFAULT_RENDER_CACHE_DIR) -> str | None:
+    """Weekday x hour heatmap of commit timestamps."""
+    if np is None or not timestamps:
+        return None
+    weekdays = np.fromiter((ts.weekday() for ts in timestamps), dtype=np.intp, count=len(timestamps))
+    hours = np.fromiter((ts.hour for ts in timestamps), dtype=np.intp, count=len(timestamps))
+    grid = np.zeros((7, 24))
+    np.add.at(grid, (weekdays, hours), 1)
+    return _render_cached("commit_heatmap", {"grid": grid}, {"title": title}, _draw_commit_heatmap, cache_dir)
+
+def render_for_activities(kind: str, activities: list[dict], cache_dir: str = DEFAULT_RENDER_CACHE_DIR) -> str | None:
+    """Renders chart `kind` from a source's normalized activities, or returns None if the data isn't there."""
+    if plt is None or not activities:
+        return None
+    try:
+        if kind == "hr_pace":
+            for activity in activities:
+                samples = (activity.get('details') or {}).get('samples')
+                if samples and samples.get('elapsed_s'):
+                    title = activity.get('type', 'activity').replace('_', ' ').title()
+                    return render_hr_pace(samples['elapsed_s'], samples['hr'], samples['speed_mps'], title=title, cache_dir=cache_dir)
+            return None
+        if kind == "weekly_steps_sleep":
+            weekly = (activities[0].get('details') or {}).get('weekly')
+            if not weekly:
+                return None
+            return render_weekly_steps_sleep(weekly['days'], weekly['steps'], weekly['sleep_hours'], cache_dir=cache_dir)
+        if kind == "commit_heatmap":
+            timestamps = [a['timestamp'] for a in activities if isinstance(a.get('timestamp'), datetime)]
+            return render_commit_heatmap(timestamps, cache_dir=cache_dir)
+        print(f"[Charts] Warning: Unknown chart kind '{kind}'. Expected one of {CHART_KINDS}.", file=sys.stderr)
+    except Exception as e:
+        print(f"[Charts] Error rendering {kind}: {e}", file=sys.stderr)
+    return None
+
+if __name__ == '__main__':
+    print("Testing Charts module...")
+    if np is not None:
+        t = np.arange(0, 1800, 5)
+        print(render_hr_pace(t, 140 + 10 * np.sin(t / 300), 3 + 0.2 * np.cos(t / 200), title="Test Run"))
@@ -0,0 +1,170 @@
+"""Posting-target interface shared by the X, Mastodon and Bluesky adapters."""
+
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config_loader import TargetConfig, get_secret
+from ..ratelimit import RateLimiter
+from .twitter_text import split_thread
+
+logger = logging.getLogger(__name__)
+
+class PostingError(Exception):
+    """A failed post/upload. `retryable` marks rate limits, 5xx and transport errors."""
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class RedirectAdapter(HTTPAdapter):
+    """Sends requests for `prefix` to `base_url` instead (points a client library at the local stand-in server)."""
+    def __init__(self, prefix: str, base_url: str):
+        super().__init__()
+        self.prefix = prefix
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, request, **kwargs):
+        if request.url.startswith(self.prefix):
+            request.url = self.base_url + request.url[len(self.prefix.rstrip('/')):]
+        return super().send(request, **kwargs)
+
+class PostingTarget(ABC):
+    """
+    One social network account. Adapters implement is_configured / post / upload_media and set
+    max_length / max_media (and override `length` if the network doesn't count characters); thread
+    posting with retries, per-target rate limiting and splitting long text live here.
+
+    Post IDs are opaque strings (the outbox stores them as-is); `post` receives the previous
+    link's ID as `reply_to` and the thread's first ID as `thread_root`, plus an `idempotency_key`
+    that is the same every time the same link is attempted, for networks that can deduplicate.
+    """
+    name = "target"
+    max_length = 280
+    max_media = 4
+    metrics_batch_size = 0 # IDs per fetch_metrics request; 0 = no metrics lookup for this network
+
+    def __init__(self, target_conf: TargetConfig):
+        self.key = target_conf.key
+        self.conf = target_conf.raw
+        self.enable_follow_up = target_conf.enable_follow_up
+        self.max_length = int(self.conf.get('max_length', self.max_length))
+        rate = self.conf.get('rate_limit_per_minute')
+        self.limiter = RateLimiter(float(rate), per=60.0) if rate else None
+
+    def secret(self, conf_key: str) -> str | None:
+        """Resolves a `<...>_env_var` setting of this target to the secret's value."""
+        env_var = self.conf.get(conf_key)
+        return get_secret(env_var) if env_var else None
+
+    # --- Implemented by adapters ---
+    @abstractmethod
+    def is_configured(self) -> bool:
+        """True if the target has the credentials/settings it needs."""
+
+    @abstractmethod
+    def post(self, text: str, reply_to: str | None = None, thread_root: str | None = None, media_ids: list[str] | None = None,
+             idempotency_key: str | None = None) -> str:
+        """Publishes one post and returns its ID. Raises PostingError."""
+
+    @abstractmethod
+    def upload_media(self, paths: list[str]) -> list[str]:
+        """Uploads images; returns media IDs of the successful uploads. Targets without media support return []."""
+
+    # --- Optional: only called when metrics_batch_size is set ---
+    def fetch_metrics(self, post_ids: list[str]) -> dict[str, dict]:
+        """Public metrics ({post_id: {"like_count": ..., ...}}) of up to metrics_batch_size posts in one request."""
+        raise NotImplementedError(f"{self.name} has no metrics lookup (metrics_batch_size = 0)")
+
+    def length(self, text: str) -> int:
+        """Length of text as this network counts it against max_length."""
+        return len(text)
+
+    # --- Shared ---
+    def split(self, text: str) -> list[str]:
+        """Text as posts within this network's length limit: as-is, or a numbered thread split at sentence boundaries."""
+        return split_thread(text, self.max_length, self.length)
+
+    def post_thread(
+        self,
+        parts: list[str],
+        posted_ids: list[str] | None = None,
+        delay_between: float = 0,
+        max_retries: int = 2,
+        retry_backoff: float = 5.0,
+        on_posted: Callable[[int, str], None] | None = None,
+        media_ids: list[str] | None = None,
+        thread_key: str | None = None,
+    ) -> list[str]:
+        """
+        Publishes `parts` as a reply chain, continuing after `posted_ids` (links already published
+        by an earlier, interrupted run). Each link is retried on retryable errors. Returns the IDs
+        posted by this call; `on_posted(index, post_id)` is called (with the index into `parts`) as
+        soon as each link is confirmed. `media_ids` are attached to the first part. With a
+        `thread_key` (the outbox key), each link is sent with the idempotency key "<thread_key>:<index>";
+        on networks that honour it (Mastodon), a retry after a timeout the server had in fact accepted
+        does not post the link twice. Elsewhere such a retry can post it twice, unless the adapter
+        first checks whether the post exists (X looks up its latest tweets).
+        """
+        posted_ids = list(posted_ids or [])
+        new_ids: list[str] = []
+        parts = [p for p in parts if p]
+        thread_started = time.perf_counter()
+
+        for index in range(len(posted_ids), len(parts)):
+            if new_ids and delay_between > 0:
+                time.sleep(delay_between)
+            text = parts[index]
+            reply_to = posted_ids[-1] if posted_ids else None
+            thread_root = posted_ids[0] if posted_ids else None
+            log_action = f"{self.name} part {index + 1}/{len(parts)}" + (f" (reply to {reply_to})" if reply_to else "")
+            logger.info(f"[{self.name}] Attempting to post {log_action}: {text[:100]}...")
+
+            post_id = None
+            for attempt in range(max_retries + 1):
+                if self.limiter:
+                    waited = self.limiter.acquire()
+                    if waited:
+                        logger.info(f"[{self.name}] Rate limit: waited {waited:.1f}s.")
+                started = time.perf_counter()
+                try:
+                    post_id = self.post(text, reply_to, thread_root, media_ids if index == 0 else None,
+                                        idempotency_key=f"{thread_key}:{index}" if thread_key else None)
+                    logger.info(f"[{self.name}] Posted {log_action} in {time.perf_counter() - started:.2f}s (ID: {post_id})")
+                    break
+                except PostingError as e:
+                    if attempt < max_retries and e.retryable:
+                        wait = retry_backoff * (2 ** attempt)
+                        logger.warning(f"[{self.name}] Error posting {log_action} (attempt {attempt + 1}): {e}. Retrying in {wait:.0f}s...")
+                        time.sleep(wait)
+                        continue
+                    logger.error(f"[{self.name}] Error posting {log_action}: {e}")
+                    break
+                except Exception as e:
+                    logger.error(f"[{self.name}] An unexpected error occurred posting {log_action}: {e}")
+                    break
+
+            if not post_id:
+                logger.error(f"[{self.name}] Thread stopped after {len(posted_ids)}/{len(parts)} parts. Resume from part {index + 1}.")
+                break
+            posted_ids.append(post_id)
+            new_ids.append(post_id)
+            if on_posted:
+                on_posted(index, post_id)
+
+        logger.info(f"[{self.name}] Thread has {len(posted_ids)}/{len(parts)} parts posted ({time.perf_counter() - thread_started:.2f}s).")
+        return new_ids
+
+def http_request(session: requests.Session, method: str, url: str, action: str, timeout: float = 30, **kwargs) -> dict:
+    """JSON request for the HTTP adapters. Raises PostingError (retryable for 429/5xx and transport errors)."""
+    try:
+        response = session.request(method, url, timeout=timeout, **kwargs)
+    except requests.RequestException as e:
+        raise PostingError(f"{action} failed: {e}", retryable=True) from e
+    if response.status_code >= 300:
+        retryable = response.status_code == 429 or response.status_code >= 500
+        raise PostingError(f"{action} failed: HTTP {response.status_code} {response.text[:200]}", retryable=retryable)
+    return response.json() if response.content else {}
@@ -0,0 +1,111 @@
+"""Bluesky adapter: posts through the AT Protocol XRPC endpoints of the account's PDS (app-password auth)."""
+
+import logging
+import mimetypes
+import threading
+from datetime import datetime, timezone
+
+import requests
+
+from ..config_loader import TargetConfig
+from .base import PostingTarget, PostingError, http_request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PDS_URL = 'https://bsky.social'
+
+def _split_ref(post_id: str) -> dict:
+    """Our post IDs are "<at-uri> <cid>"; replies need both as a strong ref."""
+    uri, _, cid = post_id.partition(' ')
+    return {"uri": uri, "cid": cid}
+
+class BlueskyTarget(PostingTarget):
+    """
+    Logs in with `handle_env_var` / `app_password_env_var` (an app password, not the account password)
+    and creates app.bsky.feed.post records. Replies carry both the thread root and the parent, which is
+    why post IDs are stored as "<at-uri> <cid>".
+    """
+    name = "Bluesky"
+    max_length = 300 # Bluesky counts graphemes; len() is the same for typical post text
+    max_media = 4
+
+    def __init__(self, target_conf: TargetConfig):
+        super().__init__(target_conf)
+        self.base_url = (self.conf.get('base_url') or DEFAULT_PDS_URL).rstrip('/')
+        self.handle = self.secret('handle_env_var')
+        self.app_password = self.secret('app_password_env_var')
+        self.session = requests.Session()
+        self._did = None
+        self._login_lock = threading.Lock()
+        self._uploaded_blobs: dict[str, dict] = {} # media ID -> blob ref, for the embed of the post using it
+
+    def is_configured(self) -> bool:
+        return bool(self.handle and self.app_password)
+
+    def _xrpc(self, method: str, nsid: str, **kwargs) -> dict:
+        return http_request(self.session, method, f"{self.base_url}/xrpc/{nsid}", nsid, **kwargs)
+
+    def _login(self):
+        """Creates a session once per target object; the access JWT is reused for every call."""
+        with self._login_lock:
+            if self._did:
+                return
+            session = self._xrpc("POST", "com.atproto.server.createSession", json={"identifier": self.handle, "password": self.app_password})
+            self.session.headers["Authorization"] = f"Bearer {session['accessJwt']}"
+            self._did = session['did']
+
+    def _authed_xrpc(self, method: str, nsid: str, **kwargs) -> dict:
+        """XRPC call on the session; if the access JWT was rejected (expired), logs in again and retries once."""
+        self._login()
+        try:
+            return self._xrpc(method, nsid, **kwargs)
+        except PostingError as e:
+            if "ExpiredToken" not in str(e) and "HTTP 401" not in str(e):
+                raise
+            logger.warning(f"[Bluesky] Session rejected ({e}); logging in again.")
+            with self._login_lock:
+                self._did = None
+            self._login()
+            return self._xrpc(method, nsid, **kwargs)
+
+    def post(self, text: str, reply_to: str | None = None, thread_root: str | None = None, media_ids: list[str] | None = None,
+             idempotency_key: str | None = None) -> str:
+        self._login() # The record names our DID as its repo
+        record = {
+            "$type": "app.bsky.feed.post",
+            "text": text,
+            "createdAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        }
+        if reply_to:
+            record["reply"] = {"root": _split_ref(thread_root or reply_to), "parent": _split_ref(reply_to)}
+        blobs = [self._uploaded_blobs[media_id] for media_id in media_ids or [] if media_id in self._uploaded_blobs]
+        if blobs:
+            record["embed"] = {"$type": "app.bsky.embed.images", "images": [{"alt": "", "image": blob} for blob in blobs]}
+        created = self._authed_xrpc("POST", "com.atproto.repo.createRecord", json={"repo": self._did, "collection": "app.bsky.feed.post", "record": record})
+        if not created.get('uri') or not created.get('cid'):
+            raise PostingError(f"Bluesky createRecord: unexpected response {created}")
+        return f"{created['uri']} {created['cid']}"
+
+    def upload_media(self, paths: list[str]) -> list[str]:
+        media_ids: list[str] = []
+        try:
+            self._login()
+        except PostingError as e:
+            logger.error(f"[Bluesky] Error logging in for media upload: {e}")
+            return media_ids
+        for path in paths[:self.max_media]:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                uploaded = self._authed_xrpc("POST", "com.atproto.repo.uploadBlob", data=data,
+                                      headers={"Content-Type": mimetypes.guess_type(path)[0] or 'application/octet-stream'})
+                blob = uploaded['blob']
+                media_id = blob['ref']['$link']
+                self._uploaded_blobs[media_id] = blob
+                media_ids.append(media_id)
+            except (PostingError, OSError, KeyError) as e:
+                logger.error(f"[Bluesky] Error uploading media {path}: {e}")
+        return media_ids
+
+def build_target(target_conf: TargetConfig) -> BlueskyTarget:
+    return BlueskyTarget(target_conf)
@@ -0,0 +1,64 @@
+"""Mastodon adapter: statuses and media through the instance's REST API (access-token auth)."""
+
+import os
+import logging
+import mimetypes
+
+import requests
+
+from ..config_loader import TargetConfig
+from .base import PostingTarget, PostingError, http_request
+
+logger = logging.getLogger(__name__)
+
+class MastodonTarget(PostingTarget):
+    """
+    Posts to `base_url` (the account's instance, e.g. https://mastodon.social) with the access token
+    from `access_token_env_var`. Threads are plain replies (`in_reply_to_id`) to the previous status;
+    every status carries an Idempotency-Key, so retries never double-post.
+    """
+    name = "Mastodon"
+    max_length = 500 # Default instance limit; set max_length for instances with a different one
+    max_media = 4
+
+    def __init__(self, target_conf: TargetConfig):
+        super().__init__(target_conf)
+        self.base_url = (self.conf.get('base_url') or '').rstrip('/')
+        self.access_token = self.secret('access_token_env_var')
+        self.visibility = self.conf.get('visibility', 'public')
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {self.access_token}"
+
+    def is_configured(self) -> bool:
+        return bool(self.base_url and self.access_token)
+
+    def post(self, text: str, reply_to: str | None = None, thread_root: str | None = None, media_ids: list[str] | None = None,
+             idempotency_key: str | None = None) -> str:
+        payload = {"status": text, "visibility": self.visibility}
+        if reply_to:
+            payload["in_reply_to_id"] = reply_to
+        if media_ids:
+            payload["media_ids"] = media_ids
+        # Mastodon returns the status already created for a repeated Idempotency-Key instead of posting again
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        status = http_request(self.session, "POST", f"{self.base_url}/api/v1/statuses", "Mastodon status", json=payload, headers=headers)
+        if not status.get('id'):
+            raise PostingError(f"Mastodon status: no id in response {status}")
+        return str(status['id'])
+
+    def upload_media(self, paths: list[str]) -> list[str]:
+        media_ids: list[str] = []
+        for path in paths[:self.max_media]:
+            try:
+                with open(path, 'rb') as f:
+                    media = http_request(
+                        self.session, "POST", f"{self.base_url}/api/v2/media", f"Mastodon media upload {path}",
+                        files={"file": (os.path.basename(path), f, mimetypes.guess_type(path)[0] or 'application/octet-stream')},
+                    )
+                media_ids.append(str(media['id']))
+            except (PostingError, OSError, KeyError) as e:
+                logger.error(f"[Mastodon] Error uploading media {path}: {e}")
+        return media_ids
+
+def build_target(target_conf: TargetConfig) -> MastodonTarget:
+    return MastodonTarget(target_conf)
@@ -0,0 +1,220 @@
+"""
+Local stand-in for the X, Mastodon and Bluesky APIs, for exercising the posting adapters without
+real accounts. Point a target at it with `base_url: http://127.0.0.1:8790` in config.yaml (plus
+dummy secrets) and run:
+
+    python -m src.posting.stub_server [--port 8790] [--latency 0.5]
+
+Every accepted post is kept in memory (GET /_posts lists them); `fail_next` injects error
+responses, e.g. to check retries and thread resumption, and `lose_next` accepts a request but
+answers 504, as when a response is lost after the network posted. Mastodon statuses honour the
+Idempotency-Key header like the real API. X's tweet lookup (GET /2/tweets?ids=...)
+serves public metrics set with `set_metrics` (zeros otherwise) and records each batch's size;
+GET /2/users/me and /2/users/<id>/tweets list the account's latest tweets, newest first.
+"""
+
+import json
+import time
+import argparse
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_STUB_PORT = 8790
+STUB_X_USER_ID = "900000000" # The X account the stub posts as
+
+class StubState:
+    """What the stand-in server has received, shared by its handler threads."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency # Seconds added to every request, to see concurrency in timings
+        self.posts: list[dict] = [] # {"network", "id", "text", "reply_to", "media"}
+        self.media: list[dict] = []
+        self._ids = itertools.count(1)
+        self._failures: dict[str, list[int]] = {}
+        self._lost: dict[str, int] = {}
+        self._idempotent: dict[str, dict] = {} # Mastodon Idempotency-Key -> status already created
+        self.metrics: dict[str, dict] = {} # post ID -> public metrics served by the lookup endpoint
+        self.lookups: list[int] = [] # Number of IDs in each metrics lookup request
+        self._lock = threading.Lock()
+
+    def next_id(self) -> str:
+        with self._lock:
+            return str(next(self._ids))
+
+    def fail_next(self, path: str, *statuses: int):
+        """The next requests to `path` (e.g. "/2/tweets") get these HTTP statuses, in order."""
+        with self._lock:
+            self._failures.setdefault(path, []).extend(statuses)
+
+    def take_failure(self, path: str) -> int | None:
+        with self._lock:
+            pending = self._failures.get(path)
+            return pending.pop(0) if pending else None
+
+    def lose_next(self, path: str, count: int = 1):
+        """The next `count` requests to `path` are carried out, but the client gets a 504 instead of the result."""
+        with self._lock:
+            self._lost[path] = self._lost.get(path, 0) + count
+
+    def take_lost(self, path: str) -> bool:
+        with self._lock:
+            if self._lost.get(path):
+                self._lost[path] -= 1
+                return True
+            return False
+
+    def idempotent(self, key: str | None, create) -> dict:
+        """The status created for an Idempotency-Key, creating it with `create()` on first use."""
+        if not key:
+            return create()
+        with self._lock:
+            if key in self._idempotent:
+                return self._idempotent[key]
+        status = create()
+        with self._lock:
+            return self._idempotent.setdefault(key, status)
+
+    def set_metrics(self, post_id: str, **metrics: int):
+        with self._lock:
+            self.metrics.setdefault(post_id, {}).update(metrics)
+
+    def record(self, kind: str, item: dict):
+        with self._lock:
+            (self.posts if kind == "post" else self.media).append(item)
+
+def start_stub_server(host: str = "127.0.0.1", port: int = DEFAULT_STUB_PORT, state: StubState | None = None) -> tuple[ThreadingHTTPServer, StubState]:
+    """Starts the stand-in server on a background thread (port 0 picks a free port). Returns (server, state)."""
+    state = state or StubState()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict | list | None):
+            if getattr(self, "lose_response", False):
+                status, payload = 504, {"error": "response lost (injected)"}
+            body = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(status)
+            if body:
+                self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self) -> tuple[str, bytes]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.headers.get("Content-Type", ""), self.rfile.read(length) if length else b""
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/_posts":
+                self._send_json(200, state.posts)
+            elif url.path == "/2/tweets":
+                failure = state.take_failure(url.path)
+                if failure:
+                    self._send_json(failure, {"error": f"injected {failure}"})
+                    return
+                ids = [i for i in (parse_qs(url.query).get("ids") or [""])[0].split(",") if i]
+                state.lookups.append(len(ids))
+                known = {post["id"]: post for post in state.posts if post["network"] == "twitter"}
+                metrics_keys = ("retweet_count", "reply_count", "like_count", "quote_count", "bookmark_count", "impression_count")
+                data = [{"id": i, "text": known[i]["text"], "edit_history_tweet_ids": [i], "public_metrics": {**dict.fromkeys(metrics_keys, 0), **state.metrics.get(i, {})}}
+                        for i in ids if i in known]
+                self._send_json(200, {"data": data} if data else {"errors": [{"detail": "not found"}]})
+            elif url.path == "/2/users/me":
+                self._send_json(200, {"data": {"id": STUB_X_USER_ID, "name": "Stub", "username": "stub"}})
+            elif url.path == f"/2/users/{STUB_X_USER_ID}/tweets":
+                failure = state.take_failure(url.path)
+                if failure:
+                    self._send_json(failure, {"error": f"injected {failure}"})
+                    return
+                limit = int((parse_qs(url.query).get("max_results") or ["10"])[0])
+                tweets = [post for post in state.posts if post["network"] == "twitter"][::-1][:limit]
+                data = [{"id": post["id"], "text": post["text"], "edit_history_tweet_ids": [post["id"]],
+                         **({"referenced_tweets": [{"type": "replied_to", "id": post["reply_to"]}]} if post["reply_to"] else {})}
+                        for post in tweets]
+                self._send_json(200, {"data": data, "meta": {"result_count": len(data)}} if data else {"meta": {"result_count": 0}})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            content_type, body = self._read_body()
+            if state.latency:
+                time.sleep(state.latency)
+            failure = state.take_failure(url.path)
+            if failure:
+                self._send_json(failure, {"error": f"injected {failure}"})
+                return
+            self.lose_response = state.take_lost(url.path)
+            payload = json.loads(body) if body and "json" in content_type else {}
+            form = {k: v[-1] for k, v in parse_qs(body.decode(errors="replace")).items()} if "urlencoded" in content_type else {}
+            form.update({k: v[-1] for k, v in parse_qs(url.query).items()})
+
+            # --- X: API v2 tweets + v1.1 chunked media upload ---
+            if url.path == "/2/tweets":
+                tweet_id = state.next_id()
+                state.record("post", {"network": "twitter", "id": tweet_id, "text": payload.get("text"),
+                                      "reply_to": (payload.get("reply") or {}).get("in_reply_to_tweet_id"),
+                                      "media": (payload.get("media") or {}).get("media_ids", [])})
+                self._send_json(201, {"data": {"id": tweet_id, "text": payload.get("text")}})
+            elif url.path == "/1.1/media/upload.json":
+                command = form.get("command", "APPEND" if "multipart" in content_type else "")
+                if command == "INIT":
+                    media_id = state.next_id()
+                    state.record("media", {"network": "twitter", "id": media_id})
+                    self._send_json(202, {"media_id": int(media_id), "media_id_string": media_id})
+                elif command == "APPEND":
+                    self._send_json(204, None)
+                else: # FINALIZE
+                    media_id = form.get("media_id", "0")
+                    self._send_json(201, {"media_id": int(media_id), "media_id_string": media_id, "size": 0})
+            # --- Mastodon ---
+            elif url.path == "/api/v1/statuses":
+                def create_status() -> dict:
+                    status_id = state.next_id()
+                    state.record("post", {"network": "mastodon", "id": status_id, "text": payload.get("status"),
+                                          "reply_to": payload.get("in_reply_to_id"), "media": payload.get("media_ids", [])})
+                    return {"id": status_id, "url": f"http://{host}:{self.server.server_port}/@stub/{status_id}"}
+                self._send_json(200, state.idempotent(self.headers.get("Idempotency-Key"), create_status))
+            elif url.path == "/api/v2/media":
+                media_id = state.next_id()
+                state.record("media", {"network": "mastodon", "id": media_id})
+                self._send_json(200, {"id": media_id, "type": "image"})
+            # --- Bluesky (XRPC) ---
+            elif url.path == "/xrpc/com.atproto.server.createSession":
+                self._send_json(200, {"accessJwt": "stub-jwt", "refreshJwt": "stub-refresh", "did": "did:plc:stub", "handle": payload.get("identifier")})
+            elif url.path == "/xrpc/com.atproto.repo.uploadBlob":
+                blob_id = state.next_id()
+                state.record("media", {"network": "bluesky", "id": blob_id})
+                self._send_json(200, {"blob": {"$type": "blob", "ref": {"$link": f"bafystub{blob_id}"}, "mimeType": content_type, "size": len(body)}})
+            elif url.path == "/xrpc/com.atproto.repo.createRecord":
+                record = payload.get("record") or {}
+                rkey = state.next_id()
+                uri = f"at://{payload.get('repo')}/app.bsky.feed.post/{rkey}"
+                state.record("post", {"network": "bluesky", "id": uri, "text": record.get("text"),
+                                      "reply_to": ((record.get("reply") or {}).get("parent") or {}).get("uri"),
+                                      "media": [image["image"]["ref"]["$link"] for image in (record.get("embed") or {}).get("images", [])]})
+                self._send_json(200, {"uri": uri, "cid": f"bafycid{rkey}"})
+            else:
+                self._send_json(404, {"error": f"unknown endpoint {url.path}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="posting-stub", daemon=True).start()
+    print(f"[Stub Server] X / Mastodon / Bluesky stand-in on http://{host}:{server.server_port} (GET /_posts lists received posts)")
+    return server, state
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in server for the posting adapters.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_STUB_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay added to every request.")
+    args = parser.parse_args()
+    server, _ = start_stub_server(args.host, args.port, StubState(latency=args.latency))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
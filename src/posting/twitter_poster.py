@@ -1,56 +1,195 @@
-import sys
+import re
+import html
+import time
 import tweepy
 import logging # Use logging for better messages
 
+from ..config_loader import TargetConfig
+from .base import PostingTarget, PostingError, RedirectAdapter
+from .twitter_text import weighted_length
+
 logger = logging.getLogger(__name__)
 
-# Updated function to return tweet ID and accept reply ID
-def post_tweet(
-    text: str,
+# Authenticated clients reused across calls, keyed by the credential tuple
+_client_cache: dict[tuple[str, str, str, str], tweepy.Client] = {}
+# v1.1 API objects (media upload only exists there), same keying
+_api_cache: dict[tuple[str, str, str, str], tweepy.API] = {}
+RECENT_LOOKUP_SIZE = 10 # Latest own tweets searched for one whose create_tweet response was lost
+_URL_PATTERN = re.compile(r"https?://\S+")
+
+def get_client(
     api_key: str,
     api_secret: str,
     access_token: str,
     access_token_secret: str,
-    in_reply_to_tweet_id: str | None = None, # New optional parameter
-) -> str | None: # Return tweet ID (str) or None on failure
-    """Posts a tweet (or reply) to X (Twitter) using API v2."""
-    if not text:
-        logger.error("[Twitter Poster] No text provided to post.")
-        return None
+) -> tweepy.Client:
+    """Returns a cached tweepy Client for the given credentials (created on first use)."""
+    cache_key = (api_key, api_secret, access_token, access_token_secret)
+    client = _client_cache.get(cache_key)
+    if client is None:
+        client = _new_client(*cache_key)
+        _client_cache[cache_key] = client
+    return client
 
-    if not all([api_key, api_secret, access_token, access_token_secret]):
-        logger.error("[Twitter Poster] Missing Twitter API credentials.")
-        return None
+def _new_client(api_key: str, api_secret: str, access_token: str, access_token_secret: str) -> tweepy.Client:
+    return tweepy.Client(
+        consumer_key=api_key,
+        consumer_secret=api_secret,
+        access_token=access_token,
+        access_token_secret=access_token_secret,
+    )
 
+def get_api(
+    api_key: str,
+    api_secret: str,
+    access_token: str,
+    access_token_secret: str,
+) -> tweepy.API:
+    """Returns a cached v1.1 API object for the given credentials (used for media upload)."""
+    cache_key = (api_key, api_secret, access_token, access_token_secret)
+    api = _api_cache.get(cache_key)
+    if api is None:
+        api = _new_api(*cache_key)
+        _api_cache[cache_key] = api
+    return api
+
+def _new_api(api_key: str, api_secret: str, access_token: str, access_token_secret: str) -> tweepy.API:
+    return tweepy.API(tweepy.OAuth1UserHandler(api_key, api_secret, access_token, access_token_secret))
+
+def upload_media(paths: list[str], api: tweepy.API) -> list[str]:
+    """Uploads images through the chunked (INIT/APPEND/FINALIZE) media endpoint. Returns media IDs of the successful uploads."""
+    media_ids: list[str] = []
+    for path in paths[:4]: # X allows at most 4 images per tweet
+        started = time.perf_counter()
+        try:
+            media = api.chunked_upload(path, media_category="tweet_image")
+            media_ids.append(media.media_id_string)
+            logger.info(f"[Twitter Poster] Media upload took {time.perf_counter() - started:.2f}s ({path} -> {media.media_id_string})")
+        except tweepy.errors.TweepyException as e:
+            logger.error(f"[Twitter Poster] Error uploading media {path}: {e}")
+        except Exception as e:
+            logger.error(f"[Twitter Poster] An unexpected error occurred uploading media {path}: {e}")
+    return media_ids
+
+def _create_tweet(client: tweepy.Client, text: str, in_reply_to_tweet_id: str | None = None, media_ids: list[str] | None = None) -> str:
+    """Single hot path for every tweet/reply we publish. Returns the new tweet ID, raises on failure."""
     # Prepare tweet parameters - Base parameters always include text
     tweet_params = {"text": text}
-    log_action = "tweet"
     # If it's a reply, add the in_reply_to_tweet_id parameter directly
     if in_reply_to_tweet_id:
         tweet_params["in_reply_to_tweet_id"] = in_reply_to_tweet_id
-        log_action = f"reply to {in_reply_to_tweet_id}"
-
-    logger.info(f"[Twitter Poster] Attempting to post {log_action}: {text[:100]}...")
-    try:
-        client = tweepy.Client(
-            consumer_key=api_key,
-            consumer_secret=api_secret,
-            access_token=access_token,
-            access_token_secret=access_token_secret,
+    if media_ids:
+        tweet_params["media_ids"] = media_ids
+
+    started = time.perf_counter()
+    # Use **tweet_params to pass parameters dynamically
+    response = client.create_tweet(**tweet_params)
+    tweet_id = response.data["id"]
+    logger.info(f"[Twitter Poster] create_tweet took {time.perf_counter() - started:.2f}s (ID: {tweet_id})")
+    return tweet_id
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits, 5xx and transport errors are worth retrying; other 4xx (duplicate, forbidden...) are not."""
+    if isinstance(error, (tweepy.errors.TooManyRequests, tweepy.errors.TwitterServerError)):
+        return True
+    return not isinstance(error, tweepy.errors.HTTPException)
+
+def _may_have_posted(error: Exception) -> bool:
+    """
+    True if a failed create_tweet may still have created the tweet: a 5xx or transport error can hide
+    an accepted request, and a 403 for duplicate content means an earlier attempt got through.
+    """
+    if isinstance(error, tweepy.errors.Forbidden):
+        return "duplicate" in str(error).lower()
+    return isinstance(error, tweepy.errors.TwitterServerError) or not isinstance(error, tweepy.errors.HTTPException)
+
+def _same_text(sent: str, shown: str) -> bool:
+    """X shows links as t.co (plus one per attached image) and HTML-escapes &<>; compares the rest."""
+    normalize = lambda text: " ".join(_URL_PATTERN.sub(" ", html.unescape(text or "")).split())
+    return normalize(sent) == normalize(shown)
+
+class TwitterTarget(PostingTarget):
+    """
+    X (Twitter) adapter over the cached tweepy clients above. `base_url` redirects it to a stand-in
+    server through clients of its own, so the redirect never reaches the shared cached ones.
+    """
+    name = "Twitter"
+    max_length = 280
+    max_media = 4
+    metrics_batch_size = 100 # GET /2/tweets accepts up to 100 IDs
+
+    def __init__(self, target_conf: TargetConfig):
+        super().__init__(target_conf)
+        self.credentials = (
+            self.secret('api_key_env_var'),
+            self.secret('api_secret_env_var'),
+            self.secret('access_token_env_var'),
+            self.secret('access_token_secret_env_var'),
         )
-        # Use **tweet_params to pass parameters dynamically
-        response = client.create_tweet(**tweet_params)
-        tweet_id = response.data["id"]
-        logger.info(f"[Twitter Poster] {log_action.capitalize()} posted successfully! ID: {tweet_id}")
-        return tweet_id # Return the ID of the newly created tweet
-
-    except tweepy.errors.TweepyException as e:
-        logger.error(f"[Twitter Poster] Error posting {log_action} to X: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"[Twitter Poster] An unexpected error occurred posting {log_action}: {e}")
+        self.base_url = self.conf.get('base_url')
+        self._user_id = None # Authenticated account, looked up on first need
+        self._redirected_client = None
+        self._redirected_api = None
+        if self.base_url and self.is_configured():
+            self._redirected_client = _new_client(*self.credentials)
+            self._redirected_client.session.mount("https://api.twitter.com/", RedirectAdapter("https://api.twitter.com/", self.base_url))
+            self._redirected_api = _new_api(*self.credentials)
+            self._redirected_api.session.mount("https://upload.twitter.com/", RedirectAdapter("https://upload.twitter.com/", self.base_url))
+
+    def is_configured(self) -> bool:
+        return all(self.credentials)
+
+    def length(self, text: str) -> int:
+        return weighted_length(text) # URLs count 23, CJK/emoji 2
+
+    def _client(self) -> tweepy.Client:
+        return self._redirected_client or get_client(*self.credentials)
+
+    def post(self, text: str, reply_to: str | None = None, thread_root: str | None = None, media_ids: list[str] | None = None,
+             idempotency_key: str | None = None) -> str:
+        try:
+            return _create_tweet(self._client(), text, reply_to, media_ids)
+        except tweepy.errors.TweepyException as e:
+            if not _may_have_posted(e):
+                raise PostingError(str(e), retryable=_is_retryable(e)) from e
+            # X takes no idempotency key: check the timeline before a retry (or the next run) posts it again
+            try:
+                existing = self.find_recent(text, reply_to)
+            except tweepy.errors.TweepyException as lookup_error:
+                raise PostingError(f"{e}; not retried, the timeline lookup failed too: {lookup_error}", retryable=False) from e
+            if existing:
+                logger.warning(f"[Twitter Poster] create_tweet failed ({e}), but the tweet was created (ID: {existing}).")
+                return existing
+            raise PostingError(str(e), retryable=_is_retryable(e)) from e
+
+    def find_recent(self, text: str, reply_to: str | None = None) -> str | None:
+        """ID of one of the account's latest tweets with this text and parent, if any. Raises TweepyException."""
+        client = self._client()
+        if self._user_id is None:
+            self._user_id = str(client.get_me(user_auth=True).data.id)
+        response = client.get_users_tweets(self._user_id, max_results=RECENT_LOOKUP_SIZE, tweet_fields=["referenced_tweets"], user_auth=True)
+        for tweet in response.data or []:
+            parent = next((str(ref.id) for ref in tweet.referenced_tweets or [] if ref.type == "replied_to"), None)
+            if parent == (str(reply_to) if reply_to else None) and _same_text(text, tweet.text):
+                return str(tweet.id)
         return None
 
+    def fetch_metrics(self, post_ids: list[str]) -> dict[str, dict]:
+        started = time.perf_counter()
+        try:
+            response = self._client().get_tweets(ids=post_ids, tweet_fields=["public_metrics"], user_auth=True)
+        except tweepy.errors.TweepyException as e:
+            raise PostingError(str(e), retryable=_is_retryable(e)) from e
+        metrics = {str(tweet.id): dict(tweet.public_metrics or {}) for tweet in response.data or []}
+        logger.info(f"[Twitter Poster] get_tweets took {time.perf_counter() - started:.2f}s ({len(metrics)}/{len(post_ids)} found)")
+        return metrics
+
+    def upload_media(self, paths: list[str]) -> list[str]:
+        return upload_media(paths[:self.max_media], self._redirected_api or get_api(*self.credentials))
+
+def build_target(target_conf: TargetConfig) -> TwitterTarget:
+    return TwitterTarget(target_conf)
+
 if __name__ == '__main__':
     print("Testing Twitter Poster module...")
     print("Please run the main script for full execution with config loading.")
@@ -0,0 +1,141 @@
+"""
+X's weighted length rules (as in twitter-text v3) and a sentence-aware thread splitter, so posts are
+checked locally instead of being rejected by the API.
+
+Rules: text is NFC-normalized; each URL counts as 23; each emoji (including ZWJ sequences, flags and
+skin-tone variants) counts as 2; other code points count 1 inside the light ranges (U+0000-10FF and
+some general punctuation) and 2 elsewhere: CJK, most symbols, and also Vietnamese letters with two
+diacritics such as "ạ" or "ễ" (Latin Extended Additional), which is why Vietnamese posts run long.
+"""
+
+import re
+import unicodedata
+from typing import Callable
+
+MAX_WEIGHTED_LENGTH = 280
+URL_LENGTH = 23
+EMOJI_LENGTH = 2
+
+# Code points outside the ranges X weighs as 1
+_HEAVY = re.compile('[^\u0000-\u10FF\u2000-\u200D\u2010-\u201F\u2032-\u2037]')
+
+# Links with a scheme, www. or a common TLD; trailing punctuation is not part of the link
+_URL = re.compile(r"(?i:https?://\S*[^\s.,;:!?)\]'\"…]|www\.\S*[^\s.,;:!?)\]'\"…]|\b(?:[a-z0-9-]+\.)+(?:com|org|net|io|dev|app|co|me|ai|vn|ly|gg)\b(?:/\S*[^\s.,;:!?)\]'\"…])?)")
+_EMOJI_BASE = '[\u231A-\u23FF\u25AA-\u27BF\u2934\u2935\u2B05-\u2B55\u3030\u303D\u3297\u3299\U0001F000-\U0001FAFF]'
+_EMOJI_MODIFIERS = '[\uFE0F\U0001F3FB-\U0001F3FF\U000E0020-\U000E007F]*'
+_EMOJI = re.compile(f'[\U0001F1E6-\U0001F1FF]{{2}}|{_EMOJI_BASE}{_EMOJI_MODIFIERS}(?:\u200D{_EMOJI_BASE}{_EMOJI_MODIFIERS})*')
+# Cheap scans that locate the (rare) spots where the patterns above can match, so they are not
+# attempted at every position: emoji start with a base character, URLs contain a dot inside a word
+_EMOJI_HINT = re.compile(_EMOJI_BASE)
+_URL_HINT = re.compile(r'\.(?=[^\s.])')
+_SPACE = re.compile(r'\s')
+
+# Sentence ends (kept with the sentence) and line breaks are where long text is split first
+_SENTENCES = re.compile(r'(?<=[.!?…])\s+|\n+')
+_WORDS = re.compile(r'\s+')
+
+def _plain_length(text: str) -> int:
+    return len(text) + len(_HEAVY.findall(text))
+
+def weighted_length(text: str) -> int:
+    """Length of text as X counts it against the 280 limit."""
+    if text.isascii():
+        length = len(text)
+    else:
+        if not unicodedata.is_normalized('NFC', text):
+            text = unicodedata.normalize('NFC', text)
+        length = _plain_length(text)
+        position = 0
+        while hint := _EMOJI_HINT.search(text, position):
+            match = _EMOJI.match(text, hint.start())
+            length += EMOJI_LENGTH - _plain_length(match.group())
+            position = match.end()
+    position = 0
+    while hint := _URL_HINT.search(text, position):
+        start = max(text.rfind(space, 0, hint.start()) for space in ' \n\t') + 1
+        space = _SPACE.search(text, hint.end())
+        position = space.start() if space else len(text)
+        for match in _URL.finditer(text, start, position):
+            length += URL_LENGTH - _plain_length(match.group())
+    return length
+
+def is_valid_length(text: str, max_length: int = MAX_WEIGHTED_LENGTH) -> bool:
+    return 0 < weighted_length(text) <= max_length
+
+def _pieces(text: str, pattern: re.Pattern) -> list[tuple[str, str]]:
+    """(separator before, piece) pairs of text split at pattern."""
+    pieces = []
+    separator = ''
+    position = 0
+    for match in pattern.finditer(text):
+        pieces.append((separator, text[position:match.start()]))
+        separator = match.group()
+        position = match.end()
+    pieces.append((separator, text[position:]))
+    return [(sep, piece) for sep, piece in pieces if piece]
+
+def _hard_cut(text: str, budget: int, length: Callable[[str], int]) -> list[str]:
+    """Splits one unbreakable word (no spaces) into chunks within budget."""
+    chunks = []
+    while length(text) > budget:
+        end = min(len(text), budget)
+        while end > 1 and length(text[:end]) > budget:
+            end -= 1
+        chunks.append(text[:end])
+        text = text[end:]
+    return chunks + ([text] if text else [])
+
+def _pack(text: str, budget: int, length: Callable[[str], int]) -> list[str]:
+    """Greedily packs whole sentences (then words, then characters) into chunks within budget."""
+    chunks: list[str] = []
+    current = ''
+    current_length = 0
+
+    def add(separator: str, piece: str, piece_length: int):
+        nonlocal current, current_length
+        joined_length = current_length + length(separator) + piece_length if current else piece_length
+        if current and joined_length <= budget:
+            current += separator + piece
+            current_length = joined_length
+        else:
+            if current:
+                chunks.append(current)
+            current, current_length = piece, piece_length
+
+    # Pieces are separated by whitespace, which no URL/emoji spans, so their lengths add up
+    for separator, sentence in _pieces(text, _SENTENCES):
+        sentence_length = length(sentence)
+        if sentence_length <= budget:
+            add(separator, sentence, sentence_length)
+            continue
+        for word_separator, word in _pieces(sentence, _WORDS):
+            word_length = length(word)
+            word_separator = word_separator or separator
+            if word_length <= budget:
+                add(word_separator, word, word_length)
+                continue
+            for chunk in _hard_cut(word, budget, length):
+                add(word_separator, chunk, length(chunk))
+                word_separator = ''
+    if current:
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+def split_thread(text: str, max_length: int = MAX_WEIGHTED_LENGTH, length: Callable[[str], int] = weighted_length) -> list[str]:
+    """
+    Text as posts within max_length: unchanged if it fits, otherwise split at sentence boundaries
+    (words only for an overlong sentence) into a thread numbered " 1/3", " 2/3", ...
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if length(text) <= max_length:
+        return [text]
+    reserve = len(" 9/9")
+    while True:
+        chunks = _pack(text, max_length - reserve, length)
+        suffix_length = len(f" {len(chunks)}/{len(chunks)}")
+        if suffix_length <= reserve:
+            break
+        reserve = suffix_length # 10+ parts: re-pack with room for the longer numbering
+    return [f"{chunk} {index}/{len(chunks)}" for index, chunk in enumerate(chunks, start=1)]
@@ -0,0 +1,131 @@
+"""Optional per-stage profiling (cProfile + tracemalloc), switched on with `python main.py --profile`."""
+
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+DEFAULT_ARTIFACTS_DIR = 'artifacts/profile'
+TOP_ALLOCATIONS = 25
+
+# Returned by stage() while profiling is off: no allocation, no timing, nothing recorded
+_NULL_STAGE = nullcontext()
+
+class StageProfiler:
+    """
+    Writes, for every stage, `NN_<stage>.pstats` (load with pstats / snakeviz) and `NN_<stage>.alloc.txt`
+    (top allocation growth during the stage plus its peak traced memory), and appends a line to `summary.txt`.
+    cProfile cannot nest, so a stage opened inside another one only records time and memory.
+
+    Stages may run on worker threads (posting fan-out, backfill, batch): cProfile profiles the thread
+    that opened the stage, but tracemalloc is process-wide, so a stage that overlapped stages of other
+    threads has their allocations in its memory figures and is marked "(overlapped)".
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.output_dir = None
+        self._count = 0
+        self._open: dict[int, dict] = {} # stage number -> {"thread", "overlapped"} of the stages running now
+        self._lock = threading.Lock()
+        self._local = threading.local() # per-thread nesting depth
+
+    def enable(self, output_dir: str | None = None) -> str:
+        self.output_dir = output_dir or os.path.join(DEFAULT_ARTIFACTS_DIR, datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start() # One frame per trace: enough for per-line attribution and keeps snapshots cheap
+        self.enabled = True
+        print(f"[Profiler] Profiling enabled. Writing per-stage artifacts to {self.output_dir}")
+        return self.output_dir
+
+    @contextmanager
+    def _profile(self, name: str):
+        thread = threading.get_ident()
+        with self._lock:
+            self._count += 1
+            number = self._count
+            state = {"thread": thread, "overlapped": False}
+            for other in self._open.values():
+                if other["thread"] != thread:
+                    other["overlapped"] = state["overlapped"] = True
+            if not self._open:
+                tracemalloc.reset_peak() # Only when no other stage is running; it would reset theirs too
+            self._open[number] = state
+        prefix = os.path.join(self.output_dir, f"{number:02d}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}")
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        profile = cProfile.Profile() if depth == 0 else None
+        before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        if profile:
+            try:
+                profile.enable()
+            except ValueError:
+                profile = None # Python 3.12+: one active profiler per process, another thread's stage has it
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            self._local.depth = depth
+            with self._lock:
+                overlapped = self._open.pop(number)["overlapped"]
+            self._write(name, prefix, profile, before, after, elapsed, peak, overlapped)
+
+    def _write(self, name, prefix, profile, before, after, elapsed, peak, overlapped=False):
+        try:
+            if profile:
+                profile.dump_stats(prefix + ".pstats")
+            # Drop the profiler's own bookkeeping from the result rows (filtering the traces themselves is far slower)
+            stats = [
+                stat for stat in after.compare_to(before, 'lineno')
+                if stat.traceback[0].filename not in (tracemalloc.__file__, __file__)
+            ]
+            with open(prefix + ".alloc.txt", 'w', encoding='utf-8') as f:
+                f.write(f"Stage: {name}\nWall time: {elapsed:.3f}s\nPeak traced memory: {peak / 1024:.1f} KiB\n")
+                if overlapped:
+                    f.write("Overlapped stages of other threads: memory figures include their allocations.\n")
+                f.write(f"\nTop {TOP_ALLOCATIONS} allocation changes (by line):\n")
+                for stat in stats[:TOP_ALLOCATIONS]:
+                    f.write(f"{stat}\n")
+            notes = ('' if profile else '  (nested, no pstats)') + ('  (overlapped)' if overlapped else '')
+            with self._lock, open(os.path.join(self.output_dir, "summary.txt"), 'a', encoding='utf-8') as f:
+                f.write(f"{os.path.basename(prefix):40s} {elapsed:9.3f}s  peak {peak / 1024 / 1024:8.2f} MiB{notes}\n")
+            print(f"[Profiler] {name}: {elapsed:.3f}s, peak {peak / 1024 / 1024:.2f} MiB")
+        except Exception as e:
+            print(f"[Profiler] Warning: Could not write artifacts for stage '{name}': {e}", file=sys.stderr)
+
+    def stage(self, name: str):
+        """Context manager wrapping one pipeline stage. A shared no-op when profiling is off."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._profile(name)
+
+# Process-wide profiler used by main.py and the daemon
+profiler = StageProfiler()
+
+def stage(name: str):
+    return profiler.stage(name)
+
+def top_functions(pstats_path: str, limit: int = 20) -> str:
+    """Cumulative-time report of a stage's .pstats file, e.g. to check whether time is in PyGithub, garminconnect or grpc."""
+    import io
+    out = io.StringIO()
+    pstats.Stats(pstats_path, stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        print(top_functions(sys.argv[1]))
+    else:
+        print("Usage: python -m src.profiling <stage.pstats>")
@@ -0,0 +1,61 @@
+"""Thread-safe token-bucket rate limiter shared by concurrent workers."""
+
+import time
+import inspect
+import threading
+
+class RateLimiter:
+    """
+    Allows `rate` acquisitions per `per` seconds on average, with bursts of up to `burst`
+    (default: `rate`). acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, per: float = 60.0, burst: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.per = per
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._refill_per_second = rate / per
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._refill_per_second)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Blocks until `tokens` are available and takes them. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self._refill_per_second
+            time.sleep(wait)
+            waited += wait
+
+class RateLimitedClient:
+    """
+    Proxy that takes a token from `limiter` before every method call on `client`, for API clients
+    where one method call is one request (garminconnect). Other attributes, including nested classes
+    and enums such as `client.ActivityDownloadFormat`, pass through unchanged.
+    """
+
+    def __init__(self, client, limiter: RateLimiter):
+        self._client = client
+        self._limiter = limiter
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not (inspect.ismethod(attr) or inspect.isfunction(attr) or inspect.isbuiltin(attr)):
+            return attr
+
+        def call(*args, **kwargs):
+            self._limiter.acquire()
+            return attr(*args, **kwargs)
+        return call
@@ -0,0 +1 @@
+# This file makes 'storage' a Python sub-package
@@ -0,0 +1,159 @@
+"""
+Engagement of published posts: every primary post ID is recorded with its source, prompt template
+and posting hour in a local SQLite file; public metrics are refreshed in batched lookups and
+aggregated per source / prompt / hour for draft selection.
+"""
+
+import os
+import sys
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+from .outbox import Outbox
+
+DEFAULT_ENGAGEMENT_PATH = 'data/engagement.sqlite3'
+DEFAULT_REFRESH_INTERVAL = 3600 # seconds between metric refreshes (daemon)
+DEFAULT_MAX_AGE_DAYS = 7 # Posts older than this have settled; their metrics are no longer refreshed
+
+# Public metrics kept per post, and their weight in the engagement score
+METRIC_WEIGHTS = {
+    "like_count": 1.0,
+    "retweet_count": 2.0,
+    "reply_count": 2.0,
+    "quote_count": 2.0,
+    "bookmark_count": 1.0,
+}
+METRICS = (*METRIC_WEIGHTS, "impression_count")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS posts (
+    target TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    draft_key TEXT,
+    source TEXT,
+    prompt_key TEXT,
+    prompt_id TEXT,
+    posted_at TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    metrics_at TEXT,
+    {", ".join(f"{name} INTEGER" for name in METRICS)},
+    PRIMARY KEY (target, post_id)
+);
+CREATE INDEX IF NOT EXISTS posts_by_age ON posts (target, posted_at);
+"""
+_SCORE = " + ".join(f"{weight:g} * COALESCE({name}, 0)" for name, weight in METRIC_WEIGHTS.items())
+_GROUPS = {"source": "source", "prompt": "prompt_key || '@' || COALESCE(prompt_id, '')", "hour": "hour"}
+
+def prompt_id(template: str | None) -> str:
+    """Short, stable ID of a prompt template's text, so edits to a prompt are aggregated separately."""
+    return hashlib.sha1((template or "").encode('utf-8')).hexdigest()[:10]
+
+class EngagementStore:
+    """Thread-safe (posting workers record concurrently); one connection guarded by a lock."""
+
+    def __init__(self, path: str = DEFAULT_ENGAGEMENT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def record_post(self, target: str, post_id: str, draft_key: str, source: str, prompt_key: str | None = None,
+                    prompt_id: str | None = None, posted_at: datetime | None = None):
+        posted_at = posted_at or datetime.now(timezone.utc)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO posts (target, post_id, draft_key, source, prompt_key, prompt_id, posted_at, hour) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (target, post_id, draft_key, source, prompt_key, prompt_id, posted_at.isoformat(), posted_at.hour),
+            )
+
+    def posts_to_refresh(self, target: str, max_age_days: float = DEFAULT_MAX_AGE_DAYS) -> list[str]:
+        """IDs on `target` posted within the last max_age_days (their metrics are still moving)."""
+        since = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).isoformat()
+        with self._lock:
+            rows = self._db.execute("SELECT post_id FROM posts WHERE target = ? AND posted_at >= ? ORDER BY posted_at", (target, since)).fetchall()
+        return [row[0] for row in rows]
+
+    def update_metrics(self, target: str, metrics_by_id: dict[str, dict]):
+        """Stores the latest public metrics ({post_id: {"like_count": ..., ...}}) in one transaction."""
+        now = datetime.now(timezone.utc).isoformat()
+        columns = ", ".join(f"{name} = ?" for name in METRICS)
+        with self._lock, self._db:
+            self._db.executemany(
+                f"UPDATE posts SET metrics_at = ?, {columns} WHERE target = ? AND post_id = ?",
+                [(now, *(metrics.get(name) for name in METRICS), target, post_id) for post_id, metrics in metrics_by_id.items()],
+            )
+
+    def aggregates(self) -> dict[str, dict]:
+        """
+        {"source" | "prompt" | "hour": {key: {"posts", "score", "impressions"}}} over posts that have
+        metrics; "score" is the mean weighted engagement (METRIC_WEIGHTS) per post, "prompt" keys are
+        "<prompt key>@<prompt_id>".
+        """
+        result = {}
+        with self._lock:
+            for group, expression in _GROUPS.items():
+                rows = self._db.execute(
+                    f"SELECT {expression}, COUNT(*), AVG({_SCORE}), AVG(impression_count) "
+                    f"FROM posts WHERE metrics_at IS NOT NULL GROUP BY 1"
+                ).fetchall()
+                result[group] = {key: {"posts": count, "score": score, "impressions": impressions} for key, count, score, impressions in rows}
+        return result
+
+def collect_metrics(store: EngagementStore, targets: dict, max_age_days: float = DEFAULT_MAX_AGE_DAYS) -> int:
+    """
+    Refreshes the metrics of recent posts on every target that supports lookups, in batches of
+    target.metrics_batch_size IDs per request. Returns the number of posts updated.
+    """
+    updated = 0
+    for target in targets.values():
+        if not target.metrics_batch_size:
+            continue
+        post_ids = store.posts_to_refresh(target.key, max_age_days)
+        target_updated = 0
+        requests = 0
+        for start in range(0, len(post_ids), target.metrics_batch_size):
+            batch = post_ids[start:start + target.metrics_batch_size]
+            requests += 1
+            try:
+                metrics = target.fetch_metrics(batch)
+            except Exception as e:
+                print(f"[Engagement] Error fetching metrics for {len(batch)} post(s) on {target.key}: {e}", file=sys.stderr)
+                break
+            store.update_metrics(target.key, metrics)
+            target_updated += len(metrics)
+        if post_ids:
+            print(f"[Engagement] Refreshed metrics of {target_updated}/{len(post_ids)} recent post(s) on {target.key} in {requests} request(s).")
+        updated += target_updated
+    return updated
+
+def rank_drafts(entries: list[dict], aggregates: dict[str, dict]) -> list[dict]:
+    """
+    Orders outbox drafts by the mean engagement of their prompt (falling back to their source); drafts
+    without history get the overall mean so new sources/prompts still go out. Stable for ties.
+    Drafts already posted on some target stay first, in outbox order: re-ranking them as metrics come
+    in would let a later run pick other drafts (more primary posts than planned, or an unfinished thread).
+    """
+    started = [entry for entry in entries if Outbox.is_started(entry)]
+    entries = [entry for entry in entries if not Outbox.is_started(entry)]
+    by_prompt = aggregates.get("prompt", {})
+    by_source = aggregates.get("source", {})
+    scores = [group["score"] for group in by_source.values() if group["score"] is not None]
+    if not scores:
+        return started + entries
+    neutral = sum(scores) / len(scores)
+
+    def score(entry: dict) -> float:
+        source = (entry.get('first_activity') or {}).get('source') or entry.get('source')
+        group = by_prompt.get(f"{entry.get('source')}@{entry.get('prompt_id') or ''}") or by_source.get(source)
+        return group["score"] if group and group["score"] is not None else neutral
+    return started + sorted(entries, key=score, reverse=True)
@@ -0,0 +1,195 @@
+"""Durable outbox for generated posts: an append-only JSONL event log, fsync'd on every write."""
+
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Callable
+
+from ..activity import activity_ref, json_default
+
+# Status transitions of an entry on a posting target: drafted -> posted -> replied
+STATUS_DRAFTED = "drafted"
+STATUS_POSTED = "posted"
+STATUS_REPLIED = "replied"
+
+DEFAULT_OUTBOX_PATH = 'data/outbox.jsonl'
+
+def draft_key(run_date: str, prompt_key: str, index: int) -> str:
+    """Idempotency key of a generated post: one per (run day, prompt key, position)."""
+    return f"{run_date}:{prompt_key}:{index}"
+
+def source_run_key(run_date: str, source_key: str) -> str:
+    """Marker key recording which activities of a source were already drafted for a run day."""
+    return f"{run_date}:{source_key}"
+
+class Outbox:
+    """
+    Replays the event log into the current state of every entry on open; every change is
+    appended as one JSON line and fsync'd before the call returns, so a crash never loses
+    a recorded transition (at worst the last, partially written line is ignored).
+    """
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH):
+        self.path = path
+        self._entries: dict[str, dict] = {} # draft key -> state, in insertion order
+        self._source_runs: dict[str, dict] = {} # source run key -> {"drafts", "activity_ids" (None = all, legacy marker)}
+        self._lock = threading.Lock() # Posting workers of several targets record links concurrently
+        self._load()
+
+    # --- Loading ---
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        needs_newline = False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                needs_newline = not line.endswith('\n')
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[Outbox] Warning: Ignoring unreadable line {line_no} in {self.path} (interrupted write?).", file=sys.stderr)
+                    continue
+                self._apply(event)
+        if needs_newline:
+            # Terminate a torn last line so the next event starts on its own line
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n')
+        print(f"[Outbox] Loaded {len(self._entries)} entries from {self.path}.")
+
+    def _apply(self, event: dict):
+        kind = event.get('event')
+        key = event.get('key')
+        if kind == 'source_generated':
+            run = self._source_runs.setdefault(key, {"drafts": 0, "activity_ids": set()})
+            run['drafts'] += event.get('drafts') or 0
+            if event.get('activity_ids') is None:
+                run['activity_ids'] = None # Written before IDs were recorded: treat the whole day as drafted
+            elif run['activity_ids'] is not None:
+                run['activity_ids'].update(event['activity_ids'])
+            return
+        if kind == STATUS_DRAFTED:
+            if key not in self._entries:
+                self._entries[key] = {
+                    "key": key,
+                    "run_date": event.get('run_date'),
+                    "source": event.get('source'),
+                    "tweet_text": event.get('tweet_text'),
+                    "first_activity": event.get('first_activity'),
+                    "media_paths": event.get('media_paths') or [],
+                    "prompt_id": event.get('prompt_id'), # Template the post was generated from (engagement stats)
+                    "follow_up": None, # None = not decided yet, "" = no follow-up
+                    "targets": {},
+                }
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        if kind == 'follow_up':
+            entry['follow_up'] = event.get('text') or ""
+        elif kind in (STATUS_POSTED, STATUS_REPLIED):
+            target_state = entry['targets'].setdefault(event['target'], {"status": STATUS_DRAFTED, "tweet_ids": []})
+            target_state['tweet_ids'].append(event['tweet_id'])
+            target_state['status'] = kind
+
+    # --- Writing ---
+    def _append(self, event: dict):
+        event = {"ts": datetime.now(timezone.utc).isoformat(), **event}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(event, ensure_ascii=False, default=json_default)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(json.loads(line))
+
+    def add_draft(self, key: str, run_date: str, source: str, tweet_text: str, first_activity: dict | None, media_paths: list[str] | None = None,
+                  prompt_id: str | None = None) -> bool:
+        """Records a generated post (with a reference to its first activity, not the full record). Returns False (and writes nothing) if the key already exists."""
+        if key in self._entries:
+            return False
+        self._append({
+            "event": STATUS_DRAFTED,
+            "key": key,
+            "run_date": run_date,
+            "source": source,
+            "tweet_text": tweet_text,
+            "first_activity": activity_ref(first_activity) if first_activity else None,
+            "media_paths": media_paths or [],
+            "prompt_id": prompt_id,
+        })
+        return True
+
+    def mark_source_generated(self, run_key: str, draft_count: int, activity_ids: list[str]):
+        """Records that drafts were generated from these activities (see activity.activity_key)."""
+        self._append({"event": "source_generated", "key": run_key, "drafts": draft_count, "activity_ids": activity_ids})
+
+    def set_follow_up(self, key: str, text: str | None):
+        """Stores the follow-up comment for an entry ("" / None records that there is none)."""
+        self._append({"event": "follow_up", "key": key, "text": text or ""})
+
+    def record_link(self, key: str, target: str, link_index: int, tweet_id: str):
+        """Records one published link of the entry's thread: index 0 -> posted, later -> replied."""
+        status = STATUS_POSTED if link_index == 0 else STATUS_REPLIED
+        self._append({"event": status, "key": key, "target": target, "tweet_id": tweet_id})
+
+    # --- Queries ---
+    def drafted_activity_ids(self, run_key: str) -> set[str] | None:
+        """Activities already drafted for the source run (empty if none; None if a legacy marker covers the whole day)."""
+        run = self._source_runs.get(run_key)
+        if run is None:
+            return set()
+        return None if run['activity_ids'] is None else set(run['activity_ids'])
+
+    def source_run_drafts(self, run_key: str) -> int:
+        """Drafts generated so far for the source run (the next generation's draft indices start here)."""
+        return (self._source_runs.get(run_key) or {}).get('drafts', 0)
+
+    def get(self, key: str) -> dict | None:
+        return self._entries.get(key)
+
+    def entries(self, run_date: str | None = None) -> list[dict]:
+        """Entries in the order they were drafted, optionally limited to one run day."""
+        return [e for e in self._entries.values() if run_date is None or e['run_date'] == run_date]
+
+    @staticmethod
+    def thread_parts(entry: dict, with_follow_up: bool = True, split: Callable[[str], list[str]] | None = None) -> list[str]:
+        """
+        The entry's thread: the post, then the follow-up. `split` (a target's PostingTarget.split)
+        expands texts over that target's length limit into several links; it is deterministic, so
+        the posted IDs recorded for a target keep lining up with its parts across runs.
+        """
+        texts = [entry['tweet_text']]
+        if with_follow_up and entry.get('follow_up'):
+            texts.append(entry['follow_up'])
+        if split is None:
+            return texts
+        return [part for text in texts for part in split(text)]
+
+    @staticmethod
+    def posted_ids(entry: dict, target: str) -> list[str]:
+        return entry['targets'].get(target, {}).get('tweet_ids', [])
+
+    @staticmethod
+    def is_started(entry: dict) -> bool:
+        """True once any part of the entry is posted on any target (its thread must be finished, not replaced)."""
+        return any(state.get('tweet_ids') for state in entry['targets'].values())
+
+    @classmethod
+    def is_done(cls, entry: dict, target: str, with_follow_up: bool = True, split: Callable[[str], list[str]] | None = None) -> bool:
+        """An entry is done on a target once its follow-up is decided and every thread part (for that target) is posted."""
+        if entry.get('follow_up') is None:
+            return False
+        return len(cls.posted_ids(entry, target)) >= len(cls.thread_parts(entry, with_follow_up, split))
+
+if __name__ == '__main__':
+    print("Testing Outbox module...")
+    box = Outbox()
+    for entry in box.entries():
+        print(f"  {entry['key']}: {entry['targets']}")
@@ -0,0 +1,49 @@
+"""Puts the repository root on sys.path so the tests import `src` however pytest is started."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.config_loader import AppConfig, compile_config
+from src.posting import base
+from src.posting.stub_server import start_stub_server
+
+@pytest.fixture
+def stub(monkeypatch):
+    """The local X / Mastodon / Bluesky stand-in on a free port, with dummy secrets for all three; (server, state)."""
+    for name in ("X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_TOKEN_SECRET", "MASTODON_ACCESS_TOKEN", "BLUESKY_HANDLE", "BLUESKY_APP_PASSWORD"):
+        monkeypatch.setenv(name, "stub")
+    monkeypatch.setattr(base.time, "sleep", lambda seconds: None) # No retry backoff / delay between thread links
+    server, state = start_stub_server(port=0)
+    yield server, state
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def stub_config(stub):
+    """Factory of configs posting to the stub on `targets`, without follow-ups, rate limits or sleeps."""
+    server, _ = stub
+    return lambda **kwargs: _stub_config(f"http://127.0.0.1:{server.server_port}", **kwargs)
+
+def _stub_config(url: str, targets=("twitter", "mastodon", "bluesky"), max_posts: int = 10, engagement_path: str | None = None) -> AppConfig:
+    credentials = {
+        "twitter": {"api_key_env_var": "X_API_KEY", "api_secret_env_var": "X_API_SECRET",
+                    "access_token_env_var": "X_ACCESS_TOKEN", "access_token_secret_env_var": "X_ACCESS_TOKEN_SECRET"},
+        "mastodon": {"access_token_env_var": "MASTODON_ACCESS_TOKEN"},
+        "bluesky": {"handle_env_var": "BLUESKY_HANDLE", "app_password_env_var": "BLUESKY_APP_PASSWORD"},
+    }
+    raw = {
+        "llm": {"model": "stub"},
+        "data_sources": {"github": {"enabled": False}},
+        "posting": {
+            "max_posts_per_run": max_posts,
+            "sleep_between_posts": 0,
+            "targets": {key: {"enabled": True, "enable_follow_up": False, "base_url": url, **credentials[key]} for key in targets},
+        },
+    }
+    if engagement_path:
+        raw["engagement"] = {"enabled": True, "store_path": engagement_path}
+    return compile_config(raw, path="<stub>")
@@ -0,0 +1,71 @@
+"""Minimal FIT encoder for the decoder tests: definition/data messages, headers and CRCs per the FIT protocol."""
+
+import struct
+
+_CRC_TABLE = (0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+              0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400)
+
+# base type byte -> struct format char
+_FORMATS = {0x02: 'B', 0x84: 'H', 0x86: 'I', 0x83: 'h', 0x85: 'i'}
+
+def fit_crc(data: bytes, crc: int = 0) -> int:
+    """The FIT SDK's CRC-16 (nibble table)."""
+    for byte in data:
+        for nibble in (byte & 0x0F, byte >> 4):
+            tmp = _CRC_TABLE[crc & 0x0F]
+            crc = ((crc >> 4) & 0x0FFF) ^ tmp ^ _CRC_TABLE[nibble]
+    return crc
+
+class FitWriter:
+    """Appends messages; `fields` of a definition are (field number, base type) pairs."""
+
+    def __init__(self):
+        self.body = bytearray()
+        self._definitions: dict[int, tuple[str, int]] = {} # local type -> (struct format, field count)
+
+    def define(self, local: int, global_num: int, fields, big_endian: bool = False):
+        order = '>' if big_endian else '<'
+        self.body += struct.pack('<BBB', 0x40 | local, 0, 1 if big_endian else 0)
+        self.body += struct.pack(order + 'HB', global_num, len(fields))
+        for field_num, base_type in fields:
+            self.body += bytes((field_num, struct.calcsize(_FORMATS[base_type]), base_type))
+        self._definitions[local] = (order + ''.join(_FORMATS[base_type] for _, base_type in fields), len(fields))
+
+    def data(self, local: int, *values):
+        fmt, _ = self._definitions[local]
+        self.body += bytes((local,)) + struct.pack(fmt, *values)
+
+    def compressed(self, local: int, timestamp: int, *values):
+        """Compressed-timestamp header: only the low 5 bits of the timestamp are stored."""
+        fmt, _ = self._definitions[local]
+        self.body += bytes((0x80 | (local << 5) | (timestamp & 0x1F),)) + struct.pack(fmt, *values)
+
+    def to_bytes(self, header_size: int = 14) -> bytes:
+        header = struct.pack('<BBHI4s', header_size, 0x20, 2134, len(self.body), b'.FIT')
+        if header_size == 14:
+            header += struct.pack('<H', fit_crc(header))
+        content = header + bytes(self.body)
+        return content + struct.pack('<H', fit_crc(content))
+
+SAMPLE_START = 1_100_000_000 # FIT seconds (2024-11-08)
+SAMPLE_RECORDS = 400 # One-second records at 4 m/s
+SAMPLE_COMPRESSED = 20 # Followed by these, with compressed timestamps
+SAMPLE_INVALID_HR = (50, 51) # Record indices whose HR is the 0xFF sentinel
+
+def sample_run() -> bytes:
+    """The run in tests/fixtures/sample_run.fit: file_id, a timestamped event, then record messages."""
+    fit = FitWriter()
+    fit.define(0, 0, [(0, 0x02), (4, 0x86)]) # file_id: type, time_created
+    fit.data(0, 4, SAMPLE_START)
+    fit.define(0, 21, [(253, 0x86), (0, 0x02)]) # event: timestamp, event (local type reused)
+    fit.data(0, SAMPLE_START, 0)
+    # record: timestamp, heart_rate, distance (cm), speed (mm/s), cadence, altitude ((m + 500) * 5)
+    fit.define(1, 20, [(253, 0x86), (3, 0x02), (5, 0x86), (6, 0x84), (4, 0x02), (2, 0x84)])
+    for i in range(SAMPLE_RECORDS):
+        heart_rate = 0xFF if i in SAMPLE_INVALID_HR else 120 + i // 10
+        fit.data(1, SAMPLE_START + 1 + i, heart_rate, (i + 1) * 400, 4000, 85, 3000)
+    # record without a timestamp field: heart_rate, distance, speed
+    fit.define(2, 20, [(3, 0x02), (5, 0x86), (6, 0x84)])
+    for i in range(SAMPLE_RECORDS, SAMPLE_RECORDS + SAMPLE_COMPRESSED):
+        fit.compressed(2, SAMPLE_START + 1 + i, 160, (i + 1) * 400, 4000)
+    return fit.to_bytes()
@@ -0,0 +1,90 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import github
+import pytest
+
+import main
+from src.backfill import run_backfill
+from src.config_loader import compile_config
+from src.data_sources import SourceError
+from src.ratelimit import RateLimiter
+
+DAY = date(2024, 1, 10) # Older than the events feed: the commit search API
+
+class FakeGithub:
+    """Search results for `commits`; `fail_after` raises a 500 once that many commits were returned."""
+    per_page = 30
+    commits: list = []
+    fail_after: int | None = None
+
+    def __init__(self, token=None):
+        self.queries = []
+
+    def search_commits(self, query, sort=None, order=None):
+        self.queries.append(query)
+        for index, commit in enumerate(self.commits):
+            if index == self.fail_after:
+                break
+            yield commit
+        if self.fail_after is not None:
+            raise github.GithubException(500, {"message": "Server Error"}, None)
+
+def _commit(sha: str, hour: int, day: date = DAY):
+    return SimpleNamespace(
+        sha=sha,
+        commit=SimpleNamespace(message=f"commit {sha}", author=SimpleNamespace(date=datetime(day.year, day.month, day.day, hour))),
+        repository=SimpleNamespace(name="repo", full_name="octocat/repo"),
+    )
+
+@pytest.fixture
+def fake_github(monkeypatch):
+    for name in ("GH_USER", "GH_PAT", "GEMINI_API_KEY"):
+        monkeypatch.setenv(name, "stub")
+    monkeypatch.setattr(github, "Github", FakeGithub)
+    monkeypatch.setattr(FakeGithub, "commits", [])
+    monkeypatch.setattr(FakeGithub, "fail_after", None)
+    return FakeGithub
+
+def _config(tmp_path):
+    return compile_config({
+        "llm": {"model": "stub"},
+        "data_sources": {"github": {"enabled": True, "username_env_var": "GH_USER", "pat_env_var": "GH_PAT"}},
+        "posting": {"targets": {}},
+        "backfill": {"output_dir": str(tmp_path / "backfill"), "workers": 1},
+    }, path="<test>")
+
+def test_fetch_raises_when_the_source_fails_mid_stream(fake_github, tmp_path):
+    fake_github.commits = [_commit("a1", 9), _commit("b2", 8)]
+    fake_github.fail_after = 1
+    config = _config(tmp_path)
+    with pytest.raises(SourceError):
+        main.fetch_source_activities("github", config.sources["github"], day=DAY)
+    # The daily run keeps what arrived and carries on
+    assert [a.details.sha for a in main.iter_source_activities("github", config.sources["github"], day=DAY)] == ["a1"]
+
+def test_failed_day_is_retried_not_recorded_as_empty(fake_github, tmp_path):
+    config = _config(tmp_path)
+    out_path = os.path.join(tmp_path, "backfill", DAY.isoformat(), "github.json")
+    fake_github.fail_after = 0
+    counts = run_backfill(config, DAY, DAY, main.fetch_source_activities, main.select_prompt, limiter=RateLimiter(1000))
+    assert counts["failed"] == 1 and counts["empty"] == 0
+    assert not os.path.exists(out_path)
+
+    fake_github.fail_after = None # The next backfill fetches the day; it really had no commits
+    counts = run_backfill(config, DAY, DAY, main.fetch_source_activities, main.select_prompt, limiter=RateLimiter(1000))
+    assert counts["empty"] == 1
+    assert os.path.exists(out_path)
+
+def test_recent_backfill_day_searches_instead_of_paging_the_events_feed(fake_github, tmp_path):
+    day = datetime.now(timezone.utc).date() - timedelta(days=2) # Within the events feed's reach
+    fake_github.commits = [_commit("c3", 10, day), _commit("d4", 9, day)]
+    limiter = RateLimiter(1000)
+    acquired = []
+    limiter.acquire = lambda tokens=1: acquired.append(tokens) or 0.0
+    clients = main.ClientPool()
+    activities = main.fetch_source_activities("github", _config(tmp_path).sources["github"], clients, day=day, limiter=limiter)
+    assert [a.details.sha for a in activities] == ["c3", "d4"]
+    assert clients.github("stub").queries == [f"author:stub author-date:{day.isoformat()}..{day.isoformat()}"]
+    assert acquired == [1] # One search page; FakeGithub has no events feed to page through
@@ -0,0 +1,71 @@
+import pytest
+
+from src import daemon
+from src.daemon import Scheduler, publish_dates
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A manual monotonic clock for the scheduler: clock.advance(seconds)."""
+    class Clock:
+        now = 1000.0
+        def advance(self, seconds: float):
+            self.now += seconds
+    fake = Clock()
+    monkeypatch.setattr(daemon.time, "monotonic", lambda: fake.now)
+    return fake
+
+def _run(scheduler: Scheduler, clock, seconds: float, step: float = 1.0) -> list[str]:
+    """Advances the clock in steps, running due jobs; returns the names run, in order."""
+    ran = []
+    for _ in range(int(seconds / step)):
+        clock.advance(step)
+        scheduler.run_pending(lambda name, fn: (ran.append(name), fn()))
+    return ran
+
+def _live_entries(scheduler: Scheduler) -> int:
+    return sum(1 for _, seq, name in scheduler._heap if name in scheduler._jobs and scheduler._jobs[name][2] == seq)
+
+def test_runs_on_its_interval(clock):
+    scheduler = Scheduler()
+    scheduler.every("poll:github", 10, lambda: None, delay=5)
+    assert _run(scheduler, clock, 35) == ["poll:github"] * 4 # At 5, 15, 25, 35
+
+def test_replacing_a_job_keeps_a_single_cadence(clock):
+    scheduler = Scheduler()
+    calls = []
+    scheduler.every("poll:github", 10, lambda: calls.append("old"), delay=10)
+    scheduler.every("poll:github", 10, lambda: calls.append("new"), delay=10)
+    assert _run(scheduler, clock, 50) == ["poll:github"] * 5
+    assert calls == ["new"] * 5
+    assert _live_entries(scheduler) == 1
+
+def test_replacing_with_a_longer_interval_drops_the_old_run(clock):
+    scheduler = Scheduler()
+    scheduler.every("publish", 10, lambda: None)
+    scheduler.every("publish", 30, lambda: None, delay=30)
+    assert _run(scheduler, clock, 60) == ["publish"] * 2 # At 30 and 60, not at 10
+    assert scheduler.jobs() == {"publish": 30}
+
+def test_cancel_and_re_add(clock):
+    scheduler = Scheduler()
+    scheduler.every("poll:garmin", 10, lambda: None)
+    _run(scheduler, clock, 5)
+    scheduler.cancel("poll:garmin")
+    assert _run(scheduler, clock, 20) == []
+    scheduler.every("poll:garmin", 10, lambda: None, delay=10)
+    scheduler.cancel("poll:garmin")
+    scheduler.every("poll:garmin", 10, lambda: None, delay=10)
+    assert _run(scheduler, clock, 30) == ["poll:garmin"] * 3
+    assert _live_entries(scheduler) == 1
+
+def test_job_replaced_while_running_is_not_doubled(clock):
+    scheduler = Scheduler()
+    def reload():
+        scheduler.every("poll:github", 10, lambda: None, delay=10) # As sync_jobs does from the config_reload job
+    scheduler.every("poll:github", 10, reload, delay=10)
+    assert _run(scheduler, clock, 40) == ["poll:github"] * 4
+    assert _live_entries(scheduler) == 1
+
+def test_publish_dates_cover_the_lookback_oldest_first():
+    assert publish_dates("2026-03-01", 2) == ["2026-02-27", "2026-02-28", "2026-03-01"]
+    assert publish_dates("2026-03-01", 0) == ["2026-03-01"]
@@ -0,0 +1,88 @@
+import main
+from src.storage.engagement import EngagementStore, collect_metrics, rank_drafts
+from src.storage.outbox import Outbox
+
+def _aggregates(by_source: dict, by_prompt: dict | None = None) -> dict:
+    group = lambda score: {"posts": 1, "score": score, "impressions": 100}
+    return {"source": {key: group(score) for key, score in by_source.items()},
+            "prompt": {key: group(score) for key, score in (by_prompt or {}).items()}, "hour": {}}
+
+def _outbox(tmp_path, *drafts) -> Outbox:
+    """Outbox with one draft per (key, source, prompt_id) for run day "d"."""
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"))
+    for key, source, prompt in drafts:
+        outbox.add_draft(key, "d", source, f"post {key}", {"source": source, "summary": "s"}, prompt_id=prompt)
+    return outbox
+
+def test_collect_metrics_batches_100_ids_per_lookup(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config(targets=("twitter",), engagement_path=str(tmp_path / "engagement.sqlite3"))
+    store = main.open_engagement_store(config)
+    for i in range(250):
+        post_id = state.next_id()
+        state.record("post", {"network": "twitter", "id": post_id, "text": f"post {i}", "reply_to": None, "media": []})
+        state.set_metrics(post_id, like_count=i % 2 * 10, impression_count=100)
+        store.record_post("twitter", post_id, f"d:github:{i}", "github" if i % 2 else "garmin", prompt_key="github", prompt_id="p1")
+
+    assert collect_metrics(store, main.build_posting_targets(config)) == 250
+    assert state.lookups == [100, 100, 50]
+    by_source = store.aggregates()["source"]
+    assert by_source["github"]["score"] == 10 and by_source["garmin"]["score"] == 0
+    assert by_source["github"]["posts"] == by_source["garmin"]["posts"] == 125
+
+def test_collect_metrics_stops_a_target_on_a_failed_lookup(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config(targets=("twitter",), engagement_path=str(tmp_path / "engagement.sqlite3"))
+    store = main.open_engagement_store(config)
+    for i in range(150):
+        post_id = state.next_id()
+        state.record("post", {"network": "twitter", "id": post_id, "text": f"post {i}", "reply_to": None, "media": []})
+        store.record_post("twitter", post_id, f"d:github:{i}", "github")
+    state.fail_next("/2/tweets", 429)
+    assert collect_metrics(store, main.build_posting_targets(config)) == 0
+    assert store.aggregates()["source"] == {}
+
+def test_rank_drafts_by_prompt_then_source_then_neutral(tmp_path):
+    outbox = _outbox(tmp_path, ("a", "github", "p1"), ("b", "garmin", "p9"), ("c", "new", None), ("d", "github", "p2"))
+    aggregates = _aggregates({"github": 2.0, "garmin": 8.0}, {"github@p2": 20.0})
+    ranked = rank_drafts(outbox.entries("d"), aggregates)
+    # d: its prompt (20); b: garmin source (8); c: unknown -> mean of sources (5); a: github source (2)
+    assert [entry["key"] for entry in ranked] == ["d", "b", "c", "a"]
+
+def test_rank_drafts_without_history_keeps_outbox_order(tmp_path):
+    outbox = _outbox(tmp_path, ("a", "github", None), ("b", "garmin", None))
+    assert [entry["key"] for entry in rank_drafts(outbox.entries("d"), {})] == ["a", "b"]
+
+def test_rank_drafts_keeps_started_drafts_first(tmp_path):
+    outbox = _outbox(tmp_path, ("a", "garmin", None), ("b", "github", None), ("c", "github", None), ("d", "garmin", None))
+    outbox.record_link("c", "twitter", 0, "101") # Partly posted by an earlier run
+    outbox.record_link("a", "mastodon", 0, "102")
+    ranked = rank_drafts(outbox.entries("d"), _aggregates({"github": 10.0, "garmin": 1.0}))
+    assert [entry["key"] for entry in ranked] == ["a", "c", "b", "d"]
+
+def test_publish_resumes_started_draft_within_max_posts(stub, stub_config, tmp_path):
+    _, state = stub
+    engagement_path = str(tmp_path / "engagement.sqlite3")
+    config = stub_config(targets=("twitter",), max_posts=1, engagement_path=engagement_path)
+    store = EngagementStore(engagement_path)
+    store.record_post("twitter", "900", "old:github:0", "github")
+    store.update_metrics("twitter", {"900": {"like_count": 50}})
+    store.record_post("twitter", "901", "old:garmin:0", "garmin")
+    store.update_metrics("twitter", {"901": {"like_count": 1}})
+
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"))
+    long_text = " ".join(f"Garmin sentence {i} about an easy run and a good night of sleep." for i in range(8))
+    outbox.add_draft("d:garmin:0", "d", "garmin", long_text, {"source": "garmin", "summary": "s"})
+    outbox.add_draft("d:github:0", "d", "github", "Shipped it.", {"source": "github", "summary": "s"})
+    parts = main.build_posting_targets(config)["twitter"].split(long_text)
+    outbox.set_follow_up("d:garmin:0", "")
+    first_id = state.next_id() # The garmin thread stopped after its first part
+    state.record("post", {"network": "twitter", "id": first_id, "text": parts[0], "reply_to": None, "media": []})
+    outbox.record_link("d:garmin:0", "twitter", 0, first_id)
+
+    main.publish_drafts(config, outbox, "d", engagement=store)
+    # The started garmin thread takes the only slot, although github ranks higher
+    assert [post["text"] for post in state.posts] == parts
+    assert state.posts[1]["reply_to"] == first_id
+    assert Outbox.posted_ids(outbox.get("d:github:0"), "twitter") == []
+    assert Outbox.is_done(outbox.get("d:garmin:0"), "twitter", False, main.build_posting_targets(config)["twitter"].split)
@@ -0,0 +1,122 @@
+import io
+import os
+import zipfile
+
+import numpy as np
+import pytest
+
+from src.data_sources import garmin_fit
+from src.data_sources.garmin_fit import FIT_EPOCH_OFFSET, FIT_METRICS_NA, compute_fit_metrics, decode_fit_records, fetch_fit_file, read_fit_records
+from src.ratelimit import RateLimitedClient, RateLimiter
+from fit_builder import (SAMPLE_COMPRESSED, SAMPLE_INVALID_HR, SAMPLE_RECORDS, SAMPLE_START, FitWriter, fit_crc, sample_run)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'sample_run.fit')
+
+def _records_file(*records, big_endian=False, header_size=14) -> bytes:
+    """One record definition (timestamp, heart_rate, distance, speed, altitude) and its data messages."""
+    fit = FitWriter()
+    fit.define(3, 20, [(253, 0x86), (3, 0x02), (5, 0x86), (6, 0x84), (2, 0x84)], big_endian=big_endian)
+    for record in records:
+        fit.data(3, *record)
+    return fit.to_bytes(header_size)
+
+def test_fixture_is_the_sample_run_with_valid_crcs():
+    with open(FIXTURE, 'rb') as f:
+        data = f.read()
+    assert data == sample_run()
+    assert fit_crc(data[:12]) == int.from_bytes(data[12:14], 'little') # Header CRC
+    assert fit_crc(data) == 0 # A file with its trailing CRC appended checks to zero
+
+def test_fixture_records_decode_with_scale_and_offset():
+    records = read_fit_records(FIXTURE)
+    count = SAMPLE_RECORDS + SAMPLE_COMPRESSED
+    assert all(values.size == count for values in records.values())
+    assert records['timestamp'][0] == SAMPLE_START + 1 + FIT_EPOCH_OFFSET
+    np.testing.assert_array_equal(np.diff(records['timestamp']), 1) # Incl. the compressed-timestamp run
+    assert records['heart_rate'][0] == 120 and records['heart_rate'][-1] == 160
+    assert records['distance'][0] == pytest.approx(4.0) # cm / 100
+    assert records['distance'][-1] == pytest.approx(count * 4.0)
+    assert np.all(records['speed'] == pytest.approx(4.0)) # mm/s / 1000
+    assert records['altitude'][0] == pytest.approx(100.0) # raw / 5 - 500
+    assert np.isnan(records['altitude'][-1]) # Not in the compressed messages' definition
+    assert np.all(np.isnan(records['power']))
+
+def test_invalid_sentinels_decode_as_nan():
+    records = read_fit_records(FIXTURE)
+    assert np.flatnonzero(np.isnan(records['heart_rate'])).tolist() == list(SAMPLE_INVALID_HR)
+    records = decode_fit_records(_records_file((10, 0xFF, 0xFFFFFFFF, 0xFFFF, 0xFFFF), (11, 150, 500, 3000, 2600)))
+    assert np.isnan(records['heart_rate'][0]) and np.isnan(records['distance'][0])
+    assert np.isnan(records['speed'][0]) and np.isnan(records['altitude'][0])
+    assert records['distance'][1] == 5.0 and records['speed'][1] == 3.0 and records['altitude'][1] == 20.0
+
+def test_big_endian_definition_and_short_header():
+    rows = [(100 + i, 140 + i, i * 250, 2500, 2600) for i in range(5)]
+    little = decode_fit_records(_records_file(*rows))
+    for variant in (_records_file(*rows, big_endian=True), _records_file(*rows, header_size=12)):
+        decoded = decode_fit_records(variant)
+        for name, values in little.items():
+            np.testing.assert_array_equal(decoded[name], values)
+
+def test_trailing_crc_is_not_read_as_a_message():
+    data = _records_file((100, 140, 0, 2500, 2600))
+    assert decode_fit_records(data)['timestamp'].size == 1
+    assert decode_fit_records(data[:-2])['timestamp'].size == 1 # data_size in the header bounds the messages
+
+def test_rejects_non_fit_data():
+    with pytest.raises(ValueError):
+        decode_fit_records(b'\x0e\x20' + b'\x00' * 20)
+    fit = FitWriter()
+    fit.body += bytes((0x05,)) + b'\x00' * 4 # Data message with no definition
+    with pytest.raises(ValueError):
+        decode_fit_records(fit.to_bytes())
+
+def test_read_fit_records_returns_none_for_a_broken_file(tmp_path):
+    path = tmp_path / "broken.fit"
+    path.write_bytes(b'not a fit file at all')
+    assert read_fit_records(str(path)) is None
+
+def test_metrics_of_the_sample_run():
+    metrics = compute_fit_metrics(read_fit_records(FIXTURE), max_hr=190, activity_type="running")
+    assert metrics['splits'] == metrics['first_half_pace'] == "4:09" # 4 m/s
+    assert metrics['best_1km'] == "4:10"
+    assert metrics['best_5km'] == "N/A" # Only 1.68 km
+    assert metrics['negative_split'] == "no"
+    assert metrics['avg_cadence'] == 170 # 85 strides/min, doubled for a run
+    assert sum(metrics[f"z{zone}_min"] for zone in range(1, 6)) == 7 # 420 s of moving time
+    assert metrics['decoupling_percent'] > 0 # Same speed at a rising HR
+
+def test_metrics_na_without_enough_records():
+    assert compute_fit_metrics(decode_fit_records(_records_file((100, 140, 0, 2500, 2600)))) == FIT_METRICS_NA
+    assert compute_fit_metrics({}) == FIT_METRICS_NA
+
+def test_fit_samples_for_charts():
+    samples = garmin_fit.fit_samples(read_fit_records(FIXTURE))
+    assert samples['elapsed_s'][0] == 0 and samples['elapsed_s'][-1] == SAMPLE_RECORDS + SAMPLE_COMPRESSED - 1
+    assert len(samples['hr']) == len(samples['speed_mps']) == SAMPLE_RECORDS + SAMPLE_COMPRESSED
+
+def test_fetch_fit_file_through_a_rate_limited_client(tmp_path):
+    class FakeGarmin:
+        class ActivityDownloadFormat: # Nested enum, as on garminconnect.Garmin
+            ORIGINAL = "original"
+        def __init__(self):
+            self.downloads = []
+        def download_activity(self, activity_id, dl_fmt):
+            self.downloads.append((activity_id, dl_fmt))
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w') as zf:
+                zf.write(FIXTURE, f"{activity_id}_ACTIVITY.fit")
+            return archive.getvalue()
+
+    class CountingLimiter(RateLimiter):
+        acquired = 0
+        def acquire(self, tokens=1):
+            self.acquired += tokens
+            return super().acquire(tokens)
+
+    garmin, limiter = FakeGarmin(), CountingLimiter(100)
+    path = fetch_fit_file(RateLimitedClient(garmin, limiter), 42, str(tmp_path))
+    assert read_fit_records(path)['timestamp'].size == SAMPLE_RECORDS + SAMPLE_COMPRESSED
+    assert garmin.downloads == [(42, "original")]
+    assert limiter.acquired == 1 # One download; reading the enum takes no token
+    assert fetch_fit_file(RateLimitedClient(garmin, limiter), 42, str(tmp_path)) == path # Cached
+    assert limiter.acquired == 1
@@ -0,0 +1,148 @@
+import main
+from src.posting.stub_server import STUB_X_USER_ID
+from src.storage.outbox import Outbox
+
+LONG_TEXT = " ".join(f"Sentence {i} about shipping the outbox, the stub server and the retry logic today." for i in range(8))
+
+def _draft(outbox: Outbox, index: int, text: str, run_date: str = "d", **kwargs) -> str:
+    key = f"{run_date}:github:{index}"
+    outbox.add_draft(key, run_date, "github", text, {"source": "github", "summary": "- Worked on repo r: m", "url": "u"}, **kwargs)
+    return key
+
+def _thread(state, network: str, texts: list[str]) -> list[dict]:
+    """The stub's posts on `network` with these texts, in order; each must exist exactly once."""
+    posts = [post for post in state.posts if post["network"] == network]
+    thread = []
+    for text in texts:
+        matches = [post for post in posts if post["text"] == text]
+        assert len(matches) == 1, f"{network}: {len(matches)} posts of {text[:40]!r}"
+        thread.append(matches[0])
+    return thread
+
+def test_fan_out_to_three_targets(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config()
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"))
+    chart = tmp_path / "chart.png"
+    chart.write_bytes(b"\x89PNG\r\n\x1a\n stub")
+    short_key = _draft(outbox, 0, "Shipped the outbox today. #buildinpublic", media_paths=[str(chart)])
+    long_key = _draft(outbox, 1, LONG_TEXT)
+
+    assert main.publish_drafts(config, outbox, "d") == 2
+
+    targets = main.build_posting_targets(config)
+    for key, target in targets.items():
+        network_posts = [post for post in state.posts if post["network"] == key]
+        short = _thread(state, key, [outbox.get(short_key)["tweet_text"]])
+        assert short[0]["reply_to"] is None and len(short[0]["media"]) == 1
+        long_parts = target.split(LONG_TEXT)
+        assert len(long_parts) > 1
+        thread = _thread(state, key, long_parts)
+        assert thread[0]["reply_to"] is None
+        assert [post["reply_to"] for post in thread[1:]] == [post["id"] for post in thread[:-1]]
+        assert all(not post["media"] for post in thread)
+        assert len(network_posts) == 1 + len(long_parts)
+        for entry in outbox.entries("d"):
+            assert Outbox.is_done(entry, key, target.enable_follow_up, target.split)
+        # Bluesky IDs are "<uri> <cid>"; the stub lists posts by URI
+        assert [post_id.split(" ")[0] for post_id in Outbox.posted_ids(outbox.get(long_key), key)] == [post["id"] for post in thread]
+    assert sorted(media["network"] for media in state.media) == ["bluesky", "mastodon", "twitter"]
+
+def test_rerun_posts_nothing_again(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config()
+    path = str(tmp_path / "outbox.jsonl")
+    outbox = Outbox(path)
+    _draft(outbox, 0, "First post.")
+    _draft(outbox, 1, LONG_TEXT)
+    assert main.publish_drafts(config, outbox, "d") == 2
+    posted = list(state.posts)
+
+    assert main.publish_drafts(config, Outbox(path), "d") == 0 # A new process, same outbox
+    assert state.posts == posted
+
+def test_thread_failing_midway_resumes_without_reposting(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config(targets=("twitter",))
+    path = str(tmp_path / "outbox.jsonl")
+    outbox = Outbox(path)
+    key = _draft(outbox, 0, LONG_TEXT)
+    parts = main.build_posting_targets(config)["twitter"].split(LONG_TEXT)
+    assert len(parts) >= 3
+
+    record_link = outbox.record_link
+    def fail_after_first_link(entry_key, target, index, post_id):
+        record_link(entry_key, target, index, post_id)
+        if index == 0:
+            state.fail_next("/2/tweets", 403) # Not retryable: the thread stops after part 1
+    outbox.record_link = fail_after_first_link
+    main.publish_drafts(config, outbox, "d")
+    assert len(Outbox.posted_ids(outbox.get(key), "twitter")) == 1
+    assert len(state.posts) == 1
+
+    resumed = Outbox(path)
+    main.publish_drafts(config, resumed, "d")
+    thread = _thread(state, "twitter", parts)
+    assert len(state.posts) == len(parts)
+    assert [post["reply_to"] for post in thread[1:]] == [post["id"] for post in thread[:-1]]
+    assert Outbox.posted_ids(resumed.get(key), "twitter") == [post["id"] for post in thread]
+
+def test_lost_mastodon_response_is_not_posted_twice(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config(targets=("mastodon",))
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"))
+    key = _draft(outbox, 0, LONG_TEXT * 2)
+    parts = main.build_posting_targets(config)["mastodon"].split(LONG_TEXT * 2)
+    assert len(parts) >= 2
+    state.lose_next("/api/v1/statuses", 2) # Created, but the client sees a 504 and retries with the same Idempotency-Key
+
+    assert main.publish_drafts(config, outbox, "d") == 1
+    thread = _thread(state, "mastodon", parts)
+    assert len(state.posts) == len(parts)
+    assert Outbox.posted_ids(outbox.get(key), "mastodon") == [post["id"] for post in thread]
+
+def test_publish_covers_pending_drafts_of_earlier_days(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config(targets=("twitter",), max_posts=1)
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"))
+    parts = main.build_posting_targets(config)["twitter"].split(LONG_TEXT)
+    started = _draft(outbox, 0, LONG_TEXT, run_date="d1") # Cut off at rollover after its first part
+    outbox.set_follow_up(started, "")
+    first_id = state.next_id()
+    state.record("post", {"network": "twitter", "id": first_id, "text": parts[0], "reply_to": None, "media": []})
+    outbox.record_link(started, "twitter", 0, first_id)
+    late = _draft(outbox, 0, "Polled in after the posting window.", run_date="d2")
+    today = _draft(outbox, 0, "Shipped today.", run_date="d3")
+    _draft(outbox, 1, "Over today's max_posts.", run_date="d3")
+
+    assert main.publish_drafts(config, outbox, ["d1", "d2", "d3"]) == 2 # The resumed thread was already counted
+    assert [post["text"] for post in state.posts] == parts + ["Polled in after the posting window.", "Shipped today."]
+    for key in (started, late, today):
+        assert Outbox.is_done(outbox.get(key), "twitter", False, main.build_posting_targets(config)["twitter"].split)
+    assert main.publish_drafts(config, outbox, ["d1", "d2", "d3"]) == 0
+
+def test_lost_x_response_is_looked_up_not_posted_twice(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config(targets=("twitter",))
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"))
+    key = _draft(outbox, 0, LONG_TEXT)
+    parts = main.build_posting_targets(config)["twitter"].split(LONG_TEXT)
+    state.lose_next("/2/tweets", 2) # Created, but the client sees a 504; X takes no idempotency key
+    state.fail_next("/2/tweets", 503) # Then a 5xx where nothing was created: found missing, retried
+
+    assert main.publish_drafts(config, outbox, "d") == 1
+    thread = _thread(state, "twitter", parts)
+    assert len(state.posts) == len(parts)
+    assert Outbox.posted_ids(outbox.get(key), "twitter") == [post["id"] for post in thread]
+
+def test_x_failure_is_not_retried_when_the_lookup_fails(stub, stub_config, tmp_path):
+    _, state = stub
+    config = stub_config(targets=("twitter",))
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"))
+    key = _draft(outbox, 0, "Shipped the outbox today.")
+    state.lose_next("/2/tweets")
+    state.fail_next(f"/2/users/{STUB_X_USER_ID}/tweets", 500)
+
+    assert main.publish_drafts(config, outbox, "d") == 0
+    assert len(state.posts) == 1 # Created once; the unknown outcome was not retried into a duplicate
+    assert Outbox.posted_ids(outbox.get(key), "twitter") == []
@@ -0,0 +1,82 @@
+import re
+
+import pytest
+
+from src.bench import synthetic_llm_output
+from src.llm.generator import split_into_tweets
+from src.posting.twitter_text import MAX_WEIGHTED_LENGTH, is_valid_length, split_thread, weighted_length
+
+@pytest.mark.parametrize("text, expected", [
+    ("hello", 5),
+    ("https://github.com/votanlenhan/githubX/commit/0123456789abcdef", 23),
+    ("see github.com/votanlenhan.", 4 + 23 + 1), # Bare domain; the trailing dot is not part of the link
+    ("www.example.com/a/very/long/path?with=query", 23),
+    ("💪", 2),
+    ("🏃‍♂️", 2), # ZWJ sequence with a variation selector
+    ("👍🏽", 2), # Skin-tone modifier
+    ("🇻🇳", 2), # Flag (regional indicator pair)
+    ("日本語", 6),
+    ("한국", 4),
+    ("chạy", 5), # "ạ" (Latin Extended Additional) weighs 2
+    ("Hôm nay tôi chạy bộ", 19 + 2), # "ạ" and "ộ" weigh 2; "ô" (Latin-1) weighs 1
+    ("ễ", 2),
+    ("e\u0302\u0303", 2), # Decomposed "ễ" is NFC-normalized first
+    ("“quoted” — dash", 15), # General punctuation stays light
+])
+def test_weighted_length(text, expected):
+    assert weighted_length(text) == expected
+
+def test_url_and_emoji_in_vietnamese_sentence():
+    text = "Hôm nay chạy 5km 💪 https://connect.garmin.com/modern/activity/123"
+    assert weighted_length(text) == len("Hôm nay chạy 5km ") + 1 + 2 + 1 + 23
+
+def test_is_valid_length():
+    assert is_valid_length("a" * 280)
+    assert not is_valid_length("a" * 281)
+    assert not is_valid_length("")
+    assert not is_valid_length("ạ" * 141) # 282 weighted
+
+def test_short_text_is_not_split():
+    assert split_thread("  Shipped the outbox today.  ") == ["Shipped the outbox today."]
+    assert split_thread("   ") == []
+
+def test_split_keeps_sentence_boundaries_and_numbers_parts():
+    sentences = [f"Sentence number {i} talks about the daily pipeline and its cache." for i in range(12)]
+    parts = split_thread(" ".join(sentences))
+    assert len(parts) > 1
+    for index, part in enumerate(parts, start=1):
+        assert part.endswith(f" {index}/{len(parts)}")
+        assert weighted_length(part) <= MAX_WEIGHTED_LENGTH
+        body = part[:-len(f" {index}/{len(parts)}")]
+        assert body.endswith(".") # Cut between sentences, never inside one
+    rejoined = " ".join(re.sub(r" \d+/\d+$", "", part) for part in parts)
+    assert rejoined == " ".join(sentences)
+
+def test_overlong_sentence_is_split_at_words():
+    sentence = " ".join(["chạy bộ"] * 60) + "." # One sentence over the limit
+    parts = split_thread(sentence)
+    assert len(parts) > 1
+    assert all(weighted_length(part) <= MAX_WEIGHTED_LENGTH for part in parts)
+    words = " ".join(re.sub(r" \d+/\d+$", "", part) for part in parts).split()
+    assert words == sentence.split()
+
+def test_unbreakable_word_is_hard_cut():
+    parts = split_thread("ễ" * 400)
+    assert all(weighted_length(part) <= MAX_WEIGHTED_LENGTH for part in parts)
+    assert "".join(re.sub(r" \d+/\d+$", "", part) for part in parts) == "ễ" * 400
+
+def test_ten_or_more_parts_leave_room_for_the_longer_suffix():
+    text = " ".join(f"Part {i} " + "word " * 50 + "end." for i in range(12))
+    parts = split_thread(text)
+    assert len(parts) >= 10
+    assert all(weighted_length(part) <= MAX_WEIGHTED_LENGTH for part in parts)
+    assert parts[-1].endswith(f" {len(parts)}/{len(parts)}")
+
+def test_split_llm_output_never_exceeds_the_limit():
+    for post in split_into_tweets(synthetic_llm_output(200)):
+        for part in split_thread(post):
+            assert 0 < weighted_length(part) <= MAX_WEIGHTED_LENGTH
+
+def test_custom_max_length():
+    parts = split_thread("One. Two. Three. Four.", max_length=12)
+    assert parts == ["One. 1/4", "Two. 2/4", "Three. 3/4", "Four. 4/4"]